@@ -65,6 +65,142 @@ function uploadFile(folderId, fileName, fileData, mimeType) {
   }
 }
 
+// Chunked uploads: chunks are staged as files inside a temporary folder
+// (created in the destination folder) and joined on finalize. The upload
+// session metadata lives in the staging folder description.
+var UPLOAD_STAGING_PREFIX = '_upload_';
+
+function getUploadSession(uploadId) {
+  var stagingFolder = DriveApp.getFolderById(uploadId);
+  if (stagingFolder.getName().indexOf(UPLOAD_STAGING_PREFIX) !== 0) {
+    throw new Error('Invalid upload id');
+  }
+  return {
+    folder: stagingFolder,
+    meta: JSON.parse(stagingFolder.getDescription() || '{}')
+  };
+}
+
+function chunkName(index) {
+  return ('00000' + index).slice(-6);
+}
+
+// Function to start a chunked upload
+function initUpload(folderId, fileName, mimeType) {
+  try {
+    var folder = DriveApp.getFolderById(folderId);
+    var stagingFolder = folder.createFolder(UPLOAD_STAGING_PREFIX + new Date().getTime());
+    stagingFolder.setDescription(JSON.stringify({
+      folderId: folderId,
+      fileName: fileName,
+      mimeType: mimeType
+    }));
+    
+    return {
+      success: true,
+      uploadId: stagingFolder.getId(),
+      message: 'Upload started'
+    };
+  } catch (error) {
+    return {
+      success: false,
+      message: 'Error starting upload: ' + error.toString()
+    };
+  }
+}
+
+// Function to store one chunk of a chunked upload (retrying the same index replaces it)
+function appendUploadChunk(uploadId, index, chunkData) {
+  try {
+    var session = getUploadSession(uploadId);
+    var name = chunkName(index);
+    
+    var existing = session.folder.getFilesByName(name);
+    while (existing.hasNext()) {
+      existing.next().setTrashed(true);
+    }
+    
+    var blob = Utilities.newBlob(Utilities.base64Decode(chunkData), 'application/octet-stream', name);
+    session.folder.createFile(blob);
+    
+    return {
+      success: true,
+      index: index,
+      message: 'Chunk stored'
+    };
+  } catch (error) {
+    return {
+      success: false,
+      message: 'Error storing chunk: ' + error.toString()
+    };
+  }
+}
+
+// Function to join the chunks into the final file and remove the staging folder
+function finalizeUpload(uploadId, totalChunks) {
+  try {
+    var session = getUploadSession(uploadId);
+    
+    // Already finalized (e.g. the response of a previous attempt was lost)
+    if (session.meta.fileId) {
+      return {
+        success: true,
+        fileId: session.meta.fileId,
+        message: 'File already uploaded'
+      };
+    }
+    
+    // Read every chunk first and join them with a single native concat
+    // (concatenating per chunk copies the growing array each time, and
+    // copying byte by byte in script code is slow for multi-MB files)
+    var parts = [];
+    for (var i = 0; i < totalChunks; i++) {
+      var chunks = session.folder.getFilesByName(chunkName(i));
+      if (!chunks.hasNext()) {
+        return createErrorResponse('Missing chunk ' + i);
+      }
+      parts.push(chunks.next().getBlob().getBytes());
+    }
+    var bytes = Array.prototype.concat.apply([], parts);
+    parts = null;
+    
+    var folder = DriveApp.getFolderById(session.meta.folderId);
+    var file = folder.createFile(Utilities.newBlob(bytes, session.meta.mimeType, session.meta.fileName));
+    
+    session.meta.fileId = file.getId();
+    session.folder.setDescription(JSON.stringify(session.meta));
+    session.folder.setTrashed(true);
+    
+    return {
+      success: true,
+      fileId: file.getId(),
+      message: 'File uploaded successfully'
+    };
+  } catch (error) {
+    return {
+      success: false,
+      message: 'Error finalizing upload: ' + error.toString()
+    };
+  }
+}
+
+// Function to discard an unfinished chunked upload
+function abortUpload(uploadId) {
+  try {
+    var session = getUploadSession(uploadId);
+    session.folder.setTrashed(true);
+    return {
+      success: true,
+      message: 'Upload aborted'
+    };
+  } catch (error) {
+    return {
+      success: false,
+      message: 'Error aborting upload: ' + error.toString()
+    };
+  }
+}
+
 // Function to delete a file from Drive
 function deleteFile(fileId) {
   try {
@@ -158,8 +294,80 @@ function getFileContent(fileId) {
   }
 }
 
+// Form of the placeholders in the document templates
+var PLACEHOLDER_PATTERN = /\{\{[A-Z0-9_]+\}\}/g;
+
+// Function to list the {{PLACEHOLDERS}} a template contains, so the backend
+// only computes and sends the values the document actually uses
+function getTemplatePlaceholders(templateId) {
+  try {
+    var text = DocumentApp.openById(templateId).getBody().getText();
+    var found = {};
+    var match;
+    PLACEHOLDER_PATTERN.lastIndex = 0;
+    while ((match = PLACEHOLDER_PATTERN.exec(text)) !== null) {
+      found[match[0]] = true;
+    }
+    
+    return {
+      success: true,
+      placeholders: Object.keys(found)
+    };
+  } catch (error) {
+    return {
+      success: false,
+      message: 'Error reading template placeholders: ' + error.toString()
+    };
+  }
+}
+
+// Replaces every {{PLACEHOLDER}} of the map in a single walk over the text
+// elements of the body, instead of one body.replaceText traversal per key.
+// Tokens not in the map are left untouched and keys absent from the document
+// cost nothing. Values are inserted literally (no regex or $ patterns) and the
+// text around each token keeps its formatting. A token split across
+// differently formatted runs is not matched, as with replaceText.
+function replacePlaceholders(body, placeholders) {
+  var startTime = new Date().getTime();
+  var replaced = 0;
+  var found = {};
+  var range = body.findElement(DocumentApp.ElementType.TEXT);
+  while (range) {
+    var element = range.getElement().asText();
+    var text = element.getText();
+    var matches = [];
+    var match;
+    PLACEHOLDER_PATTERN.lastIndex = 0;
+    while ((match = PLACEHOLDER_PATTERN.exec(text)) !== null) {
+      if (placeholders.hasOwnProperty(match[0])) {
+        matches.push({ start: match.index, token: match[0] });
+      }
+    }
+    // Right to left, so earlier offsets stay valid
+    for (var i = matches.length - 1; i >= 0; i--) {
+      var start = matches[i].start;
+      var value = String(placeholders[matches[i].token]);
+      element.deleteText(start, start + matches[i].token.length - 1);
+      if (value.length) {
+        element.insertText(start, value);
+      }
+      found[matches[i].token] = true;
+      replaced++;
+    }
+    range = body.findElement(DocumentApp.ElementType.TEXT, range);
+  }
+  
+  return {
+    replaced: replaced,
+    placeholders: Object.keys(found).length,
+    missing: Object.keys(placeholders).filter(function(key) { return !found[key]; }),
+    replaceMs: new Date().getTime() - startTime
+  };
+}
+
 // Function to copy a Google Doc template and replace placeholders
 function copyDocumentFromTemplate(templateId, newFileName, placeholders, folderId) {
+  var startTime = new Date().getTime();
   try {
     // Copy the template document
     var templateDoc = DriveApp.getFileById(templateId);
@@ -174,23 +382,20 @@ function copyDocumentFromTemplate(templateId, newFileName, placeholders, folderI
     
     // Open the copied document and replace placeholders
     var doc = DocumentApp.openById(copiedDoc.getId());
-    var body = doc.getBody();
     
     // Replace placeholders in the document
-    for (var placeholder in placeholders) {
-      if (placeholders.hasOwnProperty(placeholder)) {
-        body.replaceText(placeholder, placeholders[placeholder]);
-      }
-    }
+    var timing = replacePlaceholders(doc.getBody(), placeholders);
     
     // Save and close the document
     doc.saveAndClose();
+    timing.totalMs = new Date().getTime() - startTime;
     
     return {
       success: true,
       fileId: copiedDoc.getId(),
       fileName: newFileName,
       fileUrl: 'https://docs.google.com/document/d/' + copiedDoc.getId(),
+      timing: timing,
       message: 'Document created successfully from template'
     };
   } catch (error) {
@@ -203,22 +408,20 @@ function copyDocumentFromTemplate(templateId, newFileName, placeholders, folderI
 
 // Function to update an existing Google Doc with new placeholders
 function updateDocumentPlaceholders(documentId, placeholders) {
+  var startTime = new Date().getTime();
   try {
     var doc = DocumentApp.openById(documentId);
-    var body = doc.getBody();
     
     // Replace placeholders in the document
-    for (var placeholder in placeholders) {
-      if (placeholders.hasOwnProperty(placeholder)) {
-        body.replaceText(placeholder, placeholders[placeholder]);
-      }
-    }
+    var timing = replacePlaceholders(doc.getBody(), placeholders);
     
     // Save and close the document
     doc.saveAndClose();
+    timing.totalMs = new Date().getTime() - startTime;
     
     return {
       success: true,
+      timing: timing,
       message: 'Document updated successfully'
     };
   } catch (error) {
@@ -229,6 +432,216 @@ function updateDocumentPlaceholders(documentId, placeholders) {
   }
 }
 
+// Batch copies of a template: one invocation creates many documents and stops
+// before the Apps Script execution-time limit, returning a continuation token.
+// The caller resends the same documents with that token to resume.
+var BATCH_DEFAULT_MAX_RUNTIME_MS = 4.5 * 60 * 1000;
+// Description set on a batch document once its placeholders are replaced
+var BATCH_RENDERED_DESCRIPTION = 'equivalencias:rendered';
+
+function encodeContinuationToken(nextIndex, total) {
+  return Utilities.base64EncodeWebSafe(JSON.stringify({ next: nextIndex, total: total }));
+}
+
+function decodeContinuationToken(token, total) {
+  var state = JSON.parse(Utilities.newBlob(Utilities.base64DecodeWebSafe(token)).getDataAsString());
+  if (state.total !== total || state.next < 0 || state.next > total) {
+    throw new Error('Continuation token does not match the documents list');
+  }
+  return state.next;
+}
+
+// Function to create one document of a batch from an already opened template.
+// An existing file with the same name in the folder is reused only if it was
+// marked as rendered, so resending a batch whose response was lost does not
+// create duplicates; a copy left half-rendered by a timed-out execution is
+// trashed and created again.
+function copyTemplateForBatch(templateFile, item) {
+  var folder = item.folderId ? DriveApp.getFolderById(item.folderId) : null;
+  var copiedDoc = null;
+  if (folder) {
+    var existing = folder.getFilesByName(item.newFileName);
+    while (existing.hasNext()) {
+      var file = existing.next();
+      if (!copiedDoc && file.getDescription() === BATCH_RENDERED_DESCRIPTION) {
+        copiedDoc = file;
+      } else if (file.getId() !== item.previousFileId) {
+        file.setTrashed(true);
+      }
+    }
+  }
+  var timing = null;
+  if (!copiedDoc) {
+    var startTime = new Date().getTime();
+    copiedDoc = folder ? templateFile.makeCopy(item.newFileName, folder) : templateFile.makeCopy(item.newFileName);
+    var doc = DocumentApp.openById(copiedDoc.getId());
+    timing = replacePlaceholders(doc.getBody(), item.placeholders);
+    doc.saveAndClose();
+    copiedDoc.setDescription(BATCH_RENDERED_DESCRIPTION);
+    timing.totalMs = new Date().getTime() - startTime;
+  }
+
+  // The previous document is removed only once its replacement exists
+  if (item.previousFileId && item.previousFileId !== copiedDoc.getId()) {
+    try {
+      DriveApp.getFileById(item.previousFileId).setTrashed(true);
+    } catch (error) {
+      // Already deleted
+    }
+  }
+
+  return {
+    key: item.key,
+    success: true,
+    fileId: copiedDoc.getId(),
+    fileName: item.newFileName,
+    fileUrl: 'https://docs.google.com/document/d/' + copiedDoc.getId(),
+    timing: timing
+  };
+}
+
+// Function to copy a template into many documents within the execution-time quota
+function copyDocumentsFromTemplateBatch(templateId, documents, continuationToken, maxRuntimeMs) {
+  var startTime = new Date().getTime();
+  var budget = maxRuntimeMs || BATCH_DEFAULT_MAX_RUNTIME_MS;
+  try {
+    var index = continuationToken ? decodeContinuationToken(continuationToken, documents.length) : 0;
+    var templateFile = DriveApp.getFileById(templateId);
+    var results = [];
+
+    for (; index < documents.length; index++) {
+      // Stop before starting a document that could exceed the quota
+      if (results.length > 0 && new Date().getTime() - startTime > budget) {
+        break;
+      }
+      var item = documents[index];
+      try {
+        results.push(copyTemplateForBatch(templateFile, item));
+      } catch (error) {
+        results.push({
+          key: item.key,
+          success: false,
+          message: 'Error creating document from template: ' + error.toString()
+        });
+      }
+    }
+
+    return {
+      success: true,
+      results: results,
+      processed: index,
+      total: documents.length,
+      continuationToken: index < documents.length ? encodeContinuationToken(index, documents.length) : null,
+      elapsedMs: new Date().getTime() - startTime,
+      message: 'Processed ' + results.length + ' documents'
+    };
+  } catch (error) {
+    return {
+      success: false,
+      message: 'Error processing document batch: ' + error.toString()
+    };
+  }
+}
+
+// Function to run a single action (doPost and each item of a batch)
+function dispatchAction(action, data) {
+  switch (action) {
+    case 'createNestedFolder':
+      return handleCreateNestedFolder(data);
+    case 'uploadFile':
+      return handleUploadFile(data);
+    case 'initUpload':
+      return handleInitUpload(data);
+    case 'appendUploadChunk':
+      return handleAppendUploadChunk(data);
+    case 'finalizeUpload':
+      return handleFinalizeUpload(data);
+    case 'abortUpload':
+      return handleAbortUpload(data);
+    case 'deleteFile':
+      return handleDeleteFile(data);
+    case 'deleteFolder':
+      return handleDeleteFolder(data);
+    case 'overwriteFile':
+      return handleOverwriteFile(data);
+    case 'renameFolder':
+      return handleRenameFolder(data);
+    case 'getFileContent':
+      return handleGetFileContent(data);
+    case 'getTemplatePlaceholders':
+      return handleGetTemplatePlaceholders(data);
+    case 'copyDocumentFromTemplate':
+      return handleCopyDocumentFromTemplate(data);
+    case 'updateDocumentPlaceholders':
+      return handleUpdateDocumentPlaceholders(data);
+    case 'copyDocumentsFromTemplateBatch':
+      return handleCopyDocumentsFromTemplateBatch(data);
+    default:
+      return createErrorResponse('Unknown action: ' + action);
+  }
+}
+
+// Batch of actions in one request. Each operation is {action, params}; a
+// param value {"$ref": "<index>.<field>"} is replaced by that field of the
+// result of an earlier operation (e.g. the folderId of a createNestedFolder).
+// By default the remaining operations are skipped after the first failure.
+function resolveReferences(value, results) {
+  if (Array.isArray(value)) {
+    return value.map(function(item) { return resolveReferences(item, results); });
+  }
+  if (value && typeof value === 'object') {
+    if (typeof value.$ref === 'string') {
+      var parts = value.$ref.split('.');
+      var previous = results[parseInt(parts[0], 10)];
+      if (!previous || !previous.success) {
+        throw new Error('Reference to an unavailable result: ' + value.$ref);
+      }
+      return previous[parts[1]];
+    }
+    var resolved = {};
+    for (var key in value) {
+      if (value.hasOwnProperty(key)) {
+        resolved[key] = resolveReferences(value[key], results);
+      }
+    }
+    return resolved;
+  }
+  return value;
+}
+
+function runBatch(operations, stopOnError) {
+  var results = [];
+  var failed = 0;
+  for (var i = 0; i < operations.length; i++) {
+    var operation = operations[i];
+    if (failed > 0 && stopOnError) {
+      results.push({ success: false, skipped: true, message: 'Skipped after a previous error' });
+      continue;
+    }
+    var result;
+    try {
+      if (operation.action === 'batch') {
+        result = createErrorResponse('Nested batches are not supported');
+      } else {
+        result = dispatchAction(operation.action, resolveReferences(operation.params || {}, results));
+      }
+    } catch (error) {
+      result = createErrorResponse('Error in ' + operation.action + ': ' + error.toString());
+    }
+    if (!result.success) {
+      failed++;
+    }
+    results.push(result);
+  }
+  
+  return {
+    success: true,
+    results: results,
+    failed: failed,
+    message: 'Batch processed: ' + (operations.length - failed) + '/' + operations.length + ' operations succeeded'
+  };
+}
+
 // Function to handle HTTP requests
 function doPost(e) {
   try {
@@ -241,41 +654,7 @@ function doPost(e) {
         .setMimeType(ContentService.MimeType.JSON);
     }
     
-    var action = data.action;
-    var result;
-    
-    switch (action) {
-      case 'createNestedFolder':
-        result = handleCreateNestedFolder(data);
-        break;
-      case 'uploadFile':
-        result = handleUploadFile(data);
-        break;
-      case 'deleteFile':
-        result = handleDeleteFile(data);
-        break;
-      case 'deleteFolder':
-        result = handleDeleteFolder(data);
-        break;
-      case 'overwriteFile':
-        result = handleOverwriteFile(data);
-        break;
-      case 'renameFolder':
-        result = handleRenameFolder(data);
-        break;
-      case 'getFileContent':
-        result = handleGetFileContent(data);
-        break;
-      case 'copyDocumentFromTemplate':
-        result = handleCopyDocumentFromTemplate(data);
-        break;
-      case 'updateDocumentPlaceholders':
-        result = handleUpdateDocumentPlaceholders(data);
-        break;
-      default:
-        result = createErrorResponse('Unknown action: ' + action);
-        break;
-    }
+    var result = data.action === 'batch' ? handleBatch(data) : dispatchAction(data.action, data);
     
     return ContentService
       .createTextOutput(JSON.stringify(result))
@@ -322,6 +701,42 @@ function handleUploadFile(data) {
   return result;
 }
 
+function handleInitUpload(data) {
+  if (!data.folderId || !data.fileName || !data.mimeType) {
+    return createErrorResponse('Missing required fields: folderId, fileName, mimeType');
+  }
+  
+  var result = initUpload(data.folderId, data.fileName, data.mimeType);
+  return result;
+}
+
+function handleAppendUploadChunk(data) {
+  if (!data.uploadId || data.index === undefined || !data.chunkData) {
+    return createErrorResponse('Missing required fields: uploadId, index, chunkData');
+  }
+  
+  var result = appendUploadChunk(data.uploadId, data.index, data.chunkData);
+  return result;
+}
+
+function handleFinalizeUpload(data) {
+  if (!data.uploadId || !data.totalChunks) {
+    return createErrorResponse('Missing required fields: uploadId, totalChunks');
+  }
+  
+  var result = finalizeUpload(data.uploadId, data.totalChunks);
+  return result;
+}
+
+function handleAbortUpload(data) {
+  if (!data.uploadId) {
+    return createErrorResponse('Missing required field: uploadId');
+  }
+  
+  var result = abortUpload(data.uploadId);
+  return result;
+}
+
 function handleDeleteFile(data) {
   if (!data.fileId) {
     return createErrorResponse('Missing required field: fileId');
@@ -367,6 +782,15 @@ function handleGetFileContent(data) {
   return result;
 }
 
+function handleGetTemplatePlaceholders(data) {
+  if (!data.templateId) {
+    return createErrorResponse('Missing required field: templateId');
+  }
+  
+  var result = getTemplatePlaceholders(data.templateId);
+  return result;
+}
+
 function handleCopyDocumentFromTemplate(data) {
   if (!data.templateId || !data.newFileName || !data.placeholders) {
     return createErrorResponse('Missing required fields: templateId, newFileName, placeholders');
@@ -384,3 +808,26 @@ function handleUpdateDocumentPlaceholders(data) {
   var result = updateDocumentPlaceholders(data.documentId, data.placeholders);
   return result;
 }
+
+function handleCopyDocumentsFromTemplateBatch(data) {
+  if (!data.templateId || !data.documents || !data.documents.length) {
+    return createErrorResponse('Missing required fields: templateId, documents');
+  }
+  for (var i = 0; i < data.documents.length; i++) {
+    if (!data.documents[i].newFileName || !data.documents[i].placeholders) {
+      return createErrorResponse('Missing required fields in documents[' + i + ']: newFileName, placeholders');
+    }
+  }
+  
+  var result = copyDocumentsFromTemplateBatch(data.templateId, data.documents, data.continuationToken, data.maxRuntimeMs);
+  return result;
+}
+
+function handleBatch(data) {
+  if (!data.operations || !data.operations.length) {
+    return createErrorResponse('Missing required field: operations');
+  }
+  
+  var result = runBatch(data.operations, data.stopOnError !== false);
+  return result;
+}
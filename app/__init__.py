@@ -33,20 +33,31 @@ def create_app():
     login_manager.login_message = 'Por favor inicia sesión para acceder a esta página.'
     login_manager.login_message_category = 'info'
     
+    # Sesiones HTTP compartidas (Keycloak y Google Apps Script)
+    from app.services import http_session
+    http_session.init_app(app)
+
+    # Instancias únicas de los servicios (current_app.extensions['services'])
+    from app.services.registry import ServiceRegistry
+    ServiceRegistry(app)
+    
+    # Contadores de solicitudes por estado (mantenidos en cada flush)
+    from app.services import estadisticas
+    estadisticas.init_app(app)
+    
     # Add token validation middleware if using Keycloak
     if os.getenv('USE_KEYCLOAK', 'false').lower() == 'true':
         @app.before_request
         def validate_keycloak_token():
-            # Skip validation for auth routes
-            if request.endpoint and request.endpoint.startswith('auth'):
+            # Skip validation for auth routes and static assets
+            if request.endpoint and (request.endpoint.startswith('auth') or request.endpoint == 'static'):
                 return
                 
             if current_user.is_authenticated and hasattr(current_user, 'is_keycloak_user') and current_user.is_keycloak_user:
                 access_token = session.get('access_token')
                 if access_token:
                     try:
-                        from app.services.keycloak_service import KeycloakService
-                        keycloak_service = KeycloakService()
+                        keycloak_service = app.extensions['services'].keycloak
                         if not keycloak_service.validate_token(access_token):
                             # Try to refresh token
                             refresh_token = session.get('refresh_token')
@@ -83,11 +94,32 @@ def create_app():
     app.register_blueprint(depto_bp)
     app.register_blueprint(evaluadores_bp)
     app.register_blueprint(lector_bp)
+
+    # Sincronización de evaluadores en segundo plano
+    from app.services.evaluador_sync import EvaluadorSyncScheduler
+    EvaluadorSyncScheduler(app)
+
+    # Cola de trabajos de Google Drive en segundo plano
+    from app.services.drive_jobs import DriveJobQueue
+    DriveJobQueue(app)
+
+    # Caché en disco de archivos descargados de Google Drive
+    from app.services.drive_file_cache import DriveFileCache
+    DriveFileCache(app)
+
+    # Caché de fragmentos HTML de los listados
+    from app.services.fragment_cache import FragmentCache
+    FragmentCache(app)
+
+    # last_login de los inicios de sesión, guardado por lotes
+    from app.services.ultimo_acceso import UltimoAccesoBuffer
+    UltimoAccesoBuffer(app)
+
+    # Comandos CLI
+    from app.cli import register_commands
+    register_commands(app)
     # Endpoint para servir archivos privados de Google Drive
-    from app.services.google_drive_service import GoogleDriveService
     from flask import send_file, abort
-    import tempfile
-    import io
 
     @app.route('/descargar_archivo_drive/<file_id>')
     def descargar_archivo_drive(file_id):
@@ -95,19 +127,26 @@ def create_app():
         from flask_login import current_user
         if not current_user.is_authenticated:
             abort(403)
-        drive_service = GoogleDriveService()
-        # Descargar el archivo usando Apps Script (debe implementar getFileContent en GAS y en el servicio Python)
-        result = drive_service.obtener_contenido_archivo(file_id)
+        # Descargar el archivo usando Apps Script (getFileContent) sólo si no está en la caché
+        result = app.extensions['drive_file_cache'].obtener_o_descargar(file_id, app.extensions['services'].google_drive)
         if not result['success']:
             abort(404)
-        # Decodificar base64
-        import base64
-        file_data = base64.b64decode(result['content'])
-        return send_file(
-            io.BytesIO(file_data),
-            download_name=result.get('fileName', 'documento.pdf'),
-            mimetype=result.get('mimeType', 'application/pdf')
+        # Servir desde disco: send_file maneja Range, ETag y Last-Modified
+        response = send_file(
+            result['path'],
+            download_name=result.get('fileName') or 'documento.pdf',
+            mimetype=result.get('mimeType') or 'application/pdf',
+            conditional=True
         )
+        response.cache_control.private = True
+        response.cache_control.public = False
+        if result.get('temporal'):
+            # send_file ya abrió el archivo; se puede borrar sin cortar la respuesta
+            try:
+                os.remove(result['path'])
+            except OSError:
+                pass
+        return response
     
     # Asegurarse de que la carpeta de subida de archivos exista
     os.makedirs(os.path.join(app.root_path, 'static/uploads'), exist_ok=True)
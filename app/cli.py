@@ -0,0 +1,151 @@
+import click
+
+
+def register_commands(app):
+    """Registra los comandos `flask ...` de la aplicación"""
+
+    @app.cli.command('sync-evaluadores')
+    @click.option('--force', is_flag=True, help='Eliminar evaluadores locales que ya no existen en Keycloak')
+    def sync_evaluadores(force):
+        """Sincronizar evaluadores desde Keycloak (para ejecutar desde cron)"""
+        scheduler = app.extensions['evaluador_sync']
+        if not scheduler.enabled:
+            click.echo('Keycloak no está configurado o la sincronización está deshabilitada.')
+            return
+        total = scheduler.sync_now(force=force)
+        click.echo(f'Sincronizados {total} evaluadores desde Keycloak.')
+
+    @app.cli.command('procesar-trabajos-drive')
+    @click.option('--once', is_flag=True, help='Procesar los trabajos pendientes y terminar')
+    @click.option('--workers', type=int, default=None, help='Cantidad de hilos de procesamiento')
+    def procesar_trabajos_drive(once, workers):
+        """Procesar la cola de trabajos de Google Drive en un proceso dedicado"""
+        queue = app.extensions['drive_jobs']
+        if once:
+            total = queue.procesar_pendientes()
+            click.echo(f'Procesados {total} trabajos de Google Drive.')
+            return
+        click.echo('Procesando trabajos de Google Drive (Ctrl+C para terminar)...')
+        queue.start(workers=workers or max(queue.workers, 1))
+        try:
+            queue.join()
+        except KeyboardInterrupt:
+            queue.stop()
+
+    @app.cli.command('reconstruir-contadores')
+    def reconstruir_contadores():
+        """Recalcular desde cero los contadores de solicitudes por estado"""
+        from app.services.estadisticas import reconstruir_contadores as reconstruir
+        conteos = reconstruir()
+        for estado, cantidad in conteos.items():
+            click.echo(f'{estado}: {cantidad}')
+        click.echo(f'Total: {sum(conteos.values())} solicitudes.')
+
+    @app.cli.command('import-solicitudes')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', type=int, default=1000, show_default=True, help='Solicitudes por INSERT y commit')
+    def import_solicitudes(archivo, lote):
+        """Importar solicitudes históricas desde un archivo JSON o JSONL"""
+        import time
+        from app.services.importacion import importar_solicitudes
+
+        inicio = time.perf_counter()
+
+        def progreso(resumen):
+            click.echo(f"{resumen['importadas']} solicitudes y {resumen['dictamenes']} dictámenes importados "
+                       f"({resumen['leidas']} leídas, {time.perf_counter() - inicio:.1f} s)")
+
+        resumen = importar_solicitudes(archivo, lote=lote, progreso=progreso)
+        click.echo(f"Importadas {resumen['importadas']} solicitudes con {resumen['dictamenes']} dictámenes "
+                   f"en {time.perf_counter() - inicio:.1f} s.")
+        if resumen['omitidas']:
+            click.echo(f"Omitidas {resumen['omitidas']} solicitudes que ya existían.")
+        if resumen['sin_evaluador']:
+            click.echo(f"{resumen['sin_evaluador']} solicitudes con un legajo de evaluador desconocido quedaron sin asignar.")
+        if resumen['invalidas']:
+            click.echo(f"Descartadas {resumen['invalidas']} solicitudes inválidas:", err=True)
+            for error in resumen['errores']:
+                click.echo(f"  {error}", err=True)
+
+    @app.cli.command('encolar-carpetas-drive')
+    @click.option('--lote', type=int, default=500, show_default=True, help='Solicitudes por commit')
+    def encolar_carpetas_drive(lote):
+        """Encolar la creación de carpetas de Google Drive de las solicitudes que no tienen una"""
+        from app import db
+        from app.models import SolicitudEquivalencia
+
+        queue = app.extensions['drive_jobs']
+        total = 0
+        ultimo_id = 0
+        while True:
+            solicitudes = (SolicitudEquivalencia.query
+                           .filter(SolicitudEquivalencia.id > ultimo_id,
+                                   SolicitudEquivalencia.google_drive_folder_id.is_(None),
+                                   SolicitudEquivalencia.drive_estado.is_(None))
+                           .order_by(SolicitudEquivalencia.id)
+                           .limit(lote)
+                           .all())
+            if not solicitudes:
+                break
+            for solicitud in solicitudes:
+                queue.encolar_preparacion_solicitud(solicitud, [])
+            db.session.commit()
+            total += len(solicitudes)
+            ultimo_id = solicitudes[-1].id
+            click.echo(f'{total} carpetas encoladas...')
+        click.echo(f'Encoladas {total} carpetas de Google Drive. Se procesan con los workers o con `flask procesar-trabajos-drive`.')
+
+    @app.cli.command('export-solicitudes')
+    @click.option('--salida', '-o', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+                  help='Archivo CSV de salida (por defecto, la salida estándar)')
+    @click.option('--estado', help='Exportar sólo las solicitudes en este estado')
+    @click.option('--carrera', help='Exportar sólo las solicitudes de esta carrera destino')
+    @click.option('--desde', help='Fecha inicial AAAA-MM-DD (inclusive)')
+    @click.option('--hasta', help='Fecha final AAAA-MM-DD (inclusive)')
+    @click.option('--fecha', type=click.Choice(['solicitud', 'resolucion']), default='solicitud', show_default=True,
+                  help='Fecha a la que se aplica el rango')
+    @click.option('--por-dictamen', is_flag=True, help='Una fila por dictamen en lugar de una por solicitud')
+    def export_solicitudes(salida, estado, carrera, desde, hasta, fecha, por_dictamen):
+        """Exportar solicitudes (y sus dictámenes) a CSV"""
+        from app.services.exportacion import filtros_exportacion, generar_csv
+
+        try:
+            filtros = filtros_exportacion({'estado': estado, 'carrera': carrera, 'desde': desde,
+                                           'hasta': hasta, 'fecha': fecha})
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+        for bloque in generar_csv(filtros, por_dictamen):
+            salida.write(bloque)
+
+    @app.cli.command('generar-dictamenes')
+    @click.option('--lote', type=int, default=50, show_default=True, help='Solicitudes por lote de Apps Script')
+    @click.option('--regenerar', is_flag=True, help='Regenerar también los dictámenes ya existentes')
+    def generar_dictamenes(lote, regenerar):
+        """Generar en lotes los dictámenes finales de las solicitudes resueltas"""
+        from app.models import SolicitudEquivalencia
+
+        dictamenes = app.extensions['services'].dictamenes
+        generados = errores = 0
+        ultimo_id = 0
+        while True:
+            query = SolicitudEquivalencia.query_detalle().filter(
+                SolicitudEquivalencia.id > ultimo_id,
+                SolicitudEquivalencia.estado.in_(['aprobada', 'rechazada']),
+                SolicitudEquivalencia.google_drive_folder_id.isnot(None)
+            )
+            if not regenerar:
+                query = query.filter(SolicitudEquivalencia.dictamen_final_file_id.is_(None))
+            solicitudes = query.order_by(SolicitudEquivalencia.id).limit(lote).all()
+            if not solicitudes:
+                break
+            ultimo_id = solicitudes[-1].id
+            por_id = {solicitud.id: solicitud.id_solicitud for solicitud in solicitudes}
+
+            resultado = dictamenes.generar_dictamenes_lote(solicitudes)
+            generados += resultado['generados']
+            errores += resultado['errores']
+            for solicitud_id, item in resultado['resultados'].items():
+                if not item['success']:
+                    click.echo(f"{por_id[solicitud_id]}: {item['error']}", err=True)
+            click.echo(f'{generados} dictámenes generados, {errores} errores...')
+        click.echo(f'Generados {generados} dictámenes finales ({errores} errores).')
@@ -1,6 +1,7 @@
 from datetime import datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.orm import joinedload, selectinload
 from app import db, login_manager
 
 class Usuario(db.Model, UserMixin):
@@ -37,12 +38,20 @@ class Usuario(db.Model, UserMixin):
     
     @classmethod
     def create_or_update_from_keycloak(cls, keycloak_user, keycloak_id, app_role):
-        """Create or update user from Keycloak data"""
+        """Create or update user from Keycloak data
+
+        A returning user costs one indexed lookup by keycloak_id. The profile
+        (nombre, apellido, email, rol) is written only when it differs from
+        Keycloak, and last_login goes through the ultimo_acceso buffer, so an
+        unchanged login does not open a write transaction.
+        """
+        from flask import current_app
+        
         print(f"DEBUG: create_or_update_from_keycloak called with role: {app_role}")
         user = cls.query.filter_by(keycloak_id=keycloak_id).first()
         
         if not user:
-            # Check if user exists by email
+            # Check if user exists by email (first Keycloak login of a local user)
             user = cls.query.filter_by(email=keycloak_user.get('email')).first()
             if user:
                 # Update existing user with Keycloak data
@@ -65,16 +74,27 @@ class Usuario(db.Model, UserMixin):
         else:
             print(f"DEBUG: Found existing user by keycloak_id: {user.username}, current role: {user.rol}")
         
-        # Update user info (including role from Keycloak)
-        print(f"DEBUG: Updating user role from {user.rol} to {app_role}")
-        user.nombre = keycloak_user.get('given_name', user.nombre)
-        user.apellido = keycloak_user.get('family_name', user.apellido)
-        user.email = keycloak_user.get('email', user.email)
-        user.rol = app_role  # Always update role to match Keycloak
-        user.last_login = datetime.now()
+        # Update user info (including role from Keycloak) only where it changed
+        perfil = {
+            'nombre': keycloak_user.get('given_name', user.nombre),
+            'apellido': keycloak_user.get('family_name', user.apellido),
+            'email': keycloak_user.get('email', user.email),
+            'rol': app_role  # Always update role to match Keycloak
+        }
+        for campo, valor in perfil.items():
+            if getattr(user, campo) != valor:
+                print(f"DEBUG: Updating user {campo} from {getattr(user, campo)} to {valor}")
+                setattr(user, campo, valor)
         
-        db.session.commit()
-        print(f"DEBUG: User saved with final role: {user.rol}")
+        ultimo_acceso = current_app.extensions.get('ultimo_acceso')
+        if user in db.session.new or db.session.is_modified(user) or \
+                not (ultimo_acceso and ultimo_acceso.habilitado):
+            # There is a write anyway: record last_login in the same commit
+            user.last_login = datetime.now()
+            db.session.commit()
+            print(f"DEBUG: User saved with final role: {user.rol}")
+        else:
+            ultimo_acceso.registrar(user)
         return user
     
     def __repr__(self):
@@ -92,7 +112,8 @@ class SolicitudEquivalencia(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     id_solicitud = db.Column(db.String(10), unique=True, nullable=False)
-    estado = db.Column(db.String(20), default='pendiente', nullable=False)
+    # active_history: conocer el estado anterior al cambiarlo (contadores por estado)
+    estado = db.column_property(db.Column(db.String(20), default='pendiente', nullable=False), active_history=True)
     fecha_solicitud = db.Column(db.DateTime, default=datetime.now, nullable=False)
     fecha_resolucion = db.Column(db.DateTime, nullable=True)
     
@@ -124,6 +145,7 @@ class SolicitudEquivalencia(db.Model):
     # Dictamen final document
     dictamen_final_file_id = db.Column(db.String(100))  # ID del dictamen final en Google Drive
     dictamen_final_url = db.Column(db.String(500))  # URL del dictamen final
+    dictamen_final_hash = db.Column(db.String(64))  # Huella de los placeholders con que se generó
 
     # Firma digital del evaluador
     firma_evaluador = db.Column(db.String(255))
@@ -132,6 +154,34 @@ class SolicitudEquivalencia(db.Model):
     doc_complementaria_file_id = db.Column(db.String(100))  # ID del archivo complementario en Google Drive
     doc_complementaria_url = db.Column(db.String(500))  # URL del archivo complementario
 
+    # Estado de la sincronización con Google Drive (trabajos en segundo plano)
+    drive_estado = db.Column(db.String(20))  # None, 'pendiente', 'completado', 'error'
+    drive_error = db.Column(db.Text)
+
+    # Índices para los listados paginados por (fecha_solicitud, id) con filtros
+    __table_args__ = (
+        db.Index('ix_solicitudes_fecha_id', 'fecha_solicitud', 'id'),
+        db.Index('ix_solicitudes_estado_fecha_id', 'estado', 'fecha_solicitud', 'id'),
+        db.Index('ix_solicitudes_carrera_fecha_id', 'carrera_crub_destino', 'fecha_solicitud', 'id'),
+        db.Index('ix_solicitudes_evaluador_fecha_id', 'evaluador_id', 'fecha_solicitud', 'id'),
+        # Conteos de carga por evaluador y estado
+        db.Index('ix_solicitudes_evaluador_estado', 'evaluador_id', 'estado'),
+    )
+
+    @classmethod
+    def query_listado(cls):
+        """Consulta para listados: el evaluador de cada fila se trae en el mismo SELECT"""
+        return cls.query.options(joinedload(cls.evaluador))
+
+    @classmethod
+    def query_detalle(cls):
+        """Consulta para vistas de detalle y generación del dictamen final
+
+        El evaluador llega por JOIN y los dictámenes en un único SELECT ... IN,
+        así el template y el PlaceholderProcessor no disparan cargas perezosas.
+        """
+        return cls.query.options(joinedload(cls.evaluador), selectinload(cls.dictamenes))
+
     def __repr__(self):
         return f'<SolicitudEquivalencia {self.id_solicitud} - {self.estado}>'
 
@@ -155,5 +205,73 @@ class Dictamen(db.Model):
     evaluador_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
     evaluador = db.relationship('Usuario')
     
+    __table_args__ = (
+        db.Index('ix_dictamenes_solicitud_id', 'solicitud_id'),
+        db.Index('ix_dictamenes_evaluador_id', 'evaluador_id'),
+    )
+    
+    def __repr__(self):
+        return f'<Dictamen {self.id} - {self.asignatura_origen} -> {self.asignatura_destino}>'
+
+class SincronizacionEvaluadores(db.Model):
+    """Marca de agua de la última sincronización de evaluadores desde Keycloak"""
+    __tablename__ = 'sincronizacion_evaluadores'
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_synced_at = db.Column(db.DateTime, nullable=True)  # Última sincronización exitosa
+    last_attempt_at = db.Column(db.DateTime, nullable=True)  # Último intento (exitoso o no)
+    evaluadores_sincronizados = db.Column(db.Integer, default=0, nullable=False)
+    ultimo_error = db.Column(db.Text)
+
+    @classmethod
+    def get_estado(cls):
+        """Obtiene (o crea) la fila única de estado de sincronización"""
+        estado = cls.query.get(1)
+        if not estado:
+            estado = cls(id=1, evaluadores_sincronizados=0)
+            db.session.add(estado)
+            db.session.flush()
+        return estado
+
+    def __repr__(self):
+        return f'<SincronizacionEvaluadores {self.last_synced_at}>'
+
+
+class TrabajoDrive(db.Model):
+    """Trabajo pendiente contra Google Drive, procesado fuera de la petición HTTP"""
+    __tablename__ = 'trabajos_drive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)  # 'crear_carpeta', 'subir_archivo'
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    estado = db.Column(db.String(20), default='pendiente', nullable=False)  # 'pendiente', 'en_proceso', 'completado', 'error'
+    intentos = db.Column(db.Integer, default=0, nullable=False)
+    max_intentos = db.Column(db.Integer, default=5, nullable=False)
+    ultimo_error = db.Column(db.Text)
+    proximo_intento_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    locked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    solicitud_id = db.Column(db.Integer, db.ForeignKey('solicitudes_equivalencia.id', ondelete='CASCADE'), nullable=False)
+    solicitud = db.relationship('SolicitudEquivalencia',
+                                backref=db.backref('trabajos_drive', cascade='all, delete-orphan', passive_deletes=True))
+
+    __table_args__ = (
+        db.Index('ix_trabajos_drive_estado_proximo', 'estado', 'proximo_intento_at'),
+    )
+
+    def __repr__(self):
+        return f'<TrabajoDrive {self.id} {self.tipo} - {self.estado}>'
+
+
+class ContadorSolicitudes(db.Model):
+    """Cantidad de solicitudes por estado, mantenida en la misma transacción que los cambios"""
+    __tablename__ = 'contadores_solicitudes'
+
+    estado = db.Column(db.String(20), primary_key=True)
+    cantidad = db.Column(db.Integer, default=0, nullable=False)
+
     def __repr__(self):
-        return f'<Dictamen {self.id} - {self.asignatura_origen} -> {self.asignatura_destino}>'
\ No newline at end of file
+        return f'<ContadorSolicitudes {self.estado}={self.cantidad}>'
@@ -1,9 +1,11 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app.models import Usuario, SolicitudEquivalencia
 from app import db
-from app.services.google_drive_service import GoogleDriveService
-from app.services.evaluador_service import EvaluadorService
+from app.services.evaluador_service import ESTADOS_ACTIVOS
+from app.services.paginacion import paginar_solicitudes
+from app.services.estadisticas import conteos_por_estado
+from collections import defaultdict
 from functools import wraps
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -22,11 +24,12 @@ def admin_required(f):
 @login_required
 @admin_required
 def index():
-    # Get solicitudes statistics
-    total_solicitudes = SolicitudEquivalencia.query.count()
-    solicitudes_pendientes = SolicitudEquivalencia.query.filter_by(estado='en_evaluacion').count()
-    solicitudes_aprobadas = SolicitudEquivalencia.query.filter_by(estado='aprobada').count()
-    solicitudes_rechazadas = SolicitudEquivalencia.query.filter_by(estado='rechazada').count()
+    # Get solicitudes statistics (one read of the per-estado counters)
+    conteos = conteos_por_estado()
+    total_solicitudes = sum(conteos.values())
+    solicitudes_pendientes = conteos['en_evaluacion']
+    solicitudes_aprobadas = conteos['aprobada']
+    solicitudes_rechazadas = conteos['rechazada']
     
     return render_template('admin/index.html',
                            total_solicitudes=total_solicitudes,
@@ -40,7 +43,7 @@ def index():
 def list_usuarios():
     """View all users in the system (read-only, managed via Keycloak)"""
     usuarios = Usuario.query.all()
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     stats = evaluador_service.get_evaluadores_stats()
     
     # Add message about Keycloak management
@@ -80,15 +83,19 @@ def list_usuarios():
 @admin_required
 def list_evaluadores():
     """List all evaluadores from Keycloak with their workload information"""
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     
-    # Ensure fresh data from Keycloak
+    # Evaluadores from the local table (kept in sync in the background)
     evaluadores_with_workload = evaluador_service.get_evaluadores_for_selection()
     stats = evaluador_service.get_evaluadores_stats()
     
     # Add info message about data source
     if evaluador_service.is_keycloak_enabled():
-        flash(f'Mostrando {len(evaluadores_with_workload)} evaluadores sincronizados desde Keycloak.', 'info')
+        if stats['last_synced_at']:
+            flash(f'Mostrando {len(evaluadores_with_workload)} evaluadores sincronizados desde Keycloak '
+                  f'(última sincronización: {stats["last_synced_at"].strftime("%d/%m/%Y %H:%M")}).', 'info')
+        else:
+            flash('Los evaluadores aún no se sincronizaron desde Keycloak. La sincronización se realiza en segundo plano.', 'info')
     else:
         flash('Keycloak no está configurado. Mostrando evaluadores locales únicamente.', 'warning')
     
@@ -100,13 +107,15 @@ def list_evaluadores():
 @login_required
 @admin_required
 def dashboard():
-    total_solicitudes = SolicitudEquivalencia.query.count()
-    solicitudes_pendientes = SolicitudEquivalencia.query.filter_by(estado='pendiente').count()
-    solicitudes_aprobadas = SolicitudEquivalencia.query.filter_by(estado='aprobada').count()
-    solicitudes_rechazadas = SolicitudEquivalencia.query.filter_by(estado='rechazada').count()
+    conteos = conteos_por_estado()
+    total_solicitudes = sum(conteos.values())
+    solicitudes_pendientes = conteos['pendiente']
+    solicitudes_aprobadas = conteos['aprobada']
+    solicitudes_rechazadas = conteos['rechazada']
     
-    usuarios_evaluadores = Usuario.query.filter_by(rol='evaluador').count()
-    usuarios_depto = Usuario.query.filter_by(rol='depto_estudiantes').count()
+    usuarios_por_rol = dict(db.session.query(Usuario.rol, db.func.count(Usuario.id)).group_by(Usuario.rol).all())
+    usuarios_evaluadores = usuarios_por_rol.get('evaluador', 0)
+    usuarios_depto = usuarios_por_rol.get('depto_estudiantes', 0)
     
     return render_template('admin/dashboard.html',
                            total_solicitudes=total_solicitudes,
@@ -116,13 +125,29 @@ def dashboard():
                            usuarios_evaluadores=usuarios_evaluadores,
                            usuarios_depto=usuarios_depto)
 
+@admin_bp.route('/cache')
+@login_required
+@admin_required
+def cache_fragmentos():
+    """Métricas de la caché de fragmentos de los listados"""
+    metricas = current_app.extensions['fragment_cache'].metricas()
+    return render_template('admin/cache_fragmentos.html', metricas=metricas)
+
+@admin_bp.route('/cache/vaciar', methods=['POST'])
+@login_required
+@admin_required
+def vaciar_cache_fragmentos():
+    current_app.extensions['fragment_cache'].invalidar()
+    flash('Caché de listados vaciada', 'success')
+    return redirect(url_for('admin.cache_fragmentos'))
+
 @admin_bp.route('/debug/google-drive', methods=['GET'])
 @login_required
 @admin_required
 def debug_google_drive():
     """Ruta de debug para probar la conexión con Google Drive"""
     try:
-        drive_service = GoogleDriveService()
+        drive_service = current_app.extensions['services'].google_drive
         
         # Verificar configuración
         config_result = drive_service.verificar_configuracion()
@@ -157,35 +182,44 @@ def debug_google_drive():
 @admin_required
 def manage_evaluadores():
     """Admin view for managing evaluator assignments and workload"""
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     
-    # Ensure we have fresh evaluador data from Keycloak
+    # Evaluadores from the local table (kept in sync in the background)
     evaluadores_with_workload = evaluador_service.get_evaluadores_for_selection()
     
-    # Get all solicitudes with their evaluator assignments
-    solicitudes = SolicitudEquivalencia.query.all()
+    # Active assignments per evaluador (only these are listed in the modals)
+    asignaciones = defaultdict(list)
+    for solicitud in SolicitudEquivalencia.query.filter(
+        SolicitudEquivalencia.evaluador_id.isnot(None),
+        SolicitudEquivalencia.estado.in_(ESTADOS_ACTIVOS)
+    ).order_by(SolicitudEquivalencia.fecha_solicitud.desc(), SolicitudEquivalencia.id.desc()):
+        asignaciones[solicitud.evaluador_id].append(solicitud)
     
-    # Get unassigned solicitudes
-    unassigned_solicitudes = SolicitudEquivalencia.query.filter(
+    # Unassigned solicitudes, one page at a time
+    unassigned_query = SolicitudEquivalencia.query.filter(
         SolicitudEquivalencia.evaluador_id.is_(None),
-        SolicitudEquivalencia.estado.in_(['pendiente', 'en_evaluacion'])
-    ).all()
+        SolicitudEquivalencia.estado.in_(ESTADOS_ACTIVOS)
+    )
+    pagina = paginar_solicitudes(unassigned_query, request.args, filtros={})
+    total_unassigned = unassigned_query.count()
     
     # Add info flash if Keycloak is enabled
     if evaluador_service.is_keycloak_enabled():
-        flash('Los evaluadores se sincronizan automáticamente desde Keycloak. Lista actualizada.', 'info')
+        flash('Los evaluadores se sincronizan automáticamente desde Keycloak en segundo plano.', 'info')
     
     return render_template('admin/manage_evaluadores.html', 
                          evaluadores_with_workload=evaluadores_with_workload,
-                         unassigned_solicitudes=unassigned_solicitudes,
-                         all_solicitudes=solicitudes)
+                         unassigned_solicitudes=pagina.items,
+                         total_unassigned=total_unassigned,
+                         pagina=pagina,
+                         asignaciones=asignaciones)
 
 @admin_bp.route('/assign_evaluador', methods=['POST'])
 @login_required
 @admin_required
 def assign_evaluador():
     """Admin endpoint to assign evaluator to solicitud"""
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     solicitud_id = request.form.get('solicitud_id')
     evaluador_id = request.form.get('evaluador_id')
     
@@ -212,20 +246,15 @@ def assign_evaluador():
 @login_required
 @admin_required 
 def sync_evaluadores():
-    """Admin endpoint to sync evaluadores from Keycloak"""
-    evaluador_service = EvaluadorService()
+    """Admin endpoint to enqueue a background sync of evaluadores from Keycloak"""
+    evaluador_service = current_app.extensions['services'].evaluadores
     
     if evaluador_service.is_keycloak_enabled():
-        try:
-            force_sync = request.form.get('force') == 'true'
-            if force_sync:
-                evaluadores = evaluador_service.force_sync_evaluadores()
-                flash(f'Sincronización forzada completada: {len(evaluadores)} evaluadores', 'success')
-            else:
-                evaluadores = evaluador_service.keycloak_service.sync_all_evaluadores()
-                flash(f'Sincronizados {len(evaluadores)} evaluadores desde Keycloak', 'success')
-        except Exception as e:
-            flash(f'Error al sincronizar evaluadores: {str(e)}', 'danger')
+        force_sync = request.form.get('force') == 'true'
+        if evaluador_service.request_sync(force=force_sync):
+            flash('Sincronización de evaluadores en curso. La lista se actualizará en unos instantes.', 'info')
+        else:
+            flash('La sincronización de evaluadores está deshabilitada', 'warning')
     else:
         flash('Keycloak no está habilitado', 'warning')
     
@@ -235,16 +264,14 @@ def sync_evaluadores():
 @login_required
 @admin_required
 def refresh_evaluadores():
-    """Manually refresh evaluadores from Keycloak"""
-    evaluador_service = EvaluadorService()
+    """Manually enqueue a refresh of evaluadores from Keycloak"""
+    evaluador_service = current_app.extensions['services'].evaluadores
     
     if evaluador_service.is_keycloak_enabled():
-        try:
-            # Force refresh from Keycloak
-            evaluadores = evaluador_service.ensure_fresh_evaluadores()
-            flash(f'Lista de evaluadores actualizada: {len(evaluadores)} evaluadores disponibles desde Keycloak.', 'success')
-        except Exception as e:
-            flash(f'Error al actualizar evaluadores desde Keycloak: {str(e)}', 'danger')
+        if evaluador_service.request_sync():
+            flash('Actualización de evaluadores en curso desde Keycloak. La lista se actualizará en unos instantes.', 'info')
+        else:
+            flash('La sincronización de evaluadores está deshabilitada', 'warning')
     else:
         flash('Keycloak no está configurado. No se puede actualizar desde el servidor de autenticación.', 'warning')
     
@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models import Usuario
 from app import db
@@ -35,8 +35,7 @@ def callback():
         return redirect(url_for('auth.login'))
     
     try:
-        from app.services.keycloak_service import KeycloakService
-        keycloak_service = KeycloakService()
+        keycloak_service = current_app.extensions['services'].keycloak
         
         # Exchange code for token
         token = keycloak_service.exchange_code_for_token(code)
@@ -143,8 +142,7 @@ def handle_keycloak_login():
         return redirect(url_for('auth.login'))
     
     try:
-        from app.services.keycloak_service import KeycloakService
-        keycloak_service = KeycloakService()
+        keycloak_service = current_app.extensions['services'].keycloak
         
         # Authenticate directly with Keycloak
         token = keycloak_service.authenticate_with_password(username, password)
@@ -208,8 +206,7 @@ def logout():
     if use_keycloak and current_user.is_keycloak_user:
         # Keycloak logout
         try:
-            from app.services.keycloak_service import KeycloakService
-            keycloak_service = KeycloakService()
+            keycloak_service = current_app.extensions['services'].keycloak
             logout_url = keycloak_service.logout_url(url_for('auth.login', _external=True))
             
             # Clear session
@@ -240,8 +237,7 @@ def force_logout():
     
     if use_keycloak:
         try:
-            from app.services.keycloak_service import KeycloakService
-            keycloak_service = KeycloakService()
+            keycloak_service = current_app.extensions['services'].keycloak
             logout_url = keycloak_service.logout_url(url_for('auth.login', _external=True))
             
             flash('Sesión completamente cerrada', 'success')
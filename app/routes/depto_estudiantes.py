@@ -1,10 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_required, current_user
-from app.models import Usuario, SolicitudEquivalencia, Dictamen
+from app.models import Usuario, SolicitudEquivalencia, Dictamen, TrabajoDrive
 from app import db
-from app.services.google_drive_service import GoogleDriveService
-from app.services.dictamen_service import DictamenService
-from app.services.evaluador_service import EvaluadorService
+from app.services.paginacion import paginar_solicitudes, carreras_destino
+from app.services.exportacion import respuesta_exportacion
 from functools import wraps
 from datetime import datetime
 import uuid
@@ -35,27 +34,31 @@ def index():
 @login_required
 @depto_required
 def list_equivalencias():
-    # Get filter parameter from URL
-    estado_filter = request.args.get('estado')
+    # Filtros (estado, carrera, evaluador) y paginación por cursor
+    pagina = paginar_solicitudes(SolicitudEquivalencia.query_listado(), request.args)
+    estado_filter = pagina.filtros.get('estado')
+    evaluador_service = current_app.extensions['services'].evaluadores
     
-    # Build query based on filter
-    query = SolicitudEquivalencia.query
-    if estado_filter:
-        query = query.filter_by(estado=estado_filter)
-    
-    solicitudes = query.all()
-    evaluador_service = EvaluadorService()
-    
-    # Ensure fresh evaluador data for assignments
+    # Evaluadores from the local table (kept in sync in the background)
     evaluadores_with_workload = evaluador_service.get_evaluadores_for_selection()
     
-    # Add info message about evaluador data source
-    if evaluador_service.is_keycloak_enabled():
-        flash('Lista de evaluadores actualizada desde Keycloak.', 'info')
+    # Options for the shared assignment modal, sent once as JSON
+    evaluadores_selector = [
+        {
+            'id': item.evaluador.id,
+            'nombre': f"{item.evaluador.nombre} {item.evaluador.apellido}",
+            'departamento': item.evaluador.departamento_academico,
+            'activas': item.workload,
+            'total': item.total_assigned,
+            'keycloak': bool(item.evaluador.is_keycloak_user)
+        }
+        for item in evaluadores_with_workload
+    ]
     
     # Add filter info message
     if estado_filter:
         estado_display = {
+            'pendiente': 'Pendientes',
             'en_evaluacion': 'En Evaluación',
             'aprobada': 'Aprobadas',
             'rechazada': 'Rechazadas'
@@ -64,18 +67,31 @@ def list_equivalencias():
     
     from flask_login import current_user
     return render_template('depto_estudiantes/list_equivalencias.html', 
-                         solicitudes=solicitudes, 
-                         evaluadores_with_workload=evaluadores_with_workload, 
+                         solicitudes=pagina.items, 
+                         pagina=pagina,
+                         carreras=carreras_destino(),
+                         evaluadores_filtro=[item.evaluador for item in evaluadores_with_workload],
+                         evaluadores_selector=evaluadores_selector,
                          current_user=current_user,
                          estado_filter=estado_filter)
 
+@depto_bp.route('/equivalencias/exportar')
+@login_required
+@depto_required
+def exportar_equivalencias():
+    try:
+        return respuesta_exportacion(request.args)
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('depto.list_equivalencias'))
+
 @depto_bp.route('/equivalencias/nueva', methods=['GET', 'POST'])
 @login_required
 @depto_required
 def new_equivalencia():
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     
-    # Ensure fresh evaluador data for selection
+    # Evaluadores from the local table (kept in sync in the background)
     evaluadores_with_workload = evaluador_service.get_evaluadores_for_selection()
     
     if request.method == 'POST':
@@ -128,79 +144,9 @@ def new_equivalencia():
                 doc_complementaria.save(ruta_doc_complementaria)
                 solicitud.doc_complementaria_url = f"uploads/{nombre_doc_complementaria}"
                 # El file_id de Google Drive se asignará tras la subida
-          # Guardar la solicitud en la base de datos
-        db.session.add(solicitud)
-        db.session.commit()
         
-        # Crear carpeta en Google Drive
-        try:
-            drive_service = GoogleDriveService()
-            config_check = drive_service.verificar_configuracion()
-            
-            if config_check['success']:
-                folder_result = drive_service.crear_carpeta_equivalencia(
-                    dni=solicitud.dni_solicitante,
-                    carrera_origen=solicitud.carrera_origen,
-                    id_equivalencia=solicitud.id_solicitud,
-                    timestamp=solicitud.fecha_solicitud
-                )
-                if folder_result['success']:
-                    # Actualizar la solicitud con la información de Google Drive
-                    solicitud.google_drive_folder_id = folder_result['folder_id']
-                    solicitud.google_drive_folder_name = folder_result['folder_name']
-                    solicitud.google_drive_folder_url = folder_result['folder_url']
-                    
-                    # Si hay archivo adjunto, subirlo a Google Drive
-                    if solicitud.ruta_archivo:
-                        archivo_local = os.path.join(current_app.root_path, 'static', solicitud.ruta_archivo)
-                        if os.path.exists(archivo_local):
-                            # Generar nombre del archivo según el formato especificado
-                            extension = os.path.splitext(solicitud.ruta_archivo)[1]
-                            nombre_archivo_drive = drive_service.generar_nombre_archivo_solicitud(
-                                dni=solicitud.dni_solicitante,
-                                carrera_origen=solicitud.carrera_origen,
-                                id_equivalencia=solicitud.id_solicitud,
-                                extension=extension
-                            )
-                            
-                            upload_result = drive_service.subir_archivo(
-                                folder_id=folder_result['folder_id'],
-                                file_path=archivo_local,
-                                file_name=nombre_archivo_drive
-                            )
-                            if upload_result['success']:
-                                solicitud.google_drive_file_id = upload_result['file_id']
-                                current_app.logger.info(f"Archivo subido a Google Drive: {upload_result['file_url']}")
-                            else:
-                                current_app.logger.error(f"Error al subir archivo a Google Drive: {upload_result.get('error')}")
-                    
-                    # Subir documentación complementaria si existe
-                    if solicitud.doc_complementaria_url:
-                        archivo_local = os.path.join(current_app.root_path, 'static', solicitud.doc_complementaria_url)
-                        if os.path.exists(archivo_local):
-                            extension = os.path.splitext(solicitud.doc_complementaria_url)[1]
-                            nombre_archivo_drive = f"DOC_COMPLEMENTARIA_{solicitud.id_solicitud}{extension}"
-                            upload_result = drive_service.subir_archivo(
-                                folder_id=folder_result['folder_id'],
-                                file_path=archivo_local,
-                                file_name=nombre_archivo_drive
-                            )
-                            if upload_result['success']:
-                                solicitud.doc_complementaria_file_id = upload_result['file_id']
-                                current_app.logger.info(f"Doc. complementaria subida a Google Drive: {upload_result['file_url']}")
-                            else:
-                                current_app.logger.error(f"Error al subir doc. complementaria a Google Drive: {upload_result.get('error')}")
-                    db.session.commit()
-                    flash(f'Solicitud creada correctamente. Carpeta de Google Drive: {folder_result["folder_name"]}', 'success')
-                else:
-                    flash('Solicitud creada, pero hubo un problema al crear la carpeta en Google Drive', 'warning')
-            else:
-                missing_config = ', '.join(config_check['missing_config'])
-                flash(f'Solicitud creada, pero falta configuración de Google Drive: {missing_config}', 'warning')
-                
-        except Exception as e:
-            current_app.logger.error(f"Error al crear carpeta en Google Drive: {str(e)}")
-            flash('Solicitud creada, pero hubo un error con Google Drive', 'warning')
+        db.session.add(solicitud)
+        db.session.flush()  # Para obtener el ID de la solicitud
         
         # Crear dictámenes iniciales para cada par de asignaturas si existen
         asignaturas_origen = request.form.getlist('asignatura_origen[]')
@@ -219,7 +165,45 @@ def new_equivalencia():
                     )
                     db.session.add(dictamen)
         
+        # Encolar la creación de la carpeta y la subida de archivos a Google Drive;
+        # se procesan en segundo plano para no demorar la respuesta
+        drive_service = current_app.extensions['services'].google_drive
+        config_check = drive_service.verificar_configuracion()
+        drive_jobs = current_app.extensions['drive_jobs']
+        
+        if config_check['success']:
+            archivos = []
+            if solicitud.ruta_archivo:
+                extension = os.path.splitext(solicitud.ruta_archivo)[1]
+                archivos.append({
+                    'campo': 'google_drive_file_id',
+                    'ruta': solicitud.ruta_archivo,
+                    'nombre': drive_service.generar_nombre_archivo_solicitud(
+                        dni=solicitud.dni_solicitante,
+                        carrera_origen=solicitud.carrera_origen,
+                        id_equivalencia=solicitud.id_solicitud,
+                        extension=extension
+                    )
+                })
+            if solicitud.doc_complementaria_url:
+                extension = os.path.splitext(solicitud.doc_complementaria_url)[1]
+                archivos.append({
+                    'campo': 'doc_complementaria_file_id',
+                    'ruta': solicitud.doc_complementaria_url,
+                    'nombre': f"DOC_COMPLEMENTARIA_{solicitud.id_solicitud}{extension}"
+                })
+            drive_jobs.encolar_preparacion_solicitud(solicitud, archivos)
+        else:
+            missing_config = ', '.join(config_check['missing_config'])
+            flash(f'Solicitud creada, pero falta configuración de Google Drive: {missing_config}', 'warning')
+        
+        # Guardar la solicitud, los dictámenes y los trabajos en una sola transacción
         db.session.commit()
+        
+        if config_check['success']:
+            drive_jobs.notificar()
+            flash('La carpeta de Google Drive y los archivos se están procesando en segundo plano.', 'info')
+        
         flash('Solicitud de equivalencia creada correctamente', 'success')
         return redirect(url_for('depto.list_equivalencias'))
     
@@ -229,8 +213,8 @@ def new_equivalencia():
 @login_required
 @depto_required
 def edit_equivalencia(id):
-    solicitud = SolicitudEquivalencia.query.get_or_404(id)
-    evaluador_service = EvaluadorService()
+    solicitud = SolicitudEquivalencia.query_detalle().get_or_404(id)
+    evaluador_service = current_app.extensions['services'].evaluadores
     evaluadores_with_workload = evaluador_service.get_evaluadores_with_workload()
     
     if request.method == 'POST':
@@ -262,14 +246,6 @@ def edit_equivalencia(id):
             archivo = request.files['archivo_solicitud']
             if archivo and archivo.filename:
                 try:
-                    # Si hay un archivo existente en Google Drive, eliminarlo
-                    if solicitud.google_drive_file_id:
-                        try:
-                            drive_service = GoogleDriveService()
-                            drive_service.eliminar_archivo(solicitud.google_drive_file_id)
-                        except Exception as e:
-                            current_app.logger.error(f"Error al eliminar archivo existente: {str(e)}")
-                    
                     # Generar nombre único para el archivo temporal
                     import tempfile
                     temp_dir = current_app.config['UPLOAD_FOLDER']
@@ -280,7 +256,7 @@ def edit_equivalencia(id):
                     archivo.save(temp_file.name)
                     
                     # Subir a Google Drive
-                    drive_service = GoogleDriveService()
+                    drive_service = current_app.extensions['services'].google_drive
                     nombre_archivo = drive_service.generar_nombre_archivo_solicitud(
                         solicitud.dni_solicitante,
                         solicitud.carrera_origen,
@@ -288,10 +264,12 @@ def edit_equivalencia(id):
                         extension
                     )
                     
+                    # El archivo existente en Google Drive se elimina en la misma petición
                     result = drive_service.subir_archivo(
                         solicitud.google_drive_folder_id,
                         temp_file.name,
-                        nombre_archivo
+                        nombre_archivo,
+                        reemplazar_file_id=solicitud.google_drive_file_id
                     )
                     
                     # Limpiar archivo temporal
@@ -318,14 +296,6 @@ def edit_equivalencia(id):
             archivo = request.files['doc_complementaria']
             if archivo and archivo.filename:
                 try:
-                    # Si hay un archivo existente en Google Drive, eliminarlo
-                    if solicitud.doc_complementaria_file_id:
-                        try:
-                            drive_service = GoogleDriveService()
-                            drive_service.eliminar_archivo(solicitud.doc_complementaria_file_id)
-                        except Exception as e:
-                            current_app.logger.error(f"Error al eliminar documentación complementaria existente: {str(e)}")
-                    
                     # Generar nombre único para el archivo temporal
                     import tempfile
                     temp_dir = current_app.config['UPLOAD_FOLDER']
@@ -336,13 +306,15 @@ def edit_equivalencia(id):
                     archivo.save(temp_file.name)
                     
                     # Subir a Google Drive
-                    drive_service = GoogleDriveService()
+                    drive_service = current_app.extensions['services'].google_drive
                     nombre_archivo = f"complementaria_{solicitud.id_solicitud}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}"
                     
+                    # El archivo existente en Google Drive se elimina en la misma petición
                     result = drive_service.subir_archivo(
                         solicitud.google_drive_folder_id,
                         temp_file.name,
-                        nombre_archivo
+                        nombre_archivo,
+                        reemplazar_file_id=solicitud.doc_complementaria_file_id
                     )
                     
                     # Limpiar archivo temporal
@@ -387,7 +359,7 @@ def delete_equivalencia(id):
     # Eliminar carpeta de Google Drive si existe
     if solicitud.google_drive_folder_id:
         try:
-            drive_service = GoogleDriveService()
+            drive_service = current_app.extensions['services'].google_drive
             config_check = drive_service.verificar_configuracion()
             
             if config_check['success']:
@@ -405,6 +377,10 @@ def delete_equivalencia(id):
         if os.path.exists(ruta_archivo):
             os.remove(ruta_archivo)
     
+    # Eliminar sus trabajos de Drive pendientes (en SQLite el ON DELETE CASCADE
+    # no se aplica sin PRAGMA foreign_keys)
+    TrabajoDrive.query.filter_by(solicitud_id=solicitud.id).delete(synchronize_session=False)
+    
     # Eliminar todos los dictámenes asociados
     for dictamen in solicitud.dictamenes:
         db.session.delete(dictamen)
@@ -420,37 +396,35 @@ def delete_equivalencia(id):
 @login_required
 @depto_required
 def manage_evaluadores():
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     evaluadores_with_workload = evaluador_service.get_evaluadores_with_workload()
     
-    # Get unassigned solicitudes
-    unassigned_solicitudes = SolicitudEquivalencia.query.filter(
+    # Unassigned solicitudes, one page at a time
+    unassigned_query = SolicitudEquivalencia.query.filter(
         SolicitudEquivalencia.evaluador_id.is_(None),
         SolicitudEquivalencia.estado.in_(['pendiente', 'en_evaluacion'])
-    ).all()
+    )
+    pagina = paginar_solicitudes(unassigned_query, request.args, filtros={})
     
     return render_template('depto_estudiantes/manage_evaluadores.html', 
                          evaluadores_with_workload=evaluadores_with_workload,
-                         unassigned_solicitudes=unassigned_solicitudes)
+                         unassigned_solicitudes=pagina.items,
+                         total_unassigned=unassigned_query.count(),
+                         pagina=pagina)
 
 @depto_bp.route('/sync_evaluadores', methods=['POST'])
 @login_required
 @depto_required
 def sync_evaluadores():
-    """Sync evaluadores from Keycloak"""
-    evaluador_service = EvaluadorService()
+    """Enqueue a background sync of evaluadores from Keycloak"""
+    evaluador_service = current_app.extensions['services'].evaluadores
     
     if evaluador_service.is_keycloak_enabled():
-        try:
-            force_sync = request.form.get('force') == 'true'
-            if force_sync:
-                evaluadores = evaluador_service.force_sync_evaluadores()
-                flash(f'Sincronización forzada completada: {len(evaluadores)} evaluadores', 'success')
-            else:
-                evaluadores = evaluador_service.keycloak_service.sync_all_evaluadores()
-                flash(f'Sincronizados {len(evaluadores)} evaluadores desde Keycloak', 'success')
-        except Exception as e:
-            flash(f'Error al sincronizar evaluadores: {str(e)}', 'danger')
+        force_sync = request.form.get('force') == 'true'
+        if evaluador_service.request_sync(force=force_sync):
+            flash('Sincronización de evaluadores en curso. La lista se actualizará en unos instantes.', 'info')
+        else:
+            flash('La sincronización de evaluadores está deshabilitada', 'warning')
     else:
         flash('Keycloak no está habilitado', 'warning')
     
@@ -461,7 +435,7 @@ def sync_evaluadores():
 @depto_required
 def auto_assign_evaluador(solicitud_id):
     """Auto-assign evaluator with least workload to solicitud"""
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     
     suggested_evaluador = evaluador_service.suggest_evaluador()
     if suggested_evaluador:
@@ -479,8 +453,8 @@ def auto_assign_evaluador(solicitud_id):
 @login_required
 @depto_required
 def view_equivalencia(id):
-    solicitud = SolicitudEquivalencia.query.get_or_404(id)
-    evaluador_service = EvaluadorService()
+    solicitud = SolicitudEquivalencia.query_detalle().get_or_404(id)
+    evaluador_service = current_app.extensions['services'].evaluadores
     evaluadores_with_workload = evaluador_service.get_evaluadores_with_workload()
     return render_template('depto_estudiantes/view_equivalencia.html', 
                          solicitud=solicitud,
@@ -501,7 +475,7 @@ def eliminar_archivo(solicitud_id, tipo):
     solicitud = SolicitudEquivalencia.query.get_or_404(solicitud_id)
     
     try:
-        drive_service = GoogleDriveService()
+        drive_service = current_app.extensions['services'].google_drive
         
         if tipo == 'solicitud' and solicitud.google_drive_file_id:
             # Eliminar archivo de Google Drive
@@ -541,7 +515,7 @@ def asignar_evaluador(solicitud_id):
         flash('Debe seleccionar un evaluador', 'danger')
         return redirect(url_for('depto.list_equivalencias'))
     
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     success, message = evaluador_service.assign_evaluador_to_solicitud(solicitud_id, int(evaluador_id))
     
     if success:
@@ -556,7 +530,7 @@ def asignar_evaluador(solicitud_id):
 @depto_required
 def desasignar_evaluador(solicitud_id):
     """Unassign an evaluator from a solicitud"""
-    evaluador_service = EvaluadorService()
+    evaluador_service = current_app.extensions['services'].evaluadores
     success, message = evaluador_service.unassign_evaluador_from_solicitud(solicitud_id)
     
     if success:
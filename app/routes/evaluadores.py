@@ -2,8 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 from app.models import SolicitudEquivalencia, Dictamen, Usuario
 from app import db
-from app.services.dictamen_service import DictamenService
-from app.services.google_drive_service import GoogleDriveService
+from app.services.paginacion import paginar_solicitudes, pagina_sin_filas, carreras_destino
 from functools import wraps
 from datetime import datetime
 
@@ -30,17 +29,36 @@ def index():
 @login_required
 @evaluador_required
 def list_equivalencias():
+    evaluadores_filtro = None
     if current_user.rol == 'admin':
-        solicitudes = SolicitudEquivalencia.query.all()
+        query = SolicitudEquivalencia.query_listado()
+        alcance = None
+        evaluadores_filtro = Usuario.query.filter_by(rol='evaluador').order_by(Usuario.apellido, Usuario.nombre).all()
     else:
-        solicitudes = SolicitudEquivalencia.query.filter_by(evaluador_id=current_user.id).all()
-    return render_template('evaluadores/list_equivalencias.html', solicitudes=solicitudes)
+        query = SolicitudEquivalencia.query_listado().filter_by(evaluador_id=current_user.id)
+        # Each evaluador only sees their own solicitudes
+        alcance = current_user.id
+
+    def renderizar_tabla():
+        pagina = paginar_solicitudes(query, request.args)
+        return render_template('evaluadores/_tabla_equivalencias.html', solicitudes=pagina.items, pagina=pagina)
+
+    fragmentos = current_app.extensions['fragment_cache']
+    tabla = fragmentos.obtener_o_renderizar(
+        fragmentos.clave(request.endpoint, request.args, current_user.rol, alcance),
+        renderizar_tabla
+    )
+    return render_template('evaluadores/list_equivalencias.html',
+                         tabla=tabla,
+                         pagina=pagina_sin_filas(request.args),
+                         carreras=carreras_destino(),
+                         evaluadores_filtro=evaluadores_filtro)
 
 @evaluadores_bp.route('/equivalencia/<int:id>')
 @login_required
 @evaluador_required
 def view_equivalencia(id):
-    solicitud = SolicitudEquivalencia.query.get_or_404(id)
+    solicitud = SolicitudEquivalencia.query_detalle().get_or_404(id)
     if current_user.rol != 'admin' and solicitud.evaluador_id != current_user.id:
         flash('No tienes permiso para acceder a esta solicitud', 'danger')
         return redirect(url_for('evaluadores.list_equivalencias'))
@@ -50,7 +68,7 @@ def view_equivalencia(id):
 @login_required
 @evaluador_required
 def dictamen_equivalencia(id):
-    solicitud = SolicitudEquivalencia.query.get_or_404(id)
+    solicitud = SolicitudEquivalencia.query_detalle().get_or_404(id)
     
     if current_user.rol != 'admin' and solicitud.evaluador_id != current_user.id:
         flash('No tienes permiso para acceder a esta solicitud', 'danger')
@@ -81,20 +99,6 @@ def dictamen_equivalencia(id):
                         except Exception as e:
                             current_app.logger.error(f"Error al eliminar doc. complementaria local anterior: {str(e)}")
                 
-                # Eliminar archivo anterior de Google Drive si existe
-                if solicitud.doc_complementaria_file_id and solicitud.google_drive_folder_id:
-                    try:
-                        drive_service = GoogleDriveService()
-                        config_check = drive_service.verificar_configuracion()
-                        if config_check['success']:
-                            delete_result = drive_service.eliminar_archivo(solicitud.doc_complementaria_file_id)
-                            if delete_result['success']:
-                                solicitud.doc_complementaria_file_id = None
-                        else:
-                            current_app.logger.warning("No se pudo eliminar doc. complementaria de Google Drive")
-                    except Exception as e:
-                        current_app.logger.error(f"Error al eliminar doc. complementaria de Google Drive: {str(e)}")
-                
                 # Guardar nuevo archivo localmente
                 doc_complementaria_id = str(uuid.uuid4())
                 extension = os.path.splitext(doc_complementaria.filename)[1]
@@ -107,14 +111,16 @@ def dictamen_equivalencia(id):
                 # Subir a Google Drive si la carpeta existe
                 if solicitud.google_drive_folder_id:
                     try:
-                        drive_service = GoogleDriveService()
+                        drive_service = current_app.extensions['services'].google_drive
                         config_check = drive_service.verificar_configuracion()
                         if config_check['success']:
                             nombre_archivo_drive = f"DOC_COMPLEMENTARIA_{solicitud.id_solicitud}{extension}"
+                            # El archivo anterior en Google Drive se elimina en la misma petición
                             upload_result = drive_service.subir_archivo(
                                 folder_id=solicitud.google_drive_folder_id,
                                 file_path=ruta_doc_complementaria,
-                                file_name=nombre_archivo_drive
+                                file_name=nombre_archivo_drive,
+                                reemplazar_file_id=solicitud.doc_complementaria_file_id
                             )
                             if upload_result['success']:
                                 solicitud.doc_complementaria_file_id = upload_result['file_id']
@@ -190,7 +196,7 @@ def dictamen_equivalencia(id):
                 solicitud.firma_evaluador = firma
             
             # Manejar cambios de estado y dictamen final
-            dictamen_service = DictamenService()
+            dictamen_service = current_app.extensions['services'].dictamenes
             dictamen_result = dictamen_service.manejar_cambio_estado(solicitud, estado_anterior, estado_nuevo)
             if not dictamen_result['success']:
                 flash(f'Error al procesar dictamen: {dictamen_result["error"]}', 'warning')
@@ -259,7 +265,7 @@ def eliminar_archivo(solicitud_id, tipo):
         return redirect(url_for('evaluadores.dictamen_equivalencia', id=solicitud_id))
 
     try:
-        drive_service = GoogleDriveService()
+        drive_service = current_app.extensions['services'].google_drive
         config_check = drive_service.verificar_configuracion()
         
         if not config_check['success']:
@@ -1,8 +1,10 @@
 ﻿# -*- coding: utf-8 -*-
-from flask import Blueprint, render_template, flash, redirect, url_for
+from flask import Blueprint, render_template, flash, redirect, url_for, request, current_app
 from flask_login import login_required, current_user
 from functools import wraps
-from app.models import SolicitudEquivalencia
+from app.models import SolicitudEquivalencia, Usuario
+from app.services.paginacion import paginar_solicitudes, pagina_sin_filas, carreras_destino
+from app.services.exportacion import respuesta_exportacion
 
 lector_bp = Blueprint("lector", __name__, url_prefix="/lector")
 
@@ -19,12 +21,35 @@ def lector_required(f):
 @login_required
 @lector_required
 def list_equivalencias():
-    solicitudes = SolicitudEquivalencia.query.all()
-    return render_template("lector/list_equivalencias.html", solicitudes=solicitudes)
+    def renderizar_tabla():
+        pagina = paginar_solicitudes(SolicitudEquivalencia.query_listado(), request.args)
+        return render_template("lector/_tabla_equivalencias.html", solicitudes=pagina.items, pagina=pagina)
+
+    fragmentos = current_app.extensions["fragment_cache"]
+    tabla = fragmentos.obtener_o_renderizar(
+        fragmentos.clave(request.endpoint, request.args, current_user.rol),
+        renderizar_tabla
+    )
+    evaluadores_filtro = Usuario.query.filter_by(rol="evaluador").order_by(Usuario.apellido, Usuario.nombre).all()
+    return render_template("lector/list_equivalencias.html",
+                           tabla=tabla,
+                           pagina=pagina_sin_filas(request.args),
+                           carreras=carreras_destino(),
+                           evaluadores_filtro=evaluadores_filtro)
+
+@lector_bp.route("/equivalencias/exportar")
+@login_required
+@lector_required
+def exportar_equivalencias():
+    try:
+        return respuesta_exportacion(request.args)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("lector.list_equivalencias"))
 
 @lector_bp.route("/equivalencias/ver/<int:id>")
 @login_required
 @lector_required
 def view_equivalencia(id):
-    solicitud = SolicitudEquivalencia.query.get_or_404(id)
+    solicitud = SolicitudEquivalencia.query_detalle().get_or_404(id)
     return render_template("lector/view_equivalencia.html", solicitud=solicitud)
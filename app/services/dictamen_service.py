@@ -1,4 +1,6 @@
 # -*- coding: utf-8 -*-
+import os
+import time
 from datetime import datetime
 from flask import current_app
 from app import db
@@ -9,9 +11,43 @@ from app.services.placeholder_processor import PlaceholderProcessor
 class DictamenService:
     """Service for managing dictamen final documents"""
     
-    def __init__(self):
-        self.google_drive = GoogleDriveService()
-        self.placeholder_processor = PlaceholderProcessor()
+    def __init__(self, google_drive=None, placeholder_processor=None):
+        self.google_drive = google_drive or GoogleDriveService()
+        self.placeholder_processor = placeholder_processor or PlaceholderProcessor()
+        # Placeholders del template: (template_id, claves, leido_en)
+        self.template_scan_ttl = int(os.getenv('DICTAMEN_TEMPLATE_SCAN_TTL', '3600'))
+        self._placeholders_template = None
+    
+    def placeholders_template(self):
+        """
+        Placeholders que contiene el template de dictamen
+        
+        El template se lee una sola vez (getTemplatePlaceholders) y el conjunto
+        se guarda en memoria DICTAMEN_TEMPLATE_SCAN_TTL segundos, para tomar
+        cambios del template sin reiniciar la aplicación.
+        
+        Returns:
+            frozenset | None: Claves del template, o None si no se pudo leer
+                (en ese caso se calculan todos los placeholders)
+        """
+        template_id = self.google_drive.dictamen_template_id
+        cache = self._placeholders_template
+        if cache and cache[0] == template_id and time.monotonic() - cache[2] < self.template_scan_ttl:
+            return cache[1]
+        
+        result = self.google_drive.obtener_placeholders_template()
+        if not result['success']:
+            current_app.logger.warning(f"No se pudieron leer los placeholders del template: {result['error']}")
+            return None
+        claves = frozenset(result['placeholders'])
+        self._placeholders_template = (template_id, claves, time.monotonic())
+        return claves
+    
+    def _procesar_placeholders(self, solicitud, claves=None):
+        """Valores de los placeholders del template para una solicitud"""
+        if claves is None:
+            claves = self.placeholders_template()
+        return self.placeholder_processor.process_solicitud_placeholders(solicitud, claves)
     
     def generar_dictamen_final(self, solicitud):
         """
@@ -39,22 +75,26 @@ class DictamenService:
                     'success': False,
                     'error': 'La solicitud no tiene carpeta asociada en Google Drive'
                 }
-              # Procesar placeholders
-            placeholders = self.placeholder_processor.process_solicitud_placeholders(solicitud)
+            # La fecha de resolución forma parte de los placeholders y de la huella
+            fecha_resolucion_anterior = solicitud.fecha_resolucion
+            solicitud.fecha_resolucion = datetime.now()
             
-            # Eliminar dictamen existente si hay uno
-            if solicitud.dictamen_final_file_id:
-                current_app.logger.info(f"Eliminando dictamen final existente: {solicitud.dictamen_final_file_id}")
-                self.google_drive.eliminar_archivo(solicitud.dictamen_final_file_id)
+            # Procesar placeholders
+            claves = self.placeholders_template()
+            placeholders = self._procesar_placeholders(solicitud, claves)
             
-            # Crear nuevo dictamen
-            result = self.google_drive.crear_dictamen_final(solicitud, placeholders)
+            # Crear nuevo dictamen; el existente, si hay uno, se elimina en la misma petición
+            if solicitud.dictamen_final_file_id:
+                current_app.logger.info(f"Reemplazando dictamen final existente: {solicitud.dictamen_final_file_id}")
+            result = self.google_drive.crear_dictamen_final(
+                solicitud, placeholders, reemplazar_file_id=solicitud.dictamen_final_file_id
+            )
             
             if result['success']:
                 # Actualizar la solicitud con la información del dictamen
                 solicitud.dictamen_final_file_id = result['file_id']
                 solicitud.dictamen_final_url = result['file_url']
-                solicitud.fecha_resolucion = datetime.now()
+                solicitud.dictamen_final_hash = self.placeholder_processor.huella(solicitud, claves)
                 
                 db.session.commit()
                 
@@ -66,6 +106,7 @@ class DictamenService:
                     'message': 'Dictamen final generado exitosamente'
                 }
             else:
+                solicitud.fecha_resolucion = fecha_resolucion_anterior
                 return result
                 
         except Exception as e:
@@ -76,15 +117,102 @@ class DictamenService:
                 'error': f'Error inesperado al generar dictamen final: {str(e)}'
             }
     
+    def generar_dictamenes_lote(self, solicitudes):
+        """
+        Genera los dictámenes finales de varias solicitudes resueltas
+
+        Los documentos se crean en una sola invocación de Apps Script (o en
+        varias, con token de continuación, si el lote no entra en el tiempo
+        máximo de ejecución) en lugar de una petición por solicitud. Se hace
+        commit después de cada invocación, así que lo ya generado se conserva
+        aunque falle una invocación posterior.
+
+        Args:
+            solicitudes (list): Solicitudes aprobadas o rechazadas
+
+        Returns:
+            dict: 'success' (todas generadas), 'generados', 'errores' y
+                'resultados' ({solicitud.id: resultado como el de
+                generar_dictamen_final})
+        """
+        resultados = {}
+        items = []
+        fechas_anteriores = {}
+        claves = self.placeholders_template()
+        for solicitud in solicitudes:
+            if solicitud.estado not in ['aprobada', 'rechazada']:
+                resultados[solicitud.id] = {
+                    'success': False,
+                    'error': 'La solicitud debe estar aprobada o rechazada para generar el dictamen final'
+                }
+            elif not solicitud.google_drive_folder_id:
+                resultados[solicitud.id] = {
+                    'success': False,
+                    'error': 'La solicitud no tiene carpeta asociada en Google Drive'
+                }
+            else:
+                # La fecha de resolución forma parte de los placeholders y de la huella
+                fechas_anteriores[solicitud.id] = solicitud.fecha_resolucion
+                solicitud.fecha_resolucion = datetime.now()
+                placeholders = self.placeholder_processor.process_solicitud_placeholders(solicitud, claves)
+                items.append((solicitud, placeholders))
+
+        current_app.logger.info(f"Generando {len(items)} dictámenes finales en lote")
+        por_id = {solicitud.id: solicitud for solicitud, _ in items}
+        huellas = {solicitud.id: self.placeholder_processor.huella(solicitud, claves) for solicitud, _ in items}
+        try:
+            for parcial in self.google_drive.crear_dictamenes_finales_lote(items):
+                invocacion = {}
+                for resultado in parcial:
+                    solicitud = por_id[resultado['solicitud_id']]
+                    if resultado['success']:
+                        solicitud.dictamen_final_file_id = resultado['file_id']
+                        solicitud.dictamen_final_url = resultado['file_url']
+                        solicitud.dictamen_final_hash = huellas[solicitud.id]
+                        invocacion[solicitud.id] = {
+                            'success': True,
+                            'file_id': resultado['file_id'],
+                            'file_url': resultado['file_url'],
+                            'message': 'Dictamen final generado exitosamente'
+                        }
+                    else:
+                        solicitud.fecha_resolucion = fechas_anteriores[solicitud.id]
+                        invocacion[solicitud.id] = {'success': False, 'error': resultado['error']}
+                db.session.commit()
+                resultados.update(invocacion)
+        except Exception as e:
+            current_app.logger.error(f"Error al generar dictámenes en lote: {str(e)}")
+            db.session.rollback()
+            for solicitud, _ in items:
+                resultados.setdefault(solicitud.id, {
+                    'success': False,
+                    'error': f'Error inesperado al generar dictamen final: {str(e)}'
+                })
+
+        generados = sum(1 for resultado in resultados.values() if resultado['success'])
+        return {
+            'success': generados == len(resultados),
+            'generados': generados,
+            'errores': len(resultados) - generados,
+            'resultados': resultados
+        }
+
     def actualizar_dictamen_final(self, solicitud):
         """
         Actualiza el dictamen final existente con información actualizada
         
+        Los placeholders del documento ya fueron reemplazados, así que no se
+        puede actualizar en el lugar: se compara la huella de los campos de los
+        que dependen los placeholders del template con la del documento
+        (dictamen_final_hash) y, sólo si cambiaron, se calculan los
+        placeholders y se vuelve a generar desde el template reemplazando el
+        anterior. Sin cambios no se llama a Apps Script.
+        
         Args:
             solicitud (SolicitudEquivalencia): La solicitud de equivalencia
             
         Returns:
-            dict: Resultado de la operación
+            dict: Resultado de la operación ('actualizado' indica si se regeneró)
         """
         try:
             if not solicitud.dictamen_final_file_id:
@@ -92,16 +220,35 @@ class DictamenService:
                     'success': False,
                     'error': 'No existe dictamen final para actualizar'
                 }
-              # Procesar placeholders actualizados
-            placeholders = self.placeholder_processor.process_solicitud_placeholders(solicitud)
             
-            # Actualizar el documento
-            result = self.google_drive.actualizar_dictamen_final(solicitud.dictamen_final_file_id, placeholders)
+            claves = self.placeholders_template()
+            huella = self.placeholder_processor.huella(solicitud, claves)
+            if huella == solicitud.dictamen_final_hash:
+                current_app.logger.info(f"Dictamen final sin cambios: {solicitud.dictamen_final_file_id}")
+                return {
+                    'success': True,
+                    'actualizado': False,
+                    'message': 'El dictamen final ya está actualizado'
+                }
+            
+            # Regenerar desde el template; el anterior se elimina en la misma petición
+            placeholders = self._procesar_placeholders(solicitud, claves)
+            result = self.google_drive.crear_dictamen_final(
+                solicitud, placeholders, reemplazar_file_id=solicitud.dictamen_final_file_id
+            )
             
             if result['success']:
-                current_app.logger.info(f"Dictamen final actualizado exitosamente: {solicitud.dictamen_final_file_id}")
+                solicitud.dictamen_final_file_id = result['file_id']
+                solicitud.dictamen_final_url = result['file_url']
+                solicitud.dictamen_final_hash = huella
+                db.session.commit()
+                
+                current_app.logger.info(f"Dictamen final actualizado exitosamente: {result['file_id']}")
                 return {
                     'success': True,
+                    'actualizado': True,
+                    'file_id': result['file_id'],
+                    'file_url': result['file_url'],
                     'message': 'Dictamen final actualizado exitosamente'
                 }
             else:
@@ -109,6 +256,7 @@ class DictamenService:
                 
         except Exception as e:
             current_app.logger.error(f"Error al actualizar dictamen final: {str(e)}")
+            db.session.rollback()
             return {
                 'success': False,
                 'error': f'Error inesperado al actualizar dictamen final: {str(e)}'
@@ -140,6 +288,7 @@ class DictamenService:
                 # Limpiar campos de dictamen en la solicitud
                 solicitud.dictamen_final_file_id = None
                 solicitud.dictamen_final_url = None
+                solicitud.dictamen_final_hash = None
                 solicitud.fecha_resolucion = None
                 
                 db.session.commit()
@@ -0,0 +1,182 @@
+import base64
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class DriveFileCache:
+    """Caché en disco del contenido de archivos de Google Drive
+
+    Cada archivo se guarda como <sha256(file_id)>.bin junto a un .json con su
+    nombre y tipo MIME, de modo que /descargar_archivo_drive puede servirlo con
+    send_file desde una ruta (Range, ETag y Last-Modified). El tamaño total se
+    limita a DRIVE_CACHE_MAX_BYTES desalojando los archivos usados hace más
+    tiempo; la fecha de uso se registra en el .json para que el mtime del .bin
+    (Last-Modified) no cambie en cada lectura.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.directorio = None
+        self.max_bytes = 0
+        self._lock = threading.Lock()
+        self._locks_descarga = {}
+        self._total_bytes = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directorio = os.getenv('DRIVE_CACHE_DIR', os.path.join(app.instance_path, 'drive_cache'))
+        self.max_bytes = int(os.getenv('DRIVE_CACHE_MAX_BYTES', str(500 * 1024 * 1024)))
+        app.extensions['drive_file_cache'] = self
+
+    @property
+    def habilitada(self):
+        return self.max_bytes > 0
+
+    def _rutas(self, file_id):
+        clave = hashlib.sha256(file_id.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directorio, clave)
+        return base + '.bin', base + '.json'
+
+    def obtener(self, file_id):
+        """
+        Devuelve el archivo cacheado, o None si no está en la caché
+
+        Returns:
+            dict | None: {'path', 'fileName', 'mimeType'}
+        """
+        if not self.habilitada:
+            return None
+        ruta_datos, ruta_meta = self._rutas(file_id)
+        try:
+            with open(ruta_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if not os.path.exists(ruta_datos):
+                return None
+            # Marcar como usado recientemente (LRU)
+            os.utime(ruta_meta, None)
+        except (OSError, ValueError):
+            return None
+        return {'path': ruta_datos, 'fileName': meta.get('fileName'), 'mimeType': meta.get('mimeType')}
+
+    def obtener_o_descargar(self, file_id, drive_service):
+        """
+        Devuelve el archivo desde la caché, descargándolo de Drive si hace falta
+
+        Las descargas concurrentes del mismo file_id en el proceso se
+        serializan para no pedir el archivo dos veces.
+
+        Returns:
+            dict: {'success': True, 'path', 'fileName', 'mimeType'} o {'success': False, 'error': str}
+        """
+        cacheado = self.obtener(file_id)
+        if cacheado:
+            return {'success': True, **cacheado}
+
+        with self._lock:
+            lock = self._locks_descarga.setdefault(file_id, threading.Lock())
+        with lock:
+            try:
+                cacheado = self.obtener(file_id)
+                if cacheado:
+                    return {'success': True, **cacheado}
+
+                result = drive_service.obtener_contenido_archivo(file_id)
+                if not result['success']:
+                    return result
+
+                if not self.habilitada:
+                    # Sin caché: se usa un archivo temporal que borra el llamador
+                    fd, ruta = tempfile.mkstemp(prefix='drive_')
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(base64.b64decode(result['content']))
+                    return {'success': True, 'path': ruta, 'fileName': result.get('fileName'),
+                            'mimeType': result.get('mimeType'), 'temporal': True}
+
+                cacheado = self.guardar(file_id, result['content'], result.get('fileName'), result.get('mimeType'))
+                return {'success': True, **cacheado}
+            finally:
+                with self._lock:
+                    self._locks_descarga.pop(file_id, None)
+
+    def guardar(self, file_id, contenido_b64, file_name, mime_type):
+        """Guarda en la caché el contenido (base64) de un archivo y aplica el límite de tamaño"""
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta_datos, ruta_meta = self._rutas(file_id)
+
+        # Escritura atómica: otros procesos nunca ven un archivo a medio escribir
+        fd, tmp_datos = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(base64.b64decode(contenido_b64))
+        tamano = os.path.getsize(tmp_datos)
+        if tamano > self.max_bytes:
+            # Más grande que toda la caché: se sirve una sola vez y se descarta
+            return {'path': tmp_datos, 'fileName': file_name, 'mimeType': mime_type, 'temporal': True}
+        reemplazado = os.path.getsize(ruta_datos) if os.path.exists(ruta_datos) else 0
+        os.replace(tmp_datos, ruta_datos)
+
+        fd, tmp_meta = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'fileId': file_id, 'fileName': file_name, 'mimeType': mime_type,
+                       'size': tamano, 'cachedAt': time.time()}, f)
+        os.replace(tmp_meta, ruta_meta)
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += tamano - reemplazado
+        self._aplicar_limite()
+        return {'path': ruta_datos, 'fileName': file_name, 'mimeType': mime_type}
+
+    def invalidar(self, file_id):
+        """Elimina un archivo de la caché (tras borrarlo o modificarlo en Drive)"""
+        if not file_id or not self.directorio:
+            return
+        for ruta in self._rutas(file_id):
+            try:
+                tamano = os.path.getsize(ruta) if ruta.endswith('.bin') else 0
+                os.remove(ruta)
+            except OSError:
+                continue
+            with self._lock:
+                if self._total_bytes is not None:
+                    self._total_bytes -= tamano
+
+    def _entradas(self):
+        """Lista (último uso, tamaño, ruta .bin, ruta .json) de los archivos cacheados"""
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if not nombre.endswith('.json'):
+                continue
+            ruta_meta = os.path.join(self.directorio, nombre)
+            ruta_datos = ruta_meta[:-len('.json')] + '.bin'
+            try:
+                entradas.append((os.path.getmtime(ruta_meta), os.path.getsize(ruta_datos), ruta_datos, ruta_meta))
+            except OSError:
+                continue
+        return entradas
+
+    def _aplicar_limite(self):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(e[1] for e in self._entradas())
+            if self._total_bytes <= self.max_bytes:
+                return
+
+            # Recalcular desde disco: otros procesos comparten el directorio
+            entradas = sorted(self._entradas())
+            total = sum(e[1] for e in entradas)
+            for _, tamano, ruta_datos, ruta_meta in entradas:
+                if total <= self.max_bytes:
+                    break
+                for ruta in (ruta_meta, ruta_datos):
+                    try:
+                        os.remove(ruta)
+                    except OSError:
+                        pass
+                total -= tamano
+            self._total_bytes = total
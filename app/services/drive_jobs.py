@@ -0,0 +1,313 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+
+
+class DriveJobQueue:
+    """Cola persistente de trabajos contra Google Drive
+
+    Los trabajos se guardan en la tabla trabajos_drive y los procesa un pool de
+    hilos (DRIVE_JOB_WORKERS) o un proceso dedicado con
+    `flask procesar-trabajos-drive`. Cada trabajo tiene una clave de idempotencia,
+    reintentos con backoff exponencial y actualiza el estado de Drive de su
+    solicitud (drive_estado / drive_error).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.workers = 0
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = int(os.getenv('DRIVE_JOB_WORKERS', '2'))
+        self.poll_interval = float(os.getenv('DRIVE_JOB_POLL_INTERVAL', '5'))
+        self.max_intentos = int(os.getenv('DRIVE_JOB_MAX_RETRIES', '5'))
+        self.backoff_base = float(os.getenv('DRIVE_JOB_BACKOFF', '30'))
+        self.lock_timeout = int(os.getenv('DRIVE_JOB_LOCK_TIMEOUT', '600'))
+        app.extensions['drive_jobs'] = self
+
+        # Start lazily on the first request so CLI commands and migrations
+        # don't spawn worker threads
+        @app.before_request
+        def _start_drive_jobs():
+            if self.workers > 0 and not self._threads:
+                self.start()
+
+    # ------------------------------------------------------------------
+    # Encolado
+    # ------------------------------------------------------------------
+
+    def encolar(self, solicitud, tipo, payload, idempotency_key):
+        """
+        Agrega un trabajo a la cola (el llamador hace el commit)
+
+        Si ya existe un trabajo con la misma clave de idempotencia se devuelve
+        ese trabajo en lugar de crear uno nuevo.
+        """
+        from app.models import TrabajoDrive
+
+        existente = TrabajoDrive.query.filter_by(idempotency_key=idempotency_key).first()
+        if existente:
+            return existente
+
+        trabajo = TrabajoDrive(
+            tipo=tipo,
+            idempotency_key=idempotency_key,
+            payload=json.dumps(payload),
+            estado='pendiente',
+            max_intentos=self.max_intentos,
+            proximo_intento_at=datetime.now(),
+            solicitud_id=solicitud.id
+        )
+        db.session.add(trabajo)
+        solicitud.drive_estado = 'pendiente'
+        solicitud.drive_error = None
+        return trabajo
+
+    def encolar_preparacion_solicitud(self, solicitud, archivos):
+        """
+        Encola la creación de la carpeta de una solicitud y la subida de sus archivos
+
+        Args:
+            solicitud (SolicitudEquivalencia): Solicitud ya guardada (con id)
+            archivos (list): Dicts con 'campo' (columna del file_id), 'ruta'
+                (relativa a static/) y 'nombre' (nombre en Google Drive)
+        """
+        return self.encolar(
+            solicitud,
+            'crear_carpeta',
+            {'archivos': archivos},
+            f"crear_carpeta:{solicitud.id}"
+        )
+
+    def notificar(self):
+        """Despierta a los workers tras un commit con trabajos nuevos"""
+        if self.workers > 0 and not self._threads:
+            self.start()
+        self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def start(self, workers=None):
+        """Start the worker threads (idempotent)"""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(workers or self.workers):
+                thread = threading.Thread(target=self._run, name=f'drive-jobs-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                procesado = self.procesar_siguiente()
+            except Exception as e:
+                print(f"ERROR: Drive job worker failed: {str(e)}")
+                procesado = False
+            if not procesado:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def procesar_pendientes(self):
+        """Procesa trabajos hasta vaciar la cola (usado por el CLI con --once)"""
+        total = 0
+        while self.procesar_siguiente():
+            total += 1
+        return total
+
+    def procesar_siguiente(self):
+        """
+        Reclama y ejecuta el siguiente trabajo disponible
+
+        Returns:
+            bool: True si se procesó un trabajo, False si la cola estaba vacía
+        """
+        with self.app.app_context():
+            try:
+                trabajo_id = self._reclamar()
+                if trabajo_id is None:
+                    return False
+                self._ejecutar(trabajo_id)
+                return True
+            finally:
+                db.session.remove()
+
+    def _disponibles(self, ahora):
+        from app.models import TrabajoDrive
+        return or_(
+            and_(TrabajoDrive.estado == 'pendiente', TrabajoDrive.proximo_intento_at <= ahora),
+            # Trabajos de un worker que murió sin terminarlos
+            and_(TrabajoDrive.estado == 'en_proceso',
+                 TrabajoDrive.locked_at < ahora - timedelta(seconds=self.lock_timeout))
+        )
+
+    def _reclamar(self):
+        """Marca atómicamente un trabajo como 'en_proceso' y devuelve su id"""
+        from app.models import TrabajoDrive
+
+        ahora = datetime.now()
+        candidatos = db.session.query(TrabajoDrive.id).filter(
+            self._disponibles(ahora)
+        ).order_by(TrabajoDrive.id).limit(10).all()
+        db.session.commit()
+
+        for (trabajo_id,) in candidatos:
+            # Optimistic claim: only one worker's UPDATE matches the row
+            result = db.session.execute(
+                update(TrabajoDrive)
+                .where(TrabajoDrive.id == trabajo_id, self._disponibles(ahora))
+                .values(estado='en_proceso', locked_at=ahora)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return trabajo_id
+        return None
+
+    def _ejecutar(self, trabajo_id):
+        from app.models import TrabajoDrive
+        trabajo = TrabajoDrive.query.get(trabajo_id)
+        if not trabajo:
+            return
+        solicitud = trabajo.solicitud
+        if solicitud is None:
+            # Huérfano: la solicitud se eliminó sin borrar sus trabajos (SQLite
+            # sin PRAGMA foreign_keys no aplica el ON DELETE CASCADE)
+            self.app.logger.warning(f"Trabajo de Drive {trabajo.id} sin solicitud {trabajo.solicitud_id}: se elimina")
+            db.session.delete(trabajo)
+            db.session.commit()
+            return
+        payload = json.loads(trabajo.payload or '{}')
+
+        handler = {
+            'crear_carpeta': self._crear_carpeta,
+            'subir_archivo': self._subir_archivo
+        }.get(trabajo.tipo)
+
+        try:
+            if handler is None:
+                ok, error, reintentar = False, f'Tipo de trabajo desconocido: {trabajo.tipo}', False
+            else:
+                ok, error, reintentar = handler(solicitud, payload, self.app.extensions['services'].google_drive)
+        except Exception as e:
+            db.session.rollback()
+            ok, error, reintentar = False, f'Error inesperado: {str(e)}', True
+
+        try:
+            trabajo.locked_at = None
+            if ok:
+                trabajo.estado = 'completado'
+                trabajo.ultimo_error = None
+            else:
+                trabajo.intentos += 1
+                trabajo.ultimo_error = error
+                if reintentar and trabajo.intentos < trabajo.max_intentos:
+                    trabajo.estado = 'pendiente'
+                    espera = self.backoff_base * (2 ** (trabajo.intentos - 1))
+                    trabajo.proximo_intento_at = datetime.now() + timedelta(seconds=espera)
+                else:
+                    trabajo.estado = 'error'
+                self.app.logger.error(f"Trabajo de Drive {trabajo.id} ({trabajo.tipo}) falló: {error}")
+            db.session.flush()
+            self._actualizar_estado_solicitud(solicitud)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            # La solicitud (y sus trabajos) pudo eliminarse mientras se procesaba
+            db.session.rollback()
+            self.app.logger.warning(f"No se pudo registrar el resultado del trabajo {trabajo_id}: {str(e)}")
+
+    def _actualizar_estado_solicitud(self, solicitud):
+        from app.models import TrabajoDrive
+
+        estados = dict(db.session.query(TrabajoDrive.estado, db.func.count(TrabajoDrive.id)).filter(
+            TrabajoDrive.solicitud_id == solicitud.id
+        ).group_by(TrabajoDrive.estado).all())
+
+        if estados.get('error'):
+            ultimo = TrabajoDrive.query.filter_by(
+                solicitud_id=solicitud.id, estado='error'
+            ).order_by(TrabajoDrive.id.desc()).first()
+            solicitud.drive_estado = 'error'
+            solicitud.drive_error = ultimo.ultimo_error if ultimo else None
+        elif estados.get('pendiente') or estados.get('en_proceso'):
+            solicitud.drive_estado = 'pendiente'
+        else:
+            solicitud.drive_estado = 'completado'
+            solicitud.drive_error = None
+
+    # ------------------------------------------------------------------
+    # Handlers: devuelven (ok, error, reintentar)
+    # ------------------------------------------------------------------
+
+    def _crear_carpeta(self, solicitud, payload, drive_service):
+        if not solicitud.google_drive_folder_id:
+            config_check = drive_service.verificar_configuracion()
+            if not config_check['success']:
+                return False, f"Configuración incompleta: {', '.join(config_check['missing_config'])}", False
+
+            folder_result = drive_service.crear_carpeta_equivalencia(
+                dni=solicitud.dni_solicitante,
+                carrera_origen=solicitud.carrera_origen,
+                id_equivalencia=solicitud.id_solicitud,
+                timestamp=solicitud.fecha_solicitud
+            )
+            if not folder_result['success']:
+                return False, folder_result.get('error'), True
+
+            solicitud.google_drive_folder_id = folder_result['folder_id']
+            solicitud.google_drive_folder_name = folder_result['folder_name']
+            solicitud.google_drive_folder_url = folder_result['folder_url']
+
+        # Las subidas necesitan la carpeta, por eso se encolan recién ahora
+        for archivo in payload.get('archivos', []):
+            self.encolar(
+                solicitud,
+                'subir_archivo',
+                archivo,
+                f"subir_archivo:{solicitud.id}:{archivo['campo']}:{archivo['ruta']}"
+            )
+        self._wakeup.set()
+        return True, None, False
+
+    def _subir_archivo(self, solicitud, payload, drive_service):
+        campo = payload['campo']
+        if getattr(solicitud, campo):
+            # Ya subido en un intento anterior
+            return True, None, False
+
+        archivo_local = os.path.join(self.app.root_path, 'static', payload['ruta'])
+        if not os.path.exists(archivo_local):
+            return False, f"Archivo local no encontrado: {payload['ruta']}", False
+
+        upload_result = drive_service.subir_archivo(
+            folder_id=solicitud.google_drive_folder_id,
+            file_path=archivo_local,
+            file_name=payload['nombre']
+        )
+        if not upload_result['success']:
+            return False, upload_result.get('error'), True
+
+        setattr(solicitud, campo, upload_result['file_id'])
+        self.app.logger.info(f"Archivo subido a Google Drive: {upload_result['file_url']}")
+        return True, None, False
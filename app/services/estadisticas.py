@@ -0,0 +1,119 @@
+from collections import Counter
+from sqlalchemy import event, func, inspect, select
+from app import db
+
+
+# Estados de una solicitud; siempre tienen fila en contadores_solicitudes
+ESTADOS_SOLICITUD = ('pendiente', 'en_evaluacion', 'aprobada', 'rechazada')
+
+
+def _estado_anterior(solicitud):
+    """Estado persistido de una solicitud antes de los cambios de este flush"""
+    historial = inspect(solicitud).attrs.estado.history
+    if historial.deleted:
+        return historial.deleted[0]
+    if historial.unchanged:
+        return historial.unchanged[0]
+    return solicitud.estado
+
+
+def _calcular_deltas(session):
+    from app.models import SolicitudEquivalencia
+
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, SolicitudEquivalencia):
+            # El default de la columna puede no haberse copiado aún al objeto
+            deltas[obj.estado or 'pendiente'] += 1
+    for obj in session.deleted:
+        if isinstance(obj, SolicitudEquivalencia):
+            deltas[_estado_anterior(obj)] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, SolicitudEquivalencia) and obj not in session.deleted:
+            historial = inspect(obj).attrs.estado.history
+            if historial.added and historial.deleted:
+                deltas[historial.deleted[0]] -= 1
+                deltas[historial.added[0]] += 1
+    return {estado: delta for estado, delta in deltas.items() if delta}
+
+
+def _actualizar_contadores(session, flush_context):
+    """Aplica los cambios de estado del flush a los contadores, en la misma transacción"""
+    deltas = _calcular_deltas(session)
+    if deltas:
+        aplicar_deltas(session.connection(), deltas)
+
+
+def aplicar_deltas(conexion, deltas):
+    """
+    Suma deltas {estado: cantidad} a los contadores usando la conexión dada
+
+    Lo usan el flush de la sesión y las inserciones masivas (que no pasan por
+    el ORM), dentro de la misma transacción que los cambios.
+    """
+    from app.models import ContadorSolicitudes
+
+    tabla = ContadorSolicitudes.__table__
+    if conexion.execute(select(tabla.c.estado).limit(1)).first() is None:
+        # Contadores sin inicializar: las lecturas usan el conteo agrupado
+        return
+    for estado, delta in deltas.items():
+        resultado = conexion.execute(
+            tabla.update().where(tabla.c.estado == estado).values(cantidad=tabla.c.cantidad + delta)
+        )
+        if resultado.rowcount == 0:
+            conexion.execute(tabla.insert().values(estado=estado, cantidad=delta))
+
+
+def init_app(app):
+    """Registra el mantenimiento de los contadores en cada flush de la sesión"""
+    if not event.contains(db.session, 'after_flush', _actualizar_contadores):
+        event.listen(db.session, 'after_flush', _actualizar_contadores)
+
+
+def conteos_por_estado():
+    """
+    Cantidad de solicitudes por estado
+
+    Lee la tabla de contadores; si todavía no fue inicializada, resuelve con
+    un único COUNT(*) ... GROUP BY estado.
+
+    Returns:
+        dict: {estado: cantidad} con todos los ESTADOS_SOLICITUD
+    """
+    from app.models import ContadorSolicitudes, SolicitudEquivalencia
+
+    filas = db.session.query(ContadorSolicitudes.estado, ContadorSolicitudes.cantidad).all()
+    if not filas:
+        filas = db.session.query(
+            SolicitudEquivalencia.estado, func.count(SolicitudEquivalencia.id)
+        ).group_by(SolicitudEquivalencia.estado).all()
+
+    conteos = dict.fromkeys(ESTADOS_SOLICITUD, 0)
+    conteos.update(dict(filas))
+    return conteos
+
+
+def reconstruir_contadores():
+    """
+    Recalcula los contadores desde solicitudes_equivalencia
+
+    Returns:
+        dict: {estado: cantidad} recalculado
+    """
+    from app.models import ContadorSolicitudes, SolicitudEquivalencia
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Los flushes concurrentes esperan a que termine la reconstrucción
+        db.session.execute(db.text('LOCK TABLE contadores_solicitudes IN EXCLUSIVE MODE'))
+
+    conteos = dict.fromkeys(ESTADOS_SOLICITUD, 0)
+    conteos.update(dict(db.session.query(
+        SolicitudEquivalencia.estado, func.count(SolicitudEquivalencia.id)
+    ).group_by(SolicitudEquivalencia.estado).all()))
+
+    ContadorSolicitudes.query.delete()
+    for estado, cantidad in conteos.items():
+        db.session.add(ContadorSolicitudes(estado=estado, cantidad=cantidad))
+    db.session.commit()
+    return conteos
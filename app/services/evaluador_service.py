@@ -1,21 +1,42 @@
+from collections import namedtuple
+from sqlalchemy import case, func
 from app.models import Usuario
 from app.services.keycloak_service import KeycloakService
 from app import db
 import os
 
 
+# Estados que cuentan como carga de trabajo activa de un evaluador
+ESTADOS_ACTIVOS = ('pendiente', 'en_evaluacion')
+
+# Lightweight read-only views used by listings and selection dropdowns
+EvaluadorResumen = namedtuple('EvaluadorResumen', [
+    'id', 'username', 'nombre', 'apellido', 'email', 'legajo_evaluador',
+    'departamento_academico', 'is_keycloak_user', 'keycloak_id'
+])
+EvaluadorWorkload = namedtuple('EvaluadorWorkload', ['evaluador', 'workload', 'total_assigned'])
+
+
+def keycloak_configurado():
+    """True if the Keycloak connection settings are present in the environment"""
+    return all([
+        os.getenv('KEYCLOAK_SERVER_URL'),
+        os.getenv('KEYCLOAK_REALM'),
+        os.getenv('KEYCLOAK_CLIENT_ID'),
+        os.getenv('KEYCLOAK_CLIENT_SECRET')
+    ])
+
+
 class EvaluadorService:
     """Service to manage evaluators from both Keycloak and local database"""
     
-    def __init__(self):
-        self.keycloak_enabled = all([
-            os.getenv('KEYCLOAK_SERVER_URL'),
-            os.getenv('KEYCLOAK_REALM'),
-            os.getenv('KEYCLOAK_CLIENT_ID'),
-            os.getenv('KEYCLOAK_CLIENT_SECRET')
-        ])
-        
-        if self.keycloak_enabled:
+    def __init__(self, keycloak_service=None):
+        self.keycloak_enabled = keycloak_configurado()
+        
+        if keycloak_service is not None:
+            # Shared instance from the service registry
+            self.keycloak_service = keycloak_service
+        elif self.keycloak_enabled:
             try:
                 self.keycloak_service = KeycloakService()
             except Exception as e:
@@ -89,8 +110,15 @@ class EvaluadorService:
         """Get evaluator by ID"""
         return Usuario.query.filter_by(id=evaluador_id, rol='evaluador').first()
     
-    def get_evaluadores_with_workload(self, auto_sync=True):
-        """Get all evaluators with their current workload (number of assigned solicitudes)"""
+    def get_evaluadores_with_workload(self, auto_sync=False):
+        """Get all evaluators with their current workload (number of assigned solicitudes)
+
+        Workload is computed with a single grouped aggregation over
+        solicitudes_equivalencia joined back to usuarios, and returned as a
+        list of EvaluadorWorkload tuples sorted by active workload.
+        Only the local table is read unless auto_sync is requested; request
+        handlers rely on the background EvaluadorSyncScheduler instead.
+        """
         from app.models import SolicitudEquivalencia
         
         # Auto-sync evaluadores from Keycloak if enabled and requested
@@ -101,26 +129,50 @@ class EvaluadorService:
             except Exception as e:
                 print(f"WARNING: Auto-sync failed, continuing with local data: {str(e)}")
         
-        evaluadores = self.get_all_evaluadores()
-        evaluadores_with_workload = []
+        # Conditional counts per evaluador: active (not resolved) and total assigned
+        carga = db.session.query(
+            SolicitudEquivalencia.evaluador_id.label('evaluador_id'),
+            func.sum(case(
+                (SolicitudEquivalencia.estado.in_(ESTADOS_ACTIVOS), 1),
+                else_=0
+            )).label('workload'),
+            func.count(SolicitudEquivalencia.id).label('total_assigned')
+        ).filter(
+            SolicitudEquivalencia.evaluador_id.isnot(None)
+        ).group_by(SolicitudEquivalencia.evaluador_id).subquery()
         
-        for evaluador in evaluadores:
-            # Count assigned active solicitudes (not resolved)
-            workload = SolicitudEquivalencia.query.filter(
-                SolicitudEquivalencia.evaluador_id == evaluador.id,
-                SolicitudEquivalencia.estado.in_(['pendiente', 'en_evaluacion'])
-            ).count()
-            
-            evaluadores_with_workload.append({
-                'evaluador': evaluador,
-                'workload': workload,
-                'total_assigned': SolicitudEquivalencia.query.filter_by(evaluador_id=evaluador.id).count()
-            })
+        workload = func.coalesce(carga.c.workload, 0)
+        total_assigned = func.coalesce(carga.c.total_assigned, 0)
         
-        # Sort by workload (ascending) so evaluators with less work appear first
-        evaluadores_with_workload.sort(key=lambda x: x['workload'])
+        rows = db.session.query(
+            Usuario.id,
+            Usuario.username,
+            Usuario.nombre,
+            Usuario.apellido,
+            Usuario.email,
+            Usuario.legajo_evaluador,
+            Usuario.departamento_academico,
+            Usuario.is_keycloak_user,
+            Usuario.keycloak_id,
+            workload.label('workload'),
+            total_assigned.label('total_assigned')
+        ).outerjoin(
+            carga, carga.c.evaluador_id == Usuario.id
+        ).filter(
+            Usuario.rol == 'evaluador'
+        ).order_by(
+            # Evaluators with less work appear first
+            workload, Usuario.apellido, Usuario.nombre, Usuario.id
+        ).all()
         
-        return evaluadores_with_workload
+        return [
+            EvaluadorWorkload(
+                evaluador=EvaluadorResumen(*row[:9]),
+                workload=int(row.workload),
+                total_assigned=int(row.total_assigned)
+            )
+            for row in rows
+        ]
     
     def suggest_evaluador(self):
         """Suggest an evaluator based on current workload"""
@@ -128,7 +180,7 @@ class EvaluadorService:
         
         if evaluadores_with_workload:
             # Return evaluator with least workload
-            return evaluadores_with_workload[0]['evaluador']
+            return evaluadores_with_workload[0].evaluador
         
         return None
     
@@ -193,20 +245,20 @@ class EvaluadorService:
         return []
 
     def get_evaluadores_stats(self):
-        """Get statistics about evaluadores"""
-        if self.keycloak_enabled:
-            keycloak_count = len(self.keycloak_service.get_users_by_role('evaluador')) if self.keycloak_service else 0
-        else:
-            keycloak_count = 0
-            
+        """Get statistics about evaluadores (local table and last sync watermark)"""
+        from app.models import SincronizacionEvaluadores
+        
+        sync_estado = SincronizacionEvaluadores.query.get(1)
         local_count = Usuario.query.filter_by(rol='evaluador').count()
         local_keycloak_count = Usuario.query.filter_by(rol='evaluador', is_keycloak_user=True).count()
         
         return {
-            'keycloak_count': keycloak_count,
+            'keycloak_count': sync_estado.evaluadores_sincronizados if sync_estado and self.keycloak_enabled else 0,
             'local_count': local_count,
             'local_keycloak_count': local_keycloak_count,
-            'keycloak_enabled': self.keycloak_enabled
+            'keycloak_enabled': self.keycloak_enabled,
+            'last_synced_at': sync_estado.last_synced_at if sync_estado else None,
+            'last_sync_error': sync_estado.ultimo_error if sync_estado else None
         }
 
     def ensure_fresh_evaluadores(self):
@@ -224,7 +276,15 @@ class EvaluadorService:
 
     def get_evaluadores_for_selection(self):
         """Get evaluadores specifically for admin/depto selection dropdowns"""
-        return self.get_evaluadores_with_workload(auto_sync=True)
+        return self.get_evaluadores_with_workload(auto_sync=False)
+
+    def request_sync(self, force=False):
+        """Enqueue a background sync of evaluadores from Keycloak without blocking"""
+        from flask import current_app
+        scheduler = current_app.extensions.get('evaluador_sync')
+        if not scheduler:
+            return False
+        return scheduler.enqueue(force=force)
 
     def get_service_status(self):
         """Get comprehensive service status"""
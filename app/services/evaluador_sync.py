@@ -0,0 +1,133 @@
+import os
+import threading
+from datetime import datetime, timedelta
+from app import db
+
+
+class EvaluadorSyncScheduler:
+    """Background worker that keeps local evaluador rows in sync with Keycloak
+
+    Request handlers only read the local usuarios table; this worker refreshes it
+    every EVALUADOR_SYNC_INTERVAL seconds and whenever a sync is enqueued from
+    the /sync_evaluadores or /refresh_evaluadores endpoints.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.interval = 0
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pending_force = False
+        self.enabled = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app.services.evaluador_service import keycloak_configurado
+
+        self.app = app
+        self.interval = int(os.getenv('EVALUADOR_SYNC_INTERVAL', '900'))
+        self.enabled = os.getenv('EVALUADOR_SYNC_ENABLED', 'true').lower() == 'true' and keycloak_configurado()
+        app.extensions['evaluador_sync'] = self
+
+        # Start lazily on the first request so CLI commands and migrations
+        # don't spawn a worker thread
+        @app.before_request
+        def _start_evaluador_sync():
+            if self.enabled and self._thread is None:
+                self.start()
+
+    def start(self):
+        """Start the background worker thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='evaluador-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def enqueue(self, force=False):
+        """Request a sync as soon as possible without blocking the caller
+
+        Returns:
+            bool: True if the request was queued, False if sync is disabled
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            self._pending_force = self._pending_force or force
+        if self._thread is None:
+            self.start()
+        self._wakeup.set()
+        return True
+
+    def _run(self):
+        # Refresh once at startup if the local data is stale
+        triggered = False
+        while not self._stop.is_set():
+            # Clear before reading the pending request: an enqueue() from here
+            # on sets the event again and the wait below returns right away
+            self._wakeup.clear()
+            with self._lock:
+                force = self._pending_force
+                self._pending_force = False
+            try:
+                self.sync_now(force=force, only_if_stale=not triggered)
+            except Exception as e:
+                print(f"ERROR: Background evaluador sync failed: {str(e)}")
+
+            # interval <= 0 disables periodic runs; only enqueued syncs are served
+            timeout = self.interval if self.interval > 0 else None
+            triggered = self._wakeup.wait(timeout)
+
+    def sync_now(self, force=False, only_if_stale=False):
+        """Run a sync in the calling thread (used by the worker and the CLI)
+
+        Args:
+            force (bool): Also remove local Keycloak evaluadores no longer in Keycloak
+            only_if_stale (bool): Skip if another worker synced within the interval
+
+        Returns:
+            int | None: Number of synced evaluadores, or None if skipped
+        """
+        from app.models import SincronizacionEvaluadores
+
+        with self.app.app_context():
+            try:
+                estado = SincronizacionEvaluadores.get_estado()
+                if only_if_stale and self.interval > 0 and estado.last_synced_at and \
+                        datetime.now() - estado.last_synced_at < timedelta(seconds=self.interval):
+                    db.session.commit()
+                    return None
+
+                estado.last_attempt_at = datetime.now()
+                keycloak_service = self.app.extensions['services'].keycloak
+                resumen = keycloak_service.sincronizar_evaluadores(eliminar_ausentes=force)
+                total = len(resumen['ids'])
+
+                estado = SincronizacionEvaluadores.get_estado()
+                estado.last_synced_at = datetime.now()
+                estado.evaluadores_sincronizados = total
+                estado.ultimo_error = None
+                db.session.commit()
+                print(f"DEBUG: Background sync completed: {total} evaluadores")
+                return total
+            except Exception as e:
+                db.session.rollback()
+                estado = SincronizacionEvaluadores.get_estado()
+                estado.last_attempt_at = datetime.now()
+                estado.ultimo_error = str(e)
+                db.session.commit()
+                raise
+            finally:
+                db.session.remove()
+
+    def get_estado(self):
+        """Get the sync watermark for display (reads the local table only)"""
+        from app.models import SincronizacionEvaluadores
+        return SincronizacionEvaluadores.query.get(1)
@@ -0,0 +1,181 @@
+import csv
+import io
+from datetime import datetime, timedelta
+from flask import Response, stream_with_context
+from sqlalchemy import DateTime, select
+from sqlalchemy.orm import aliased
+from app import db
+from app.services.paginacion import filtros_solicitudes, aplicar_filtros_solicitudes
+
+# Filas que se leen de la base por cada viaje del cursor y que se escriben por
+# cada bloque de la respuesta
+FILAS_POR_LOTE = 1000
+
+# Fecha sobre la que se aplican ?desde= / ?hasta=
+CAMPOS_FECHA = ('solicitud', 'resolucion')
+
+
+def _columnas(evaluador, por_dictamen):
+    """(encabezado, columna) de cada columna del CSV, en orden"""
+    from app.models import SolicitudEquivalencia as Solicitud, Dictamen
+
+    columnas = [
+        ('ID Solicitud', Solicitud.id_solicitud),
+        ('Estado', Solicitud.estado),
+        ('Fecha Solicitud', Solicitud.fecha_solicitud),
+        ('Fecha Resolución', Solicitud.fecha_resolucion),
+        ('Apellido', Solicitud.apellido_solicitante),
+        ('Nombre', Solicitud.nombre_solicitante),
+        ('DNI', Solicitud.dni_solicitante),
+        ('Legajo CRUB', Solicitud.legajo_crub),
+        ('Correo', Solicitud.correo_solicitante),
+        ('Institución Origen', Solicitud.institucion_origen),
+        ('Carrera Origen', Solicitud.carrera_origen),
+        ('Carrera CRUB Destino', Solicitud.carrera_crub_destino),
+        ('Evaluador Apellido', evaluador.apellido),
+        ('Evaluador Nombre', evaluador.nombre),
+        ('Evaluador Legajo', evaluador.legajo_evaluador),
+        ('Observaciones', Solicitud.observaciones_solicitante),
+        ('Dictamen Final', Solicitud.dictamen_final_url),
+    ]
+    if por_dictamen:
+        columnas += [
+            ('Asignatura Origen', Dictamen.asignatura_origen),
+            ('Asignatura Destino', Dictamen.asignatura_destino),
+            ('Tipo Equivalencia', Dictamen.tipo_equivalencia),
+            ('Observaciones Dictamen', Dictamen.observaciones),
+            ('Fecha Dictamen', Dictamen.fecha_dictamen),
+        ]
+    return columnas
+
+
+def filtros_exportacion(args):
+    """
+    Lee los filtros de exportación de la query string (o de las opciones del CLI)
+
+    Además de los filtros de listado (estado, carrera, evaluador) acepta
+    desde / hasta (YYYY-MM-DD, ambos inclusive) y fecha ('solicitud' o
+    'resolucion') para elegir a qué fecha se aplica el rango.
+
+    Raises:
+        ValueError: Si una fecha o el campo de fecha no son válidos
+    """
+    filtros = filtros_solicitudes(args)
+    for nombre in ('desde', 'hasta'):
+        if args.get(nombre):
+            try:
+                filtros[nombre] = datetime.strptime(args[nombre], '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"Fecha inválida en '{nombre}': use el formato AAAA-MM-DD")
+    if args.get('fecha'):
+        if args['fecha'] not in CAMPOS_FECHA:
+            raise ValueError(f"Campo de fecha inválido: use {' o '.join(CAMPOS_FECHA)}")
+        filtros['fecha'] = args['fecha']
+    return filtros
+
+
+def consulta_exportacion(filtros, por_dictamen=False):
+    """
+    Devuelve (encabezados, SELECT) de la exportación
+
+    El SELECT trae sólo las columnas del CSV, en orden y sin construir objetos
+    del ORM, con los filtros aplicados y ordenado por solicitud.
+    """
+    from app.models import SolicitudEquivalencia, Dictamen, Usuario
+
+    evaluador = aliased(Usuario)
+    columnas = _columnas(evaluador, por_dictamen)
+    consulta = select(*[columna for _, columna in columnas]).select_from(SolicitudEquivalencia).outerjoin(
+        evaluador, SolicitudEquivalencia.evaluador_id == evaluador.id
+    )
+    if por_dictamen:
+        consulta = consulta.outerjoin(Dictamen, Dictamen.solicitud_id == SolicitudEquivalencia.id)
+
+    consulta = aplicar_filtros_solicitudes(consulta, filtros)
+    fecha = (SolicitudEquivalencia.fecha_resolucion if filtros.get('fecha') == 'resolucion'
+             else SolicitudEquivalencia.fecha_solicitud)
+    if filtros.get('desde'):
+        consulta = consulta.where(fecha >= filtros['desde'])
+    if filtros.get('hasta'):
+        consulta = consulta.where(fecha < filtros['hasta'] + timedelta(days=1))
+
+    orden = [SolicitudEquivalencia.fecha_solicitud, SolicitudEquivalencia.id]
+    if por_dictamen:
+        orden.append(Dictamen.id)
+    return [encabezado for encabezado, _ in columnas], consulta.order_by(*orden)
+
+
+def _formato_fecha(valor):
+    if valor.hour or valor.minute:
+        return valor.strftime('%Y-%m-%d %H:%M')
+    return valor.strftime('%Y-%m-%d')
+
+
+def generar_csv(filtros, por_dictamen=False, filas_por_lote=FILAS_POR_LOTE):
+    """
+    Genera el CSV de exportación por bloques de texto
+
+    Las filas se leen con un cursor del lado del servidor (yield_per) y cada
+    bloque se escribe apenas se completa, así que la memoria usada no depende
+    del tamaño de la tabla. El primer bloque empieza con BOM para que Excel
+    reconozca el UTF-8.
+
+    Args:
+        filtros (dict): Resultado de filtros_exportacion
+        por_dictamen (bool): Una fila por dictamen (con los datos de la
+            solicitud repetidos) en lugar de una fila por solicitud
+    """
+    encabezados, consulta = consulta_exportacion(filtros, por_dictamen)
+    fechas = [i for i, columna in enumerate(consulta.selected_columns)
+              if isinstance(columna.type, DateTime)]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(encabezados)
+    yield '\ufeff' + buffer.getvalue()
+
+    resultado = db.session.connection().execution_options(yield_per=filas_por_lote).execute(consulta)
+    try:
+        for particion in resultado.partitions():
+            buffer.seek(0)
+            buffer.truncate()
+            for fila in particion:
+                fila = list(fila)
+                for i in fechas:
+                    if fila[i] is not None:
+                        fila[i] = _formato_fecha(fila[i])
+                writer.writerow(fila)
+            yield buffer.getvalue()
+    finally:
+        resultado.close()
+
+
+def nombre_archivo_exportacion(filtros, por_dictamen=False):
+    partes = ['equivalencias']
+    if por_dictamen:
+        partes.append('dictamenes')
+    if filtros.get('estado'):
+        partes.append(filtros['estado'])
+    partes.append(datetime.now().strftime('%Y%m%d'))
+    return '_'.join(partes) + '.csv'
+
+
+def respuesta_exportacion(args):
+    """
+    Respuesta HTTP que transmite el CSV a medida que se genera
+
+    Usa los filtros de filtros_exportacion y ?por_dictamen=1 para una fila por dictamen.
+
+    Raises:
+        ValueError: Si los filtros no son válidos
+    """
+    filtros = filtros_exportacion(args)
+    por_dictamen = args.get('por_dictamen') in ('1', 'true', 'si')
+    return Response(
+        stream_with_context(generar_csv(filtros, por_dictamen)),
+        mimetype='text/csv',
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre_archivo_exportacion(filtros, por_dictamen)}"',
+            # Que los proxies no acumulen la respuesta completa antes de enviarla
+            'X-Accel-Buffering': 'no',
+        }
+    )
@@ -0,0 +1,368 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from sqlalchemy import event, inspect
+
+
+# Modelos cuyos cambios invalidan los fragmentos, y columnas que no se muestran
+# en ellos (un login no debe vaciar la caché)
+MODELOS_INVALIDAN = ('SolicitudEquivalencia', 'Dictamen', 'Usuario')
+COLUMNAS_IGNORADAS = {'Usuario': {'last_login', 'password_hash'}}
+
+
+class MemoriaBackend:
+    """LRU en memoria del proceso
+
+    Sólo sirve con un único proceso: los commits de otros workers o de los
+    comandos de la CLI (importaciones, sincronización programada) no la
+    invalidan, así que hasta que vencen sus fragmentos pueden estar viejos.
+    """
+
+    nombre = 'memoria'
+
+    def __init__(self, max_entradas):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._generacion = 0
+        self._lock = threading.Lock()
+
+    def generacion(self):
+        return self._generacion
+
+    def obtener(self, clave):
+        with self._lock:
+            valor = self._entradas.get(clave)
+            if valor is not None:
+                self._entradas.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def invalidar(self):
+        with self._lock:
+            self._generacion += 1
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class ArchivoBackend:
+    """Un archivo JSON por fragmento en un directorio compartido por los workers"""
+
+    nombre = 'archivo'
+
+    def __init__(self, directorio, max_entradas):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+        self._ruta_generacion = os.path.join(directorio, 'generacion')
+
+    def generacion(self):
+        try:
+            with open(self._ruta_generacion, 'r', encoding='utf-8') as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, hashlib.sha256(clave.encode('utf-8')).hexdigest() + '.json')
+
+    def _escribir(self, ruta, contenido):
+        # Escritura atómica: otros workers nunca leen un archivo a medio escribir
+        os.makedirs(self.directorio, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+        os.replace(tmp, ruta)
+
+    def obtener(self, clave):
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                valor = json.load(f)
+            os.utime(ruta, None)
+        except (OSError, ValueError):
+            return None
+        return valor['html'], valor['duracion'], valor.get('creado', 0)
+
+    def guardar(self, clave, valor):
+        html, duracion, creado = valor
+        self._escribir(self._ruta(clave), json.dumps({'html': html, 'duracion': duracion, 'creado': creado}))
+        entradas = self._entradas()
+        if len(entradas) > self.max_entradas:
+            for _, ruta in sorted(entradas)[:len(entradas) - self.max_entradas]:
+                self._eliminar(ruta)
+
+    def invalidar(self):
+        self._escribir(self._ruta_generacion, str(self.generacion() + 1))
+        for _, ruta in self._entradas():
+            self._eliminar(ruta)
+
+    def _entradas(self):
+        entradas = []
+        try:
+            nombres = os.listdir(self.directorio)
+        except OSError:
+            return entradas
+        for nombre in nombres:
+            if nombre.endswith('.json'):
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    entradas.append((os.path.getmtime(ruta), ruta))
+                except OSError:
+                    continue
+        return entradas
+
+    @staticmethod
+    def _eliminar(ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self._entradas())
+
+
+class SQLiteBackend:
+    """Tabla en un archivo SQLite local compartido por los workers"""
+
+    nombre = 'sqlite'
+
+    def __init__(self, ruta, max_entradas):
+        self.ruta = ruta
+        self.max_entradas = max_entradas
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        with self._conectar() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            columnas = {fila[1] for fila in conn.execute('PRAGMA table_info(fragmentos)')}
+            if columnas and 'creado' not in columnas:
+                # Caché de una versión anterior sin fecha de creación: se descarta
+                conn.execute('DROP TABLE fragmentos')
+            conn.execute('CREATE TABLE IF NOT EXISTS fragmentos '
+                         '(clave TEXT PRIMARY KEY, html TEXT, duracion REAL, creado REAL, usado REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS generacion (id INTEGER PRIMARY KEY, valor INTEGER)')
+            conn.execute('INSERT OR IGNORE INTO generacion (id, valor) VALUES (1, 0)')
+
+    @contextmanager
+    def _conectar(self):
+        conn = sqlite3.connect(self.ruta, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def generacion(self):
+        with self._conectar() as conn:
+            return conn.execute('SELECT valor FROM generacion WHERE id = 1').fetchone()[0]
+
+    def obtener(self, clave):
+        with self._conectar() as conn:
+            fila = conn.execute('SELECT html, duracion, creado FROM fragmentos WHERE clave = ?', (clave,)).fetchone()
+            if fila:
+                conn.execute('UPDATE fragmentos SET usado = ? WHERE clave = ?', (time.time(), clave))
+        return tuple(fila) if fila else None
+
+    def guardar(self, clave, valor):
+        html, duracion, creado = valor
+        with self._conectar() as conn:
+            conn.execute('INSERT OR REPLACE INTO fragmentos (clave, html, duracion, creado, usado) '
+                         'VALUES (?, ?, ?, ?, ?)', (clave, html, duracion, creado, time.time()))
+            conn.execute('DELETE FROM fragmentos WHERE clave NOT IN '
+                         '(SELECT clave FROM fragmentos ORDER BY usado DESC LIMIT ?)', (self.max_entradas,))
+
+    def invalidar(self):
+        with self._conectar() as conn:
+            conn.execute('UPDATE generacion SET valor = valor + 1 WHERE id = 1')
+            conn.execute('DELETE FROM fragmentos')
+
+    def __len__(self):
+        with self._conectar() as conn:
+            return conn.execute('SELECT COUNT(*) FROM fragmentos').fetchone()[0]
+
+
+class FragmentCache:
+    """Caché de fragmentos HTML de los listados (tablas de solicitudes)
+
+    Las claves combinan vista, filtros/página (query string) y rol del usuario.
+    Todo commit que modifique SolicitudEquivalencia, Dictamen o Usuario invalida
+    la caché completa: se incrementa la generación, que forma parte de la
+    clave, así un render que empezó antes del commit no puede guardar un
+    fragmento viejo bajo la generación nueva.
+
+    FRAGMENT_CACHE_BACKEND elige dónde se guardan: 'memoria' (por defecto),
+    LRU de un único proceso; 'archivo' o 'sqlite', compartidos por los
+    workers y los comandos de la CLI de una misma máquina; o 'ninguno'. Con
+    cualquier backend un fragmento vence a los FRAGMENT_CACHE_TTL segundos,
+    así que los cambios que no pasan por esta aplicación (u otra máquina)
+    aparecen a lo sumo con ese retraso.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self._lock = threading.Lock()
+        self._metricas = {}
+        self.invalidaciones = 0
+        self.ttl = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from app import db
+
+        self.app = app
+        tipo = os.getenv('FRAGMENT_CACHE_BACKEND', 'memoria').lower()
+        max_entradas = int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', '500'))
+        self.ttl = int(os.getenv('FRAGMENT_CACHE_TTL', '300'))
+        if tipo == 'archivo':
+            directorio = os.getenv('FRAGMENT_CACHE_DIR', os.path.join(app.instance_path, 'fragment_cache'))
+            self.backend = ArchivoBackend(directorio, max_entradas)
+        elif tipo == 'sqlite':
+            ruta = os.getenv('FRAGMENT_CACHE_PATH', os.path.join(app.instance_path, 'fragment_cache.sqlite'))
+            self.backend = SQLiteBackend(ruta, max_entradas)
+        elif tipo in ('ninguno', 'none', ''):
+            self.backend = None
+        else:
+            self.backend = MemoriaBackend(max_entradas)
+        app.extensions['fragment_cache'] = self
+
+        if not event.contains(db.session, 'after_flush', _marcar_cambios):
+            event.listen(db.session, 'after_flush', _marcar_cambios)
+            event.listen(db.session, 'do_orm_execute', _marcar_cambios_masivos)
+            event.listen(db.session, 'after_commit', _invalidar_tras_commit)
+            event.listen(db.session, 'after_rollback', _descartar_cambios)
+
+    @property
+    def habilitada(self):
+        return self.backend is not None
+
+    @staticmethod
+    def clave(vista, args, rol, alcance=None):
+        """Clave de un fragmento: vista, query string (filtros y página), rol y alcance opcional"""
+        parametros = '&'.join(f'{k}={v}' for k, v in sorted(args.items(multi=True)))
+        return f'{vista}|{parametros}|{rol}|{alcance or ""}'
+
+    def obtener_o_renderizar(self, clave, renderizar):
+        """
+        Devuelve el fragmento cacheado o lo genera con renderizar() y lo guarda
+
+        Args:
+            clave (str): Resultado de FragmentCache.clave
+            renderizar (callable): Consulta los datos y devuelve el HTML
+
+        Returns:
+            str: HTML del fragmento
+        """
+        vista = clave.split('|', 1)[0]
+        if not self.habilitada:
+            return renderizar()
+
+        clave_generacion = f'{self.backend.generacion()}|{clave}'
+        valor = self.backend.obtener(clave_generacion)
+        if valor is not None:
+            html, duracion, creado = valor
+            if not self.ttl or time.time() - creado < self.ttl:
+                self._registrar(vista, acierto=True, duracion=duracion)
+                return html
+
+        creado = time.time()
+        inicio = time.perf_counter()
+        html = renderizar()
+        duracion = time.perf_counter() - inicio
+        self.backend.guardar(clave_generacion, (html, duracion, creado))
+        self._registrar(vista, acierto=False, duracion=duracion)
+        return html
+
+    def invalidar(self):
+        if self.habilitada:
+            self.backend.invalidar()
+        with self._lock:
+            self.invalidaciones += 1
+
+    def _registrar(self, vista, acierto, duracion):
+        with self._lock:
+            metricas = self._metricas.setdefault(vista, {'aciertos': 0, 'fallos': 0, 'render_s': 0.0, 'ahorro_s': 0.0})
+            if acierto:
+                metricas['aciertos'] += 1
+                metricas['ahorro_s'] += duracion
+            else:
+                metricas['fallos'] += 1
+                metricas['render_s'] += duracion
+
+    def metricas(self):
+        """Aciertos, fallos y tiempo de render ahorrado por vista (en este proceso)"""
+        with self._lock:
+            vistas = {vista: dict(valores) for vista, valores in self._metricas.items()}
+            invalidaciones = self.invalidaciones
+        for valores in vistas.values():
+            total = valores['aciertos'] + valores['fallos']
+            valores['ratio'] = valores['aciertos'] / total if total else 0.0
+        aciertos = sum(v['aciertos'] for v in vistas.values())
+        fallos = sum(v['fallos'] for v in vistas.values())
+        return {
+            'backend': self.backend.nombre if self.habilitada else 'ninguno',
+            'ttl': self.ttl,
+            'entradas': len(self.backend) if self.habilitada else 0,
+            'invalidaciones': invalidaciones,
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'ratio': aciertos / (aciertos + fallos) if aciertos + fallos else 0.0,
+            'ahorro_s': sum(v['ahorro_s'] for v in vistas.values()),
+            'vistas': vistas
+        }
+
+
+def _afecta_fragmentos(obj):
+    nombre = type(obj).__name__
+    if nombre not in MODELOS_INVALIDAN:
+        return False
+    ignoradas = COLUMNAS_IGNORADAS.get(nombre)
+    if not ignoradas:
+        return True
+    estado = inspect(obj)
+    return any(
+        atributo.key not in ignoradas and atributo.history.has_changes()
+        for atributo in estado.attrs
+    )
+
+
+def _marcar_cambios(session, flush_context):
+    if session.info.get('fragmentos_modificados'):
+        return
+    if any(type(obj).__name__ in MODELOS_INVALIDAN for obj in list(session.new) + list(session.deleted)) or \
+            any(_afecta_fragmentos(obj) for obj in session.dirty):
+        session.info['fragmentos_modificados'] = True
+
+
+def _marcar_cambios_masivos(orm_execute_state):
+    # INSERT / UPDATE / DELETE masivos (query.update, session.execute(update(...), [...]))
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper is not None:
+        if orm_execute_state.bind_mapper.class_.__name__ in MODELOS_INVALIDAN:
+            orm_execute_state.session.info['fragmentos_modificados'] = True
+
+
+def _invalidar_tras_commit(session):
+    if not session.info.pop('fragmentos_modificados', False):
+        return
+    from flask import current_app, has_app_context
+    cache = current_app.extensions.get('fragment_cache') if has_app_context() else None
+    if cache:
+        cache.invalidar()
+
+
+def _descartar_cambios(session):
+    session.info.pop('fragmentos_modificados', None)
@@ -1,8 +1,138 @@
+import base64
 import requests
 import json
+import logging
+import mimetypes
 import os
+import time
 from datetime import datetime
 from flask import current_app
+from app.services.http_session import get_http_session, get_timeout
+
+
+# Acciones de Apps Script que pueden reintentarse sin duplicar efectos
+ACCIONES_IDEMPOTENTES = {
+    'getFileContent',
+    'createNestedFolder',
+    'deleteFile',
+    'deleteFolder',
+    'overwriteFile',
+    'renameFolder',
+    'updateDocumentPlaceholders',
+    'getTemplatePlaceholders',
+    # Reutiliza los documentos ya creados con el mismo nombre en la carpeta
+    'copyDocumentsFromTemplateBatch',
+    'appendUploadChunk',
+    'finalizeUpload',
+    'abortUpload'
+}
+
+# Campos con contenido base64 que no se vuelcan al log
+CAMPOS_BINARIOS = ('fileData', 'chunkData')
+
+# Acciones que modifican un archivo: su copia local (drive_file_cache) se descarta
+CAMPO_ARCHIVO_MODIFICADO = {
+    'deleteFile': 'fileId',
+    'overwriteFile': 'fileId',
+    'updateDocumentPlaceholders': 'documentId',
+}
+
+
+def _resumir_payload(valor):
+    """Copia del payload para el log, sin el contenido base64 (también dentro de un batch)"""
+    if isinstance(valor, dict):
+        return {
+            clave: f'<{len(item)} caracteres>' if clave in CAMPOS_BINARIOS and isinstance(item, str)
+            else _resumir_payload(item)
+            for clave, item in valor.items()
+        }
+    if isinstance(valor, list):
+        return [_resumir_payload(item) for item in valor]
+    return valor
+
+
+class OperacionDrive:
+    """Operación de un LoteDrive; su resultado queda en `resultado` al ejecutar el lote"""
+
+    def __init__(self, indice, action, params):
+        self.indice = indice
+        self.action = action
+        self.params = params
+        self.resultado = None
+
+    def ref(self, campo):
+        """Referencia a un campo del resultado de esta operación, para usar como parámetro de otra"""
+        return {'$ref': f'{self.indice}.{campo}'}
+
+    @property
+    def success(self):
+        return bool(self.resultado and self.resultado.get('success'))
+
+
+class LoteDrive:
+    """Varias acciones de Apps Script en una sola petición (acción `batch`)
+
+    Las operaciones se ejecutan en orden y, por defecto, las siguientes se
+    omiten después del primer error. Un parámetro puede referirse al
+    resultado de una operación anterior:
+
+        lote = drive_service.batch()
+        carpeta = lote.agregar('createNestedFolder', parentFolderId=padre, folderName=nombre)
+        lote.agregar('uploadFile', folderId=carpeta.ref('folderId'), ...)
+        lote.ejecutar()
+    """
+
+    def __init__(self, servicio, detener_en_error=True):
+        self.servicio = servicio
+        self.detener_en_error = detener_en_error
+        self.operaciones = []
+
+    def agregar(self, action, **params):
+        operacion = OperacionDrive(len(self.operaciones), action, params)
+        self.operaciones.append(operacion)
+        return operacion
+
+    def ejecutar(self, timeout=None):
+        """
+        Envía las operaciones y asigna el resultado de cada una
+
+        Returns:
+            list: Resultados en el orden de las operaciones ({'success': True, ...}
+                o {'success': False, 'error': str})
+        """
+        if not self.operaciones:
+            return []
+        if len(self.operaciones) == 1:
+            # Sin otras operaciones que combinar, la acción se envía directamente
+            operacion = self.operaciones[0]
+            resultados = [self.servicio._make_request(operacion.action, operacion.params, timeout=timeout)]
+        else:
+            resultados = self._ejecutar_batch(timeout)
+
+        for operacion, resultado in zip(self.operaciones, resultados):
+            operacion.resultado = resultado
+            campo = CAMPO_ARCHIVO_MODIFICADO.get(operacion.action)
+            # Las omitidas tras un error no llegaron a ejecutarse
+            if campo and isinstance(operacion.params.get(campo), str) and not resultado.get('skipped'):
+                self.servicio._invalidar_cache(operacion.params[campo])
+        return resultados
+
+    def _ejecutar_batch(self, timeout):
+        result = self.servicio._make_request('batch', {
+            'operations': [{'action': operacion.action, 'params': operacion.params} for operacion in self.operaciones],
+            'stopOnError': self.detener_en_error
+        }, timeout=timeout, idempotente=all(operacion.action in ACCIONES_IDEMPOTENTES for operacion in self.operaciones))
+        if not result or not result.get('success'):
+            error_msg = result.get('error', 'Error desconocido') if result else 'Sin respuesta del servidor'
+            return [{'success': False, 'error': error_msg} for _ in self.operaciones]
+
+        resultados = []
+        for item in result.get('results', []):
+            if not item.get('success'):
+                item = dict(item, error=item.get('message', 'Error desconocido'))
+            resultados.append(item)
+        return resultados
+
 
 class GoogleDriveService:
     def obtener_contenido_archivo(self, file_id):
@@ -31,56 +161,110 @@ class GoogleDriveService:
         self.secure_token = os.getenv('GOOGLE_DRIVE_SECURE_TOKEN')
         self.folder_id = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
         self.dictamen_template_id = os.getenv('DICTAMEN_TEMPLATE_ID')
-    def _make_request(self, action, data):
-        """Hace una petición al Google Apps Script"""
-        try:
-            payload = {
-                'action': action,
-                'token': self.secure_token,
-                **data
-            }
-            
-            current_app.logger.info(f"Enviando petición a Google Apps Script: {action}")
-            current_app.logger.debug(f"URL: {self.gas_url}")
-            current_app.logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
-            
-            response = requests.post(
-                self.gas_url,
-                data=json.dumps(payload),
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
-            
-            current_app.logger.info(f"Respuesta HTTP: {response.status_code}")
-            current_app.logger.debug(f"Contenido respuesta: {response.text}")
+        
+        # Sesión HTTP compartida (pool de conexiones keep-alive)
+        self.http = get_http_session('google_apps_script')
+        self.timeout = get_timeout('google_apps_script')
+        self.max_retries = int(os.getenv('HTTP_GOOGLE_APPS_SCRIPT_MAX_RETRIES', os.getenv('HTTP_MAX_RETRIES', '3')))
+        self.backoff_factor = float(os.getenv('HTTP_GOOGLE_APPS_SCRIPT_BACKOFF_FACTOR', os.getenv('HTTP_BACKOFF_FACTOR', '0.5')))
+        
+        # Archivos mayores al umbral se suben por partes para acotar la memoria
+        self.chunk_threshold = int(os.getenv('GOOGLE_DRIVE_CHUNK_THRESHOLD', str(5 * 1024 * 1024)))
+        self.chunk_size = int(os.getenv('GOOGLE_DRIVE_CHUNK_SIZE', str(4 * 1024 * 1024)))
+
+        # Tiempo de ejecución por invocación de los lotes de dictámenes (el
+        # límite de Apps Script es de 6 minutos)
+        self.batch_max_runtime = float(os.getenv('GOOGLE_DRIVE_BATCH_MAX_RUNTIME', '270'))
+
+    def batch(self, detener_en_error=True):
+        """Nuevo LoteDrive para combinar varias acciones en una sola petición"""
+        return LoteDrive(self, detener_en_error=detener_en_error)
+
+    def _make_request(self, action, data, timeout=None, idempotente=None):
+        """Hace una petición al Google Apps Script
+
+        Usa la sesión HTTP compartida (conexiones keep-alive). Las acciones
+        idempotentes se reintentan con backoff ante timeouts y errores 5xx;
+        `idempotente` permite indicarlo para acciones compuestas (batch).
+        """
+        payload = {
+            'action': action,
+            'token': self.secure_token,
+            **data
+        }
+        
+        current_app.logger.info(f"Enviando petición a Google Apps Script: {action}")
+        current_app.logger.debug(f"URL: {self.gas_url}")
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug(f"Payload: {json.dumps(_resumir_payload(payload), indent=2)}")
+        
+        if idempotente is None:
+            idempotente = action in ACCIONES_IDEMPOTENTES
+        intentos = 1 + (self.max_retries if idempotente else 0)
+        for intento in range(intentos):
+            ultimo_intento = intento == intentos - 1
+            try:
+                response = self.http.post(
+                    self.gas_url,
+                    data=json.dumps(payload),
+                    headers={'Content-Type': 'application/json'},
+                    timeout=timeout or self.timeout
+                )
+            except requests.exceptions.Timeout:
+                current_app.logger.error("Timeout al conectar con Google Apps Script")
+                if ultimo_intento:
+                    return {'success': False, 'error': 'Timeout de conexión'}
+                self._esperar_reintento(action, intento)
+                continue
+            except requests.exceptions.ConnectionError:
+                current_app.logger.error("Error de conexión con Google Apps Script")
+                if ultimo_intento:
+                    return {'success': False, 'error': 'Error de conexión'}
+                self._esperar_reintento(action, intento)
+                continue
+            except Exception as e:
+                current_app.logger.error(f"Error al hacer petición a Google Apps Script: {str(e)}")
+                return {'success': False, 'error': f'Error inesperado: {str(e)}'}
             
-            if response.status_code == 200:
-                try:
-                    result = response.json()
-                    if result.get('success'):
-                        current_app.logger.info(f"Petición exitosa: {result.get('message', 'Sin mensaje')}")
-                        return result
-                    else:
-                        error_msg = result.get('message', 'Error desconocido')
-                        current_app.logger.error(f"Error en Google Apps Script: {error_msg}")
-                        return {'success': False, 'error': error_msg}
-                except json.JSONDecodeError as e:
-                    current_app.logger.error(f"Error al decodificar JSON: {e}")
-                    current_app.logger.error(f"Respuesta recibida: {response.text}")
-                    return {'success': False, 'error': 'Respuesta inválida del servidor'}
-            else:
-                current_app.logger.error(f"Error HTTP {response.status_code}: {response.text}")
-                return {'success': False, 'error': f'Error HTTP {response.status_code}'}
-                
-        except requests.exceptions.Timeout:
-            current_app.logger.error("Timeout al conectar con Google Apps Script")
-            return {'success': False, 'error': 'Timeout de conexión'}
-        except requests.exceptions.ConnectionError:
-            current_app.logger.error("Error de conexión con Google Apps Script")
-            return {'success': False, 'error': 'Error de conexión'}
-        except Exception as e:
-            current_app.logger.error(f"Error al hacer petición a Google Apps Script: {str(e)}")
-            return {'success': False, 'error': f'Error inesperado: {str(e)}'}
+            if response.status_code >= 500 and not ultimo_intento:
+                current_app.logger.warning(f"Error HTTP {response.status_code} en {action}")
+                self._esperar_reintento(action, intento)
+                continue
+            break
+        
+        current_app.logger.info(f"Respuesta HTTP: {response.status_code}")
+        current_app.logger.debug(f"Contenido respuesta: {response.text}")
+        
+        if response.status_code == 200:
+            try:
+                result = response.json()
+                if result.get('success'):
+                    current_app.logger.info(f"Petición exitosa: {result.get('message', 'Sin mensaje')}")
+                    return result
+                else:
+                    error_msg = result.get('message', 'Error desconocido')
+                    current_app.logger.error(f"Error en Google Apps Script: {error_msg}")
+                    return {'success': False, 'error': error_msg}
+            except json.JSONDecodeError as e:
+                current_app.logger.error(f"Error al decodificar JSON: {e}")
+                current_app.logger.error(f"Respuesta recibida: {response.text}")
+                return {'success': False, 'error': 'Respuesta inválida del servidor'}
+        else:
+            current_app.logger.error(f"Error HTTP {response.status_code}: {response.text}")
+            return {'success': False, 'error': f'Error HTTP {response.status_code}'}
+    
+    def _invalidar_cache(self, file_id):
+        """Descarta la copia local de un archivo modificado o eliminado en Drive"""
+        cache = current_app.extensions.get('drive_file_cache')
+        if cache:
+            cache.invalidar(file_id)
+    
+    def _esperar_reintento(self, action, intento):
+        """Espera con backoff exponencial antes de reintentar una acción idempotente"""
+        espera = self.backoff_factor * (2 ** intento)
+        current_app.logger.info(f"Reintentando {action} en {espera:.1f}s (intento {intento + 2})")
+        time.sleep(espera)
+
     def crear_carpeta_equivalencia(self, dni, carrera_origen, id_equivalencia, timestamp=None):
         """
         Crea una carpeta en Google Drive para una equivalencia específica
@@ -155,6 +339,7 @@ class GoogleDriveService:
         }
         
         result = self._make_request('deleteFile', data)
+        self._invalidar_cache(file_id)
         if result:
             current_app.logger.info(f"Archivo eliminado exitosamente: {file_id}")
             return {'success': True}
@@ -192,7 +377,7 @@ class GoogleDriveService:
                 'error': 'No se pudo eliminar la carpeta de Google Drive'
             }
     
-    def subir_archivo(self, folder_id, file_path, file_name):
+    def subir_archivo(self, folder_id, file_path, file_name, reemplazar_file_id=None):
         """
         Sube un archivo a una carpeta específica en Google Drive
         
@@ -200,42 +385,51 @@ class GoogleDriveService:
             folder_id (str): ID de la carpeta destino
             file_path (str): Ruta local del archivo
             file_name (str): Nombre del archivo
+            reemplazar_file_id (str, optional): Archivo anterior que se elimina
+                una vez subido el nuevo (en la misma petición si el archivo
+                no se sube por partes)
             
         Returns:
             dict: Resultado de la operación
         """
         try:
-            with open(file_path, 'rb') as file:
-                file_data = file.read()
-            
-            # Convertir a base64 para envío
-            import base64
-            file_data_b64 = base64.b64encode(file_data).decode('utf-8')
-            
             # Determinar tipo MIME
-            import mimetypes
             mime_type, _ = mimetypes.guess_type(file_path)
             if not mime_type:
                 mime_type = 'application/octet-stream'
             
-            data = {
-                'folderId': folder_id,
-                'fileName': file_name,
-                'fileData': file_data_b64,
-                'mimeType': mime_type
-            }
+            if os.path.getsize(file_path) > self.chunk_threshold:
+                result = self._subir_archivo_por_partes(folder_id, file_path, file_name, mime_type)
+                if reemplazar_file_id and result and result.get('success'):
+                    self.eliminar_archivo(reemplazar_file_id)
+            else:
+                with open(file_path, 'rb') as file:
+                    file_data_b64 = base64.b64encode(file.read()).decode('utf-8')
+                
+                lote = self.batch()
+                subida = lote.agregar(
+                    'uploadFile',
+                    folderId=folder_id,
+                    fileName=file_name,
+                    fileData=file_data_b64,
+                    mimeType=mime_type
+                )
+                if reemplazar_file_id:
+                    lote.agregar('deleteFile', fileId=reemplazar_file_id)
+                lote.ejecutar()
+                result = subida.resultado
             
-            result = self._make_request('uploadFile', data)
-            if result:
+            if result and result.get('success'):
                 return {
                     'success': True,
                     'file_id': result.get('fileId'),
                     'file_url': f"https://drive.google.com/file/d/{result.get('fileId')}/view"
                 }
             else:
+                error_msg = result.get('error', 'Error desconocido') if result else 'Sin respuesta del servidor'
                 return {
                     'success': False,
-                    'error': 'No se pudo subir el archivo a Google Drive'
+                    'error': f'No se pudo subir el archivo a Google Drive: {error_msg}'
                 }
                 
         except Exception as e:
@@ -245,6 +439,50 @@ class GoogleDriveService:
                 'error': f'Error al procesar el archivo: {str(e)}'
             }
     
+    def _subir_archivo_por_partes(self, folder_id, file_path, file_name, mime_type):
+        """
+        Sube un archivo en partes (initUpload / appendUploadChunk / finalizeUpload)
+        
+        Lee el archivo de a chunk_size bytes, de modo que la memoria usada no
+        depende del tamaño del archivo.
+        
+        Returns:
+            dict: Respuesta de finalizeUpload o {'success': False, 'error': str}
+        """
+        init_result = self._make_request('initUpload', {
+            'folderId': folder_id,
+            'fileName': file_name,
+            'mimeType': mime_type
+        })
+        if not init_result or not init_result.get('success'):
+            return init_result
+        
+        upload_id = init_result.get('uploadId')
+        total_chunks = 0
+        with open(file_path, 'rb') as file:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                chunk_result = self._make_request('appendUploadChunk', {
+                    'uploadId': upload_id,
+                    'index': total_chunks,
+                    'chunkData': base64.b64encode(chunk).decode('ascii')
+                })
+                if not chunk_result or not chunk_result.get('success'):
+                    self._make_request('abortUpload', {'uploadId': upload_id})
+                    return chunk_result
+                total_chunks += 1
+        
+        current_app.logger.info(f"Subidas {total_chunks} partes de {file_name}")
+        result = self._make_request('finalizeUpload', {
+            'uploadId': upload_id,
+            'totalChunks': total_chunks
+        })
+        if not result or not result.get('success'):
+            self._make_request('abortUpload', {'uploadId': upload_id})
+        return result
+    
     def _sanitize_folder_name(self, name):
         """
         Sanitiza el nombre de una carpeta removiendo caracteres especiales
@@ -311,13 +549,15 @@ class GoogleDriveService:
         
         return {'success': True}
 
-    def crear_dictamen_final(self, solicitud, placeholders):
+    def crear_dictamen_final(self, solicitud, placeholders, reemplazar_file_id=None):
         """
         Crea el dictamen final usando el template de Google Docs
         
         Args:
             solicitud (SolicitudEquivalencia): La solicitud de equivalencia
             placeholders (dict): Diccionario con los placeholders y sus valores
+            reemplazar_file_id (str, optional): Dictamen anterior, que se
+                elimina en la misma petición una vez creado el nuevo
             
         Returns:
             dict: Resultado de la operación con file_id si es exitosa
@@ -348,16 +588,23 @@ class GoogleDriveService:
         
         current_app.logger.info(f"Enviando datos para crear dictamen: {json.dumps(data, indent=2, ensure_ascii=False)}")
         
-        result = self._make_request('copyDocumentFromTemplate', data)
+        lote = self.batch()
+        copia = lote.agregar('copyDocumentFromTemplate', **data)
+        if reemplazar_file_id:
+            lote.agregar('deleteFile', fileId=reemplazar_file_id)
+        lote.ejecutar()
+        result = copia.resultado
         if result and result.get('success'):
             file_id = result.get('fileId')
             file_url = result.get('fileUrl')
             current_app.logger.info(f"Dictamen final creado exitosamente: {file_id}")
+            self._registrar_tiempos_reemplazo(doc_name, result.get('timing'))
             return {
                 'success': True,
                 'file_id': file_id,
                 'file_url': file_url,
-                'file_name': doc_name
+                'file_name': doc_name,
+                'timing': result.get('timing')
             }
         else:
             error_msg = result.get('message', 'Error desconocido') if result else 'Sin respuesta del servidor'
@@ -367,6 +614,32 @@ class GoogleDriveService:
                 'error': f'No se pudo crear el dictamen final: {error_msg}'
             }
     
+    def _registrar_tiempos_reemplazo(self, documento, timing):
+        """Deja en el log los tiempos de reemplazo de placeholders que devuelve Apps Script"""
+        if not timing:
+            return
+        mensaje = (f"Placeholders de {documento}: {timing.get('replaced')} reemplazos en "
+                   f"{timing.get('replaceMs')} ms (documento {timing.get('totalMs')} ms)")
+        if timing.get('missing'):
+            mensaje += f"; ausentes en el documento: {', '.join(timing['missing'])}"
+        current_app.logger.info(mensaje)
+    
+    def obtener_placeholders_template(self):
+        """
+        Lista los placeholders que contiene el template de dictamen (getTemplatePlaceholders)
+        
+        Returns:
+            dict: 'success' y 'placeholders' (lista de claves como '{{ID_SOLICITUD}}') o 'error'
+        """
+        if not self.dictamen_template_id:
+            return {'success': False, 'error': 'DICTAMEN_TEMPLATE_ID no configurado'}
+        
+        result = self._make_request('getTemplatePlaceholders', {'templateId': self.dictamen_template_id})
+        if result and result.get('success'):
+            return {'success': True, 'placeholders': result.get('placeholders') or []}
+        error_msg = (result.get('error') or result.get('message', 'Error desconocido')) if result else 'Sin respuesta del servidor'
+        return {'success': False, 'error': error_msg}
+    
     def actualizar_dictamen_final(self, file_id, placeholders):
         """
         Actualiza un dictamen final existente con nuevos placeholders
@@ -386,9 +659,12 @@ class GoogleDriveService:
         }
         
         result = self._make_request('updateDocumentPlaceholders', data)
+        # Aun si falló, el documento pudo quedar modificado parcialmente
+        self._invalidar_cache(file_id)
         if result and result.get('success'):
             current_app.logger.info(f"Dictamen final actualizado exitosamente: {file_id}")
-            return {'success': True}
+            self._registrar_tiempos_reemplazo(file_id, result.get('timing'))
+            return {'success': True, 'timing': result.get('timing')}
         else:
             error_msg = result.get('message', 'Error desconocido') if result else 'Sin respuesta del servidor'
             current_app.logger.error(f"Error al actualizar dictamen final: {error_msg}")
@@ -396,3 +672,103 @@ class GoogleDriveService:
                 'success': False,
                 'error': f'No se pudo actualizar el dictamen final: {error_msg}'
             }
+
+    def crear_dictamenes_finales_lote(self, items):
+        """
+        Crea varios dictámenes finales con copyDocumentsFromTemplateBatch
+
+        Cada invocación de Apps Script crea tantos documentos como entren en
+        GOOGLE_DRIVE_BATCH_MAX_RUNTIME y devuelve un token de continuación;
+        se vuelve a invocar con ese token hasta terminar. El dictamen anterior
+        de cada solicitud (si lo hay) se elimina después de crear el nuevo.
+
+        Args:
+            items (list): Tuplas (solicitud, placeholders)
+
+        Yields:
+            list: Resultados de cada invocación, uno por documento procesado:
+                {'solicitud_id', 'success', 'file_id', 'file_url', 'file_name', 'timing'}
+                o {'solicitud_id', 'success': False, 'error'}
+        """
+        config_check = self.verificar_configuracion()
+        if not config_check['success']:
+            error_msg = f"Configuración incompleta: {', '.join(config_check['missing_config'])}"
+            current_app.logger.error(error_msg)
+            yield [{'solicitud_id': solicitud.id, 'success': False, 'error': error_msg} for solicitud, _ in items]
+            return
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        documentos = [
+            {
+                'key': str(solicitud.id),
+                'newFileName': f"Dictamen_Final_{solicitud.dni_solicitante}_{solicitud.id_solicitud}_{timestamp}",
+                'placeholders': placeholders,
+                'folderId': solicitud.google_drive_folder_id,
+                'previousFileId': solicitud.dictamen_final_file_id
+            }
+            for solicitud, placeholders in items
+        ]
+        connect_timeout, read_timeout = self.timeout
+        timeout = (connect_timeout, max(read_timeout, self.batch_max_runtime + 60))
+
+        anteriores = {documento['key']: documento['previousFileId'] for documento in documentos}
+        pendientes = set(anteriores)
+        token = None
+        while pendientes:
+            current_app.logger.info(f"Creando lote de dictámenes: {len(pendientes)} pendientes de {len(documentos)}")
+            result = self._make_request('copyDocumentsFromTemplateBatch', {
+                'templateId': self.dictamen_template_id,
+                'documents': documentos,
+                'continuationToken': token,
+                'maxRuntimeMs': int(self.batch_max_runtime * 1000)
+            }, timeout=timeout)
+            if not result or not result.get('success'):
+                error_msg = result.get('error', 'Error desconocido') if result else 'Sin respuesta del servidor'
+                current_app.logger.error(f"Error al crear lote de dictámenes: {error_msg}")
+                yield [
+                    {'solicitud_id': int(key), 'success': False,
+                     'error': f'No se pudo crear el dictamen final: {error_msg}'}
+                    for key in sorted(pendientes, key=int)
+                ]
+                return
+
+            resultados = []
+            reemplazo_ms = reemplazos = 0
+            for item in result.get('results', []):
+                pendientes.discard(item['key'])
+                if item.get('success'):
+                    if anteriores.get(item['key']):
+                        self._invalidar_cache(anteriores[item['key']])
+                    # timing es null para los documentos reutilizados de un reintento
+                    timing = item.get('timing') or {}
+                    reemplazo_ms += timing.get('replaceMs', 0)
+                    reemplazos += timing.get('replaced', 0)
+                    resultados.append({
+                        'solicitud_id': int(item['key']),
+                        'success': True,
+                        'file_id': item['fileId'],
+                        'file_url': item['fileUrl'],
+                        'file_name': item['fileName'],
+                        'timing': item.get('timing')
+                    })
+                else:
+                    resultados.append({
+                        'solicitud_id': int(item['key']),
+                        'success': False,
+                        'error': f"No se pudo crear el dictamen final: {item.get('message', 'Error desconocido')}"
+                    })
+            current_app.logger.info(
+                f"Lote de dictámenes: {result.get('processed')}/{result.get('total')} en {result.get('elapsedMs')} ms "
+                f"({reemplazos} placeholders reemplazados en {reemplazo_ms} ms)"
+            )
+            yield resultados
+
+            token = result.get('continuationToken')
+            if not token:
+                break
+
+        if pendientes:
+            yield [
+                {'solicitud_id': int(key), 'success': False, 'error': 'Apps Script no devolvió el resultado del documento'}
+                for key in sorted(pendientes, key=int)
+            ]
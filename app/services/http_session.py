@@ -0,0 +1,65 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Shared, keep-alive sessions per upstream ('keycloak', 'google_apps_script'),
+# reused across requests and worker threads
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _config(name, upstream, default):
+    """Read HTTP_<UPSTREAM>_<NAME>, falling back to HTTP_<NAME> and the default"""
+    return os.getenv(f'HTTP_{upstream.upper()}_{name}', os.getenv(f'HTTP_{name}', default))
+
+
+def get_timeout(upstream):
+    """Get the (connect, read) timeout tuple for an upstream"""
+    return (
+        float(_config('CONNECT_TIMEOUT', upstream, '5')),
+        float(_config('READ_TIMEOUT', upstream, '30'))
+    )
+
+
+def create_session(upstream):
+    """Create a pooled session with urllib3 retry/backoff for an upstream
+
+    Status-based retries only apply to idempotent HTTP methods (GET, PUT,
+    DELETE...). Connection errors happen before anything is sent and are
+    retried for every method.
+    """
+    pool_size = int(_config('POOL_SIZE', upstream, '10'))
+    retries = Retry(
+        total=int(_config('MAX_RETRIES', upstream, '3')),
+        backoff_factor=float(_config('BACKOFF_FACTOR', upstream, '0.5')),
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_http_session(upstream):
+    """Get (or lazily create) the shared session for an upstream"""
+    session = _sessions.get(upstream)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        if upstream not in _sessions:
+            _sessions[upstream] = create_session(upstream)
+        return _sessions[upstream]
+
+
+def init_app(app):
+    """Create the shared sessions and expose them through app.extensions"""
+    for upstream in ('keycloak', 'google_apps_script'):
+        get_http_session(upstream)
+    app.extensions['http_sessions'] = _sessions
@@ -0,0 +1,315 @@
+import json
+import os
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert, select
+from app import db
+
+# Claves de datos_solicitante -> columnas de SolicitudEquivalencia
+CAMPOS_SOLICITANTE = {
+    'id_archivo_solicitud': 'id_archivo_solicitud',
+    'nombre': 'nombre_solicitante',
+    'apellido': 'apellido_solicitante',
+    'dni': 'dni_solicitante',
+    'legajo_crub': 'legajo_crub',
+    'correo': 'correo_solicitante',
+    'institucion_origen': 'institucion_origen',
+    'carrera_origen': 'carrera_origen',
+    'observaciones': 'observaciones_solicitante',
+}
+CAMPOS_DICTAMEN = ('asignatura_origen', 'asignatura_destino', 'tipo_equivalencia', 'observaciones')
+
+# Errores detallados que se conservan en el resumen (el resto sólo se cuenta)
+MAX_ERRORES_REPORTADOS = 20
+
+
+class _LectorJSON:
+    """Recorre un documento JSON por partes sin cargarlo entero en memoria
+
+    Sólo se decodifica de a un elemento del arreglo de solicitudes a la vez
+    (json.JSONDecoder.raw_decode sobre un buffer que se rellena a demanda).
+    """
+
+    def __init__(self, archivo, tamano_bloque=1 << 16):
+        self.archivo = archivo
+        self.tamano_bloque = tamano_bloque
+        self.buffer = ''
+        self.pos = 0
+        self.fin = False
+        self.decoder = json.JSONDecoder()
+
+    def _rellenar(self):
+        bloque = self.archivo.read(self.tamano_bloque)
+        if not bloque:
+            self.fin = True
+            return False
+        self.buffer = self.buffer[self.pos:] + bloque
+        self.pos = 0
+        return True
+
+    def _siguiente_caracter(self):
+        """Devuelve el próximo carácter no blanco sin consumirlo ('' al final)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._rellenar():
+                return ''
+
+    def _esperar(self, caracteres):
+        caracter = self._siguiente_caracter()
+        if caracter not in caracteres or not caracter:
+            raise ValueError(f"JSON inválido: se esperaba {' o '.join(caracteres)} y se encontró {caracter!r}")
+        self.pos += 1
+        return caracter
+
+    def _valor(self):
+        """Decodifica el próximo valor completo, leyendo más del archivo si hace falta"""
+        self._siguiente_caracter()
+        while True:
+            try:
+                valor, fin = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fin and self._rellenar():
+                    continue
+                raise
+            # Un número al final del buffer puede estar cortado
+            if fin == len(self.buffer) and not self.fin and self._rellenar():
+                continue
+            self.pos = fin
+            return valor
+
+    def _elementos(self):
+        self._esperar('[')
+        if self._siguiente_caracter() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._valor()
+            if self._esperar(',]') == ']':
+                return
+
+    def solicitudes(self, clave='solicitud_equivalencia'):
+        """Itera el arreglo de nivel superior o el arreglo `clave` del objeto de nivel superior"""
+        if self._siguiente_caracter() == '[':
+            yield from self._elementos()
+            return
+        self._esperar('{')
+        if self._siguiente_caracter() == '}':
+            return
+        while True:
+            nombre = self._valor()
+            self._esperar(':')
+            if nombre == clave and self._siguiente_caracter() == '[':
+                yield from self._elementos()
+            else:
+                # Otras claves (usuarios_evaluadores, ...) se descartan
+                self._valor()
+            if self._esperar(',}') == '}':
+                return
+
+
+def leer_solicitudes(ruta):
+    """
+    Itera las solicitudes de un archivo JSON (formato de data_structure.json o
+    un arreglo de solicitudes) o JSONL (una solicitud por línea)
+    """
+    with open(ruta, encoding='utf-8-sig') as archivo:
+        if os.path.splitext(ruta)[1].lower() in ('.jsonl', '.ndjson'):
+            for linea in archivo:
+                if linea.strip():
+                    yield json.loads(linea)
+        else:
+            yield from _LectorJSON(archivo).solicitudes()
+
+
+def _fecha(valor, campo):
+    if valor in (None, ''):
+        return None
+    if isinstance(valor, str):
+        try:
+            fecha = datetime.fromisoformat(valor)
+        except ValueError:
+            raise ValueError(f"{campo} no es una fecha ISO: {valor!r}")
+        return fecha.replace(tzinfo=None)
+    raise ValueError(f"{campo} no es una fecha ISO: {valor!r}")
+
+
+def _texto(valor):
+    if valor is None:
+        return None
+    return valor if isinstance(valor, str) else str(valor)
+
+
+class ImportadorSolicitudes:
+    """
+    Importa solicitudes históricas en lotes con INSERT de Core
+
+    Cada lote inserta las solicitudes (INSERT ... RETURNING para conocer sus
+    ids), luego sus dictámenes, suma los contadores por estado y hace commit.
+    Las solicitudes cuyo id_solicitud ya existe se omiten, así que una
+    importación interrumpida puede volver a ejecutarse con el mismo archivo.
+    Las carpetas de Google Drive no se crean aquí: ver
+    `flask encolar-carpetas-drive`.
+    """
+
+    def __init__(self, lote=1000, progreso=None):
+        from app.models import SolicitudEquivalencia, Dictamen, Usuario
+        from app.services.estadisticas import ESTADOS_SOLICITUD
+
+        self.lote = lote
+        self.progreso = progreso
+        self.tabla_solicitudes = SolicitudEquivalencia.__table__
+        self.tabla_dictamenes = Dictamen.__table__
+        self.estados = set(ESTADOS_SOLICITUD)
+        self.longitudes = {
+            columna.name: columna.type.length
+            for columna in (*self.tabla_solicitudes.columns, *self.tabla_dictamenes.columns)
+            if getattr(columna.type, 'length', None)
+        }
+        self.requeridos = [
+            columna.name for columna in self.tabla_solicitudes.columns
+            if not columna.nullable and not columna.primary_key and columna.default is None
+        ]
+
+        # Se cargan una sola vez: legajo -> usuario y los id_solicitud existentes
+        self.evaluadores = dict(db.session.execute(
+            select(Usuario.legajo_evaluador, Usuario.id).where(Usuario.legajo_evaluador.isnot(None))
+        ).all())
+        self.existentes = set(db.session.execute(select(SolicitudEquivalencia.id_solicitud)).scalars())
+
+        self.resumen = {
+            'leidas': 0,
+            'importadas': 0,
+            'dictamenes': 0,
+            'omitidas': 0,
+            'invalidas': 0,
+            'sin_evaluador': 0,
+            'errores': [],
+        }
+
+    def _validar_longitud(self, fila, campos):
+        for campo in campos:
+            maximo = self.longitudes.get(campo)
+            if maximo and fila.get(campo) is not None and len(fila[campo]) > maximo:
+                raise ValueError(f"{campo} supera los {maximo} caracteres")
+
+    def _mapear(self, item):
+        """Convierte una solicitud del archivo en (fila de solicitud, filas de dictamen)"""
+        if not isinstance(item, dict):
+            raise ValueError('la solicitud no es un objeto JSON')
+        solicitante = item.get('datos_solicitante') or {}
+
+        fila = {columna: _texto(solicitante.get(clave)) for clave, columna in CAMPOS_SOLICITANTE.items()}
+        fila['id_solicitud'] = _texto(item.get('id_solicitud'))
+        fila['carrera_crub_destino'] = _texto(item.get('carrera_crub_destino'))
+        fila['estado'] = item.get('estado') or 'pendiente'
+        if fila['estado'] not in self.estados:
+            raise ValueError(f"estado desconocido: {fila['estado']!r}")
+        fila['fecha_solicitud'] = _fecha(item.get('fecha_solicitud'), 'fecha_solicitud') or datetime.now()
+        fila['fecha_resolucion'] = _fecha(item.get('fecha_resolucion'), 'fecha_resolucion')
+
+        faltantes = [campo for campo in self.requeridos if not fila.get(campo)]
+        if faltantes:
+            raise ValueError(f"faltan datos: {', '.join(faltantes)}")
+        self._validar_longitud(fila, fila.keys())
+
+        legajo = _texto(item.get('legajo_evaluador'))
+        fila['evaluador_id'] = self.evaluadores.get(legajo) if legajo else None
+
+        dictamenes = []
+        for dictamen in item.get('dictamen') or []:
+            fila_dictamen = {campo: _texto(dictamen.get(campo)) for campo in CAMPOS_DICTAMEN}
+            if not fila_dictamen['asignatura_origen']:
+                raise ValueError('dictamen sin asignatura_origen')
+            self._validar_longitud(fila_dictamen, CAMPOS_DICTAMEN)
+            fila_dictamen['evaluador_id'] = fila['evaluador_id']
+            fila_dictamen['fecha_dictamen'] = fila['fecha_resolucion']
+            dictamenes.append(fila_dictamen)
+
+        if legajo and fila['evaluador_id'] is None:
+            self.resumen['sin_evaluador'] += 1
+        return fila, dictamenes
+
+    def _registrar_error(self, posicion, item, error):
+        self.resumen['invalidas'] += 1
+        if len(self.resumen['errores']) < MAX_ERRORES_REPORTADOS:
+            id_solicitud = item.get('id_solicitud') if isinstance(item, dict) else None
+            self.resumen['errores'].append(f"#{posicion} ({id_solicitud or 'sin id'}): {error}")
+
+    def _insertar_lote(self, filas):
+        """Inserta un lote de (fila, dictámenes) y hace commit"""
+        from app.services.estadisticas import aplicar_deltas
+
+        conexion = db.session.connection()
+        ids = dict(conexion.execute(
+            insert(self.tabla_solicitudes).returning(
+                self.tabla_solicitudes.c.id_solicitud, self.tabla_solicitudes.c.id,
+                sort_by_parameter_order=True
+            ),
+            [fila for fila, _ in filas]
+        ).all())
+
+        dictamenes = [
+            dict(dictamen, solicitud_id=ids[fila['id_solicitud']])
+            for fila, filas_dictamen in filas
+            for dictamen in filas_dictamen
+        ]
+        if dictamenes:
+            conexion.execute(insert(self.tabla_dictamenes), dictamenes)
+
+        deltas = {}
+        for fila, _ in filas:
+            deltas[fila['estado']] = deltas.get(fila['estado'], 0) + 1
+        aplicar_deltas(conexion, deltas)
+        db.session.commit()
+
+        self.resumen['importadas'] += len(filas)
+        self.resumen['dictamenes'] += len(dictamenes)
+        if self.progreso:
+            self.progreso(self.resumen)
+
+    def importar(self, solicitudes):
+        """Importa un iterable de solicitudes y devuelve el resumen"""
+        pendientes = []
+        for posicion, item in enumerate(solicitudes, start=1):
+            self.resumen['leidas'] += 1
+            if isinstance(item, dict) and _texto(item.get('id_solicitud')) in self.existentes:
+                self.resumen['omitidas'] += 1
+                continue
+            try:
+                fila, dictamenes = self._mapear(item)
+            except ValueError as e:
+                self._registrar_error(posicion, item, e)
+                continue
+            self.existentes.add(fila['id_solicitud'])
+            pendientes.append((fila, dictamenes))
+            if len(pendientes) >= self.lote:
+                self._insertar_lote(pendientes)
+                pendientes = []
+        if pendientes:
+            self._insertar_lote(pendientes)
+
+        # Los INSERT de Core no pasan por los eventos del ORM
+        fragment_cache = current_app.extensions.get('fragment_cache')
+        if fragment_cache and self.resumen['importadas']:
+            fragment_cache.invalidar()
+        return self.resumen
+
+
+def importar_solicitudes(ruta, lote=1000, progreso=None):
+    """
+    Importa las solicitudes de un archivo JSON/JSONL
+
+    Args:
+        ruta (str): Archivo con el formato de data_structure.json, un arreglo
+            de solicitudes o una solicitud por línea (.jsonl)
+        lote (int): Solicitudes por INSERT y commit
+        progreso (callable): Recibe el resumen parcial después de cada commit
+
+    Returns:
+        dict: leidas, importadas, dictamenes, omitidas (ya existentes),
+            invalidas, sin_evaluador (legajo desconocido) y errores
+    """
+    return ImportadorSolicitudes(lote=lote, progreso=progreso).importar(leer_solicitudes(ruta))
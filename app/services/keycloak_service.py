@@ -1,7 +1,21 @@
 import os
-import requests
+import threading
+import time
 import jwt
 from urllib.parse import urlencode, quote
+from app.services.http_session import get_http_session, get_timeout
+
+
+# Process-wide caches shared by every KeycloakService instance, keyed on
+# (server_url, realm, client_id)
+_admin_token_cache = {}  # key -> (token dict, expires_at monotonic timestamp)
+_admin_token_lock = threading.Lock()
+_client_uuid_cache = {}  # key -> client UUID (never changes at runtime)
+
+# Realm signing keys used to verify access tokens locally, keyed on JWKS URL
+_jwks_cache = {}  # jwks_url -> {'keys': {kid: PyJWK}, 'fetched_at': monotonic timestamp}
+_jwks_lock = threading.Lock()
+JWKS_MIN_REFRESH_INTERVAL = 60  # seconds between refetches triggered by unknown kids
 
 
 class KeycloakService:
@@ -23,6 +37,14 @@ class KeycloakService:
         self.token_url = f"{self.base_url}/protocol/openid-connect/token"
         self.userinfo_url = f"{self.base_url}/protocol/openid-connect/userinfo"
         self.logout_endpoint = f"{self.base_url}/protocol/openid-connect/logout"
+        self.jwks_url = f"{self.base_url}/protocol/openid-connect/certs"
+        
+        # Shared keep-alive connection pool
+        self.http = get_http_session('keycloak')
+        self.timeout = get_timeout('keycloak')
+        
+        # Role members are fetched in pages of this size (first/max)
+        self.page_size = int(os.getenv('KEYCLOAK_PAGE_SIZE', '100'))
 
     def get_auth_url(self):
         """Generate authorization URL for Keycloak"""
@@ -50,7 +72,7 @@ class KeycloakService:
         print(f"DEBUG: Token exchange data: {data}")
         
         try:
-            response = requests.post(self.token_url, data=data)
+            response = self.http.post(self.token_url, data=data, timeout=self.timeout)
             print(f"DEBUG: Token response status: {response.status_code}")
             print(f"DEBUG: Token response: {response.text}")
             
@@ -70,7 +92,7 @@ class KeycloakService:
         }
         
         try:
-            response = requests.get(self.userinfo_url, headers=headers)
+            response = self.http.get(self.userinfo_url, headers=headers, timeout=self.timeout)
             print(f"DEBUG: Userinfo response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -85,18 +107,116 @@ class KeycloakService:
             return None
 
     def validate_token(self, access_token):
+        """Validate access token
+
+        The token is verified locally against the realm JWKS (signature, exp,
+        iss and aud/azp). The userinfo endpoint is only called when local
+        verification is inconclusive (e.g. JWKS unavailable or unknown key).
+        """
+        local_result = self.verify_token_locally(access_token)
+        if local_result is not None:
+            return local_result
+        
+        return self._validate_token_remote(access_token)
+
+    def _validate_token_remote(self, access_token):
         """Validate access token by making a request to userinfo endpoint"""
         headers = {
             'Authorization': f"Bearer {access_token}"
         }
         
         try:
-            response = requests.get(self.userinfo_url, headers=headers)
+            response = self.http.get(self.userinfo_url, headers=headers, timeout=self.timeout)
             return response.status_code == 200
         except Exception as e:
             print(f"Token validation error: {str(e)}")
             return False
 
+    def verify_token_locally(self, access_token):
+        """Verify an access token offline using the cached realm JWKS
+
+        Returns:
+            bool | None: True if valid, False if definitely invalid,
+            None if the result is inconclusive and remote validation is needed
+        """
+        try:
+            header = jwt.get_unverified_header(access_token)
+        except jwt.InvalidTokenError:
+            return False
+        
+        kid = header.get('kid')
+        signing_key = self._get_signing_key(kid) if kid else None
+        if signing_key is None:
+            return None
+        
+        # Allowed algorithms are fixed by configuration, never taken from the unverified header
+        algorithms = [alg.strip() for alg in os.getenv('KEYCLOAK_TOKEN_ALGORITHMS', 'RS256').split(',') if alg.strip()]
+        try:
+            claims = jwt.decode(
+                access_token,
+                key=signing_key.key,
+                algorithms=algorithms,
+                issuer=self.base_url,
+                leeway=int(os.getenv('KEYCLOAK_TOKEN_LEEWAY', '10')),
+                options={'require': ['exp', 'iss'], 'verify_aud': False}
+            )
+        except jwt.ExpiredSignatureError:
+            return False
+        except (jwt.InvalidSignatureError, jwt.InvalidAlgorithmError, jwt.InvalidIssuerError,
+                jwt.MissingRequiredClaimError):
+            return False
+        except jwt.InvalidTokenError as e:
+            print(f"Local token verification inconclusive: {str(e)}")
+            return None
+        
+        # Keycloak access tokens carry the client in azp; aud is often just 'account'
+        audience = os.getenv('KEYCLOAK_TOKEN_AUDIENCE', self.client_id)
+        aud = claims.get('aud') or []
+        if isinstance(aud, str):
+            aud = [aud]
+        return audience in aud or claims.get('azp') == audience
+
+    def _get_signing_key(self, kid):
+        """Get the realm signing key for a kid, refetching the JWKS on unknown kids"""
+        entry = _jwks_cache.get(self.jwks_url)
+        if entry and kid in entry['keys']:
+            return entry['keys'][kid]
+        
+        with _jwks_lock:
+            entry = _jwks_cache.get(self.jwks_url)
+            if entry and kid in entry['keys']:
+                return entry['keys'][kid]
+            # Keys rotate rarely; don't let bogus kids hammer the certs endpoint
+            if entry and time.monotonic() - entry['fetched_at'] < JWKS_MIN_REFRESH_INTERVAL:
+                return None
+            
+            keys = self._fetch_jwks()
+            if keys is None:
+                return None
+            _jwks_cache[self.jwks_url] = {'keys': keys, 'fetched_at': time.monotonic()}
+            return keys.get(kid)
+
+    def _fetch_jwks(self):
+        """Fetch the realm JWKS and build the signing keys"""
+        try:
+            response = self.http.get(self.jwks_url, timeout=self.timeout)
+            if response.status_code != 200:
+                print(f"JWKS fetch failed: {response.status_code} - {response.text}")
+                return None
+            keys = {}
+            for key_data in response.json().get('keys', []):
+                if key_data.get('use', 'sig') != 'sig' or not key_data.get('kid'):
+                    continue
+                try:
+                    keys[key_data['kid']] = jwt.PyJWK(key_data)
+                except jwt.PyJWKError as e:
+                    # Unsupported algorithm or missing cryptography backend
+                    print(f"Skipping JWKS key {key_data.get('kid')}: {str(e)}")
+            return keys
+        except Exception as e:
+            print(f"JWKS fetch error: {str(e)}")
+            return None
+
     def map_keycloak_roles_to_app_roles(self, user_info):
         """Map Keycloak roles to application roles"""
         print(f"DEBUG: Starting role mapping for user: {user_info.get('preferred_username')}")
@@ -154,7 +274,7 @@ class KeycloakService:
         }
         
         try:
-            response = requests.post(self.token_url, data=data)
+            response = self.http.post(self.token_url, data=data, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -164,8 +284,42 @@ class KeycloakService:
             print(f"Token refresh error: {str(e)}")
             return None
 
+    def _cache_key(self):
+        return (self.server_url, self.realm, self.client_id)
+
     def get_admin_token(self):
-        """Get admin token for API access"""
+        """Get admin token for API access
+
+        The client-credentials token is cached process-wide until shortly before
+        it expires (KEYCLOAK_TOKEN_SAFETY_MARGIN seconds). When it needs a refresh,
+        only one thread requests a new token while the others wait for it.
+        """
+        key = self._cache_key()
+        cached = _admin_token_cache.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        
+        with _admin_token_lock:
+            # Another thread may have refreshed the token while we waited
+            cached = _admin_token_cache.get(key)
+            if cached and cached[1] > time.monotonic():
+                return cached[0]
+            
+            token = self._request_admin_token()
+            if token:
+                expires_in = int(token.get('expires_in', 60))
+                margin = int(os.getenv('KEYCLOAK_TOKEN_SAFETY_MARGIN', '30'))
+                ttl = max(expires_in - margin, expires_in // 2)
+                _admin_token_cache[key] = (token, time.monotonic() + ttl)
+            return token
+
+    def invalidate_admin_token(self):
+        """Drop the cached admin token (e.g. after a 401 from the admin API)"""
+        with _admin_token_lock:
+            _admin_token_cache.pop(self._cache_key(), None)
+
+    def _request_admin_token(self):
+        """Request a new admin token from Keycloak (client credentials grant)"""
         data = {
             'grant_type': 'client_credentials',
             'client_id': self.client_id,
@@ -173,7 +327,7 @@ class KeycloakService:
         }
         
         try:
-            response = requests.post(self.token_url, data=data)
+            response = self.http.post(self.token_url, data=data, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -183,42 +337,71 @@ class KeycloakService:
             print(f"Admin token error: {str(e)}")
             return None
 
-    def get_users_by_role(self, role_name):
-        """Get users by client role from Keycloak"""
+    def iter_role_members(self, role_name, page_size=None):
+        """Yield the members of a client role page by page (lists of user dicts)
+
+        Pages through /roles/{role}/users with first/max so large realms are
+        not truncated at the server default, and only one page is held in
+        memory at a time. Raises RuntimeError if a page cannot be fetched, so
+        a partial list is never mistaken for the complete one.
+        """
+        page_size = page_size or self.page_size
         admin_token = self.get_admin_token()
         if not admin_token:
-            print("Failed to get admin token")
-            return []
+            raise RuntimeError("Failed to get admin token")
         
-        # Get client UUID first
         client_uuid = self.get_client_uuid(admin_token['access_token'])
         if not client_uuid:
-            return []
+            raise RuntimeError(f"Client {self.client_id} not found in realm {self.realm}")
         
-        # Get users with the specific role
         url = f"{self.server_url}/admin/realms/{self.realm}/clients/{client_uuid}/roles/{role_name}/users"
-        headers = {
-            'Authorization': f"Bearer {admin_token['access_token']}",
-            'Content-Type': 'application/json'
-        }
-        
-        try:
-            response = requests.get(url, headers=headers)
-            print(f"DEBUG: Get users by role response status: {response.status_code}")
+        first = 0
+        retried = False
+        while True:
+            headers = {
+                'Authorization': f"Bearer {admin_token['access_token']}",
+                'Content-Type': 'application/json'
+            }
+            params = {'first': first, 'max': page_size, 'briefRepresentation': 'true'}
+            try:
+                response = self.http.get(url, headers=headers, params=params, timeout=self.timeout)
+            except Exception as e:
+                raise RuntimeError(f"Get users by role error: {str(e)}") from e
             
-            if response.status_code == 200:
-                users = response.json()
-                print(f"DEBUG: Found {len(users)} users with role {role_name}")
-                return users
-            else:
-                print(f"Get users by role failed: {response.status_code} - {response.text}")
-                return []
-        except Exception as e:
-            print(f"Get users by role error: {str(e)}")
+            if response.status_code == 401 and not retried:
+                # Cached token was revoked or expired early; fetch a new one once
+                self.invalidate_admin_token()
+                admin_token = self.get_admin_token()
+                if not admin_token:
+                    raise RuntimeError("Failed to get admin token")
+                retried = True
+                continue
+            if response.status_code != 200:
+                raise RuntimeError(f"Get users by role failed: {response.status_code} - {response.text}")
+            
+            users = response.json()
+            print(f"DEBUG: Fetched {len(users)} users with role {role_name} (first={first})")
+            if users:
+                yield users
+            if len(users) < page_size:
+                return
+            first += page_size
+            retried = False
+
+    def get_users_by_role(self, role_name):
+        """Get all users with a client role from Keycloak ([] on error)"""
+        try:
+            return [user for page in self.iter_role_members(role_name) for user in page]
+        except RuntimeError as e:
+            print(str(e))
             return []
 
     def get_client_uuid(self, access_token):
-        """Get the UUID of the client by client_id"""
+        """Get the UUID of the client by client_id (cached process-wide)"""
+        key = self._cache_key()
+        if key in _client_uuid_cache:
+            return _client_uuid_cache[key]
+        
         url = f"{self.server_url}/admin/realms/{self.realm}/clients"
         headers = {
             'Authorization': f"Bearer {access_token}",
@@ -226,12 +409,13 @@ class KeycloakService:
         }
         
         try:
-            response = requests.get(url, headers=headers, params={'clientId': self.client_id})
+            response = self.http.get(url, headers=headers, params={'clientId': self.client_id}, timeout=self.timeout)
             if response.status_code == 200:
                 clients = response.json()
                 if clients:
                     client_uuid = clients[0]['id']
                     print(f"DEBUG: Client UUID for {self.client_id}: {client_uuid}")
+                    _client_uuid_cache[key] = client_uuid
                     return client_uuid
                 else:
                     print(f"Client {self.client_id} not found")
@@ -243,64 +427,146 @@ class KeycloakService:
             print(f"Get client UUID error: {str(e)}")
             return None
 
-    def get_evaluadores(self):
-        """Get all users with evaluador role and sync them to local database"""
-        from app.models import Usuario
+    def sincronizar_evaluadores(self, eliminar_ausentes=False, page_size=None):
+        """
+        Sincroniza los evaluadores de Keycloak con la base local como un diff de conjuntos
+
+        Recorre los miembros del rol por páginas (iter_role_members). Por cada
+        página trae los usuarios locales correspondientes en una sola consulta
+        (indexados por keycloak_id y por email), calcula en memoria las altas
+        y modificaciones y las aplica con sentencias masivas; la memoria usada
+        depende del tamaño de página y no del tamaño del realm. Las bajas se
+        calculan al final con los keycloak_id vistos. Todo se confirma en un
+        único commit, que se omite si no hubo diferencias.
+
+        Args:
+            eliminar_ausentes (bool): Eliminar los evaluadores locales de
+                Keycloak que ya no tienen el rol
+            page_size (int): Miembros por página (por defecto KEYCLOAK_PAGE_SIZE)
+
+        Returns:
+            dict: 'ids' (usuarios locales de los evaluadores de Keycloak),
+                'total' (miembros del rol), 'paginas', 'creados',
+                'actualizados', 'eliminados', 'sin_cambios' y 'omitidos' (sin email)
+        """
+        from sqlalchemy import delete, update
+        from app.models import Usuario, SolicitudEquivalencia, Dictamen
         from app import db
-        
-        print("DEBUG: Starting get_evaluadores - fetching from Keycloak")
-        evaluadores_keycloak = self.get_users_by_role('evaluador')
-        evaluadores_locales = []
-        
-        print(f"DEBUG: Found {len(evaluadores_keycloak)} evaluadores in Keycloak")
-        
-        for user_data in evaluadores_keycloak:
-            print(f"DEBUG: Processing evaluador: {user_data.get('username')} ({user_data.get('email')})")
-            
-            # Check if user exists locally
-            user = Usuario.query.filter_by(keycloak_id=user_data['id']).first()
-            if not user:
-                # Check by email as fallback
-                user = Usuario.query.filter_by(email=user_data.get('email', '')).first()
-            
-            if not user and user_data.get('email'):
-                # Create new user
-                print(f"DEBUG: Creating new evaluador: {user_data.get('username')}")
-                user = Usuario(
-                    username=user_data.get('username', user_data.get('email')),
-                    email=user_data.get('email'),
-                    nombre=user_data.get('firstName', ''),
-                    apellido=user_data.get('lastName', ''),
-                    rol='evaluador',
-                    keycloak_id=user_data['id'],
-                    is_keycloak_user=True
-                )
-                db.session.add(user)
-            elif user:
-                # Update existing user
-                print(f"DEBUG: Updating existing evaluador: {user.username}")
-                user.keycloak_id = user_data['id']
-                user.is_keycloak_user = True
-                user.rol = 'evaluador'  # Ensure role is correct
-                user.nombre = user_data.get('firstName', user.nombre)
-                user.apellido = user_data.get('lastName', user.apellido)
-                user.email = user_data.get('email', user.email)
-            else:
-                print(f"WARNING: Could not process evaluador {user_data.get('username')} - missing email")
-                continue
-            
-            if user:
-                evaluadores_locales.append(user)
-        
+
+        resumen = {'ids': [], 'total': 0, 'paginas': 0, 'creados': 0, 'actualizados': 0,
+                   'eliminados': 0, 'sin_cambios': 0, 'omitidos': 0}
+        vistos = set()
         try:
-            db.session.commit()
-            print(f"DEBUG: Successfully synced {len(evaluadores_locales)} evaluadores from Keycloak")
+            for pagina in self.iter_role_members('evaluador', page_size):
+                resumen['paginas'] += 1
+                resumen['total'] += len(pagina)
+                vistos.update(user_data['id'] for user_data in pagina)
+                self._sincronizar_pagina_evaluadores(pagina, resumen)
+
+            if eliminar_ausentes and not vistos:
+                # Un rol vacío suele ser un error de configuración: no vaciar la tabla
+                print("WARNING: Keycloak returned no evaluadores; skipping removal of local evaluadores")
+            elif eliminar_ausentes:
+                candidatos = db.session.query(Usuario.id, Usuario.keycloak_id).filter(
+                    Usuario.rol == 'evaluador',
+                    Usuario.is_keycloak_user == True,
+                    Usuario.keycloak_id.isnot(None)
+                )
+                bajas = [id_ for id_, keycloak_id in candidatos if keycloak_id not in vistos]
+                if bajas:
+                    # Las solicitudes y dictámenes de los evaluadores eliminados quedan sin asignar
+                    db.session.execute(update(SolicitudEquivalencia).where(
+                        SolicitudEquivalencia.evaluador_id.in_(bajas)).values(evaluador_id=None))
+                    db.session.execute(update(Dictamen).where(
+                        Dictamen.evaluador_id.in_(bajas)).values(evaluador_id=None))
+                    db.session.execute(delete(Usuario).where(Usuario.id.in_(bajas)))
+                    resumen['eliminados'] = len(bajas)
+
+            if resumen['creados'] or resumen['actualizados'] or resumen['eliminados']:
+                db.session.commit()
         except Exception as e:
             db.session.rollback()
             print(f"ERROR: Failed to sync evaluadores: {str(e)}")
             raise e
-        
-        return evaluadores_locales
+
+        print(f"Keycloak sync: {resumen['total']} evaluadores en Keycloak ({resumen['paginas']} páginas), "
+              f"{resumen['creados']} nuevos, {resumen['actualizados']} actualizados, "
+              f"{resumen['eliminados']} eliminados, {resumen['sin_cambios']} sin cambios"
+              + (f", {resumen['omitidos']} omitidos sin email" if resumen['omitidos'] else ""))
+        return resumen
+
+    def _sincronizar_pagina_evaluadores(self, pagina, resumen):
+        """Aplica las altas y modificaciones de una página de miembros del rol (sin commit)"""
+        from sqlalchemy import insert, or_, update
+        from app.models import Usuario
+        from app import db
+
+        keycloak_ids = [user_data['id'] for user_data in pagina]
+        emails = [user_data['email'] for user_data in pagina if user_data.get('email')]
+        campos = ('id', 'keycloak_id', 'email', 'nombre', 'apellido', 'rol', 'is_keycloak_user')
+        locales = [
+            dict(zip(campos, fila))
+            for fila in db.session.query(*[getattr(Usuario, campo) for campo in campos]).filter(
+                or_(Usuario.keycloak_id.in_(keycloak_ids), Usuario.email.in_(emails))
+            )
+        ]
+        por_keycloak_id = {local['keycloak_id']: local for local in locales if local['keycloak_id']}
+        por_email = {local['email']: local for local in locales}
+
+        altas, modificaciones = [], []
+        for user_data in pagina:
+            local = por_keycloak_id.get(user_data['id']) or por_email.get(user_data.get('email', ''))
+            if local is None:
+                if not user_data.get('email'):
+                    print(f"WARNING: Could not process evaluador {user_data.get('username')} - missing email")
+                    resumen['omitidos'] += 1
+                    continue
+                altas.append({
+                    'username': user_data.get('username', user_data.get('email')),
+                    'email': user_data.get('email'),
+                    'nombre': user_data.get('firstName', ''),
+                    'apellido': user_data.get('lastName', ''),
+                    'rol': 'evaluador',
+                    'keycloak_id': user_data['id'],
+                    'is_keycloak_user': True
+                })
+                continue
+
+            resumen['ids'].append(local['id'])
+            deseado = {
+                'keycloak_id': user_data['id'],
+                'is_keycloak_user': True,
+                'rol': 'evaluador',
+                'nombre': user_data.get('firstName', local['nombre']),
+                'apellido': user_data.get('lastName', local['apellido']),
+                'email': user_data.get('email', local['email'])
+            }
+            cambios = {campo: valor for campo, valor in deseado.items() if local[campo] != valor}
+            if cambios:
+                modificaciones.append({'id': local['id'], **cambios})
+            else:
+                resumen['sin_cambios'] += 1
+
+        if modificaciones:
+            # Una sentencia por conjunto de columnas modificadas (executemany por clave primaria)
+            por_columnas = {}
+            for fila in modificaciones:
+                por_columnas.setdefault(tuple(sorted(fila)), []).append(fila)
+            for filas in por_columnas.values():
+                db.session.execute(update(Usuario), filas)
+        if altas:
+            resumen['ids'].extend(db.session.execute(insert(Usuario).returning(Usuario.id), altas).scalars())
+        resumen['creados'] += len(altas)
+        resumen['actualizados'] += len(modificaciones)
+
+    def get_evaluadores(self):
+        """Get all users with evaluador role and sync them to local database"""
+        from app.models import Usuario
+
+        resumen = self.sincronizar_evaluadores()
+        if not resumen['ids']:
+            return []
+        return Usuario.query.filter(Usuario.id.in_(resumen['ids'])).all()
 
     def get_available_evaluadores(self):
         """Get all available evaluators from Keycloak and sync them"""
@@ -320,37 +586,11 @@ class KeycloakService:
     def force_refresh_evaluadores(self):
         """Force refresh all evaluadores from Keycloak, removing local-only evaluadores"""
         from app.models import Usuario
-        from app import db
-        
-        try:
-            print("DEBUG: Starting force refresh of evaluadores")
-            
-            # Get fresh data from Keycloak
-            keycloak_evaluadores = self.get_users_by_role('evaluador')
-            keycloak_ids = [user['id'] for user in keycloak_evaluadores]
-            
-            # Remove local evaluadores that are no longer in Keycloak
-            local_keycloak_evaluadores = Usuario.query.filter(
-                Usuario.rol == 'evaluador',
-                Usuario.is_keycloak_user == True,
-                ~Usuario.keycloak_id.in_(keycloak_ids)
-            ).all()
-            
-            for user in local_keycloak_evaluadores:
-                print(f"DEBUG: Removing evaluador no longer in Keycloak: {user.username}")
-                db.session.delete(user)
-            
-            # Sync current evaluadores
-            evaluadores = self.get_evaluadores()
-            
-            db.session.commit()
-            print(f"DEBUG: Force refresh completed. {len(evaluadores)} evaluadores synced")
-            return evaluadores
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f"ERROR: Force refresh failed: {str(e)}")
-            raise e
+
+        resumen = self.sincronizar_evaluadores(eliminar_ausentes=True)
+        if not resumen['ids']:
+            return []
+        return Usuario.query.filter(Usuario.id.in_(resumen['ids'])).all()
 
     def is_service_available(self):
         """Check if Keycloak service is available and accessible"""
@@ -409,7 +649,7 @@ class KeycloakService:
         print(f"DEBUG: Direct auth data for user: {username}")
         
         try:
-            response = requests.post(self.token_url, data=data)
+            response = self.http.post(self.token_url, data=data, timeout=self.timeout)
             print(f"DEBUG: Direct auth response status: {response.status_code}")
             
             if response.status_code == 200:
@@ -0,0 +1,174 @@
+import base64
+import os
+from datetime import datetime
+from sqlalchemy import and_, false, or_
+
+
+# Filtros de listado aceptados en la query string
+FILTROS_SOLICITUDES = ('estado', 'carrera', 'evaluador')
+SIN_ASIGNAR = 'sin_asignar'
+
+
+def obtener_por_pagina(args):
+    """Tamaño de página pedido (?por_pagina=), acotado a SOLICITUDES_POR_PAGINA_MAX"""
+    por_defecto = int(os.getenv('SOLICITUDES_POR_PAGINA', '50'))
+    maximo = int(os.getenv('SOLICITUDES_POR_PAGINA_MAX', '200'))
+    try:
+        por_pagina = int(args.get('por_pagina', por_defecto))
+    except (TypeError, ValueError):
+        por_pagina = por_defecto
+    return max(1, min(por_pagina, maximo))
+
+
+def codificar_cursor(solicitud):
+    valor = f"{solicitud.fecha_solicitud.isoformat()}|{solicitud.id}"
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_solicitud, id) o None si el cursor es inválido"""
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, id_ = base64.urlsafe_b64decode(cursor + relleno).decode('utf-8').split('|')
+        return datetime.fromisoformat(fecha), int(id_)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def filtros_solicitudes(args):
+    """Lee los filtros de listado (estado, carrera, evaluador) de la query string"""
+    return {nombre: args.get(nombre) for nombre in FILTROS_SOLICITUDES if args.get(nombre)}
+
+
+def aplicar_filtros_solicitudes(query, filtros):
+    """Aplica en la base de datos los filtros devueltos por filtros_solicitudes"""
+    from app.models import SolicitudEquivalencia
+
+    if filtros.get('estado'):
+        query = query.filter(SolicitudEquivalencia.estado == filtros['estado'])
+    if filtros.get('carrera'):
+        query = query.filter(SolicitudEquivalencia.carrera_crub_destino == filtros['carrera'])
+    evaluador = filtros.get('evaluador')
+    if evaluador == SIN_ASIGNAR:
+        query = query.filter(SolicitudEquivalencia.evaluador_id.is_(None))
+    elif evaluador:
+        try:
+            query = query.filter(SolicitudEquivalencia.evaluador_id == int(evaluador))
+        except ValueError:
+            query = query.filter(false())
+    return query
+
+
+class PaginaSolicitudes:
+    """Página de solicitudes obtenida con paginación por cursor (keyset)
+
+    Las solicitudes se ordenan de la más reciente a la más antigua por
+    (fecha_solicitud, id). Cada página continúa desde la última fila de la
+    anterior en lugar de usar OFFSET, de modo que el costo no crece con el
+    número de página y los índices compuestos (..., fecha_solicitud, id)
+    resuelven filtro y orden.
+    """
+
+    def __init__(self, items, por_pagina, filtros, cursor_siguiente=None, cursor_anterior=None):
+        self.items = items
+        self.por_pagina = por_pagina
+        self.filtros = filtros
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    @property
+    def tiene_siguiente(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def tiene_anterior(self):
+        return self.cursor_anterior is not None
+
+    def args(self, **extra):
+        """Argumentos de url_for que conservan filtros y tamaño de página"""
+        args = dict(self.filtros)
+        if self.por_pagina != obtener_por_pagina({}):
+            args['por_pagina'] = self.por_pagina
+        args.update(extra)
+        return args
+
+    def args_siguiente(self):
+        return self.args(despues=self.cursor_siguiente)
+
+    def args_anterior(self):
+        return self.args(antes=self.cursor_anterior)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def paginar_solicitudes(query, args, filtros=None):
+    """
+    Filtra y pagina una consulta de SolicitudEquivalencia
+
+    Args:
+        query: Consulta base (puede tener filtros propios, p. ej. por evaluador)
+        args: request.args; usa por_pagina, despues / antes y los filtros
+        filtros (dict): Filtros a aplicar (por defecto, los de args)
+
+    Returns:
+        PaginaSolicitudes
+    """
+    from app.models import SolicitudEquivalencia
+
+    fecha = SolicitudEquivalencia.fecha_solicitud
+    id_ = SolicitudEquivalencia.id
+    por_pagina = obtener_por_pagina(args)
+    if filtros is None:
+        filtros = filtros_solicitudes(args)
+    query = aplicar_filtros_solicitudes(query, filtros)
+
+    antes = decodificar_cursor(args.get('antes'))
+    despues = decodificar_cursor(args.get('despues'))
+
+    if antes:
+        # Página anterior: se recorre en orden ascendente y se invierte
+        filas = query.filter(or_(
+            fecha > antes[0], and_(fecha == antes[0], id_ > antes[1])
+        )).order_by(fecha.asc(), id_.asc()).limit(por_pagina + 1).all()
+        hay_mas = len(filas) > por_pagina
+        items = list(reversed(filas[:por_pagina]))
+        cursor_anterior = codificar_cursor(items[0]) if hay_mas else None
+        cursor_siguiente = codificar_cursor(items[-1]) if items else None
+    else:
+        if despues:
+            query = query.filter(or_(
+                fecha < despues[0], and_(fecha == despues[0], id_ < despues[1])
+            ))
+        filas = query.order_by(fecha.desc(), id_.desc()).limit(por_pagina + 1).all()
+        hay_mas = len(filas) > por_pagina
+        items = filas[:por_pagina]
+        cursor_siguiente = codificar_cursor(items[-1]) if hay_mas else None
+        cursor_anterior = codificar_cursor(items[0]) if despues and items else None
+
+    return PaginaSolicitudes(items, por_pagina, filtros, cursor_siguiente, cursor_anterior)
+
+
+def pagina_sin_filas(args):
+    """PaginaSolicitudes sin filas, con los filtros y el tamaño de página de args
+
+    Alcanza para el formulario de filtros cuando la tabla viene de la caché de
+    fragmentos y la consulta paginada no se ejecutó.
+    """
+    return PaginaSolicitudes([], obtener_por_pagina(args), filtros_solicitudes(args))
+
+
+def carreras_destino():
+    """Carreras destino presentes en las solicitudes (opciones del filtro)"""
+    from app import db
+    from app.models import SolicitudEquivalencia
+
+    filas = db.session.query(SolicitudEquivalencia.carrera_crub_destino).distinct().order_by(
+        SolicitudEquivalencia.carrera_crub_destino
+    ).all()
+    return [carrera for (carrera,) in filas]
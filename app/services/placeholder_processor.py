@@ -1,90 +1,146 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import json
 from datetime import datetime
+from functools import cached_property
 from flask import current_app
 
 
-class PlaceholderProcessor:
-    """Service for processing placeholders in document templates"""
-    
-    def __init__(self):
-        """Initialize the placeholder processor"""
-        pass
-    def process_solicitud_placeholders(self, solicitud):
-        """
-        Process placeholders for a solicitud de equivalencia
-        
-        Args:
-            solicitud (SolicitudEquivalencia): The solicitud object
-            
-        Returns:
-            dict: Dictionary with placeholders and their values
-        """
-        try:
-            # Basic solicitud information
-            placeholders = {
-                '{{FIRMA_EVALUADOR}}': solicitud.firma_evaluador or '',
-                '{{ID_SOLICITUD}}': solicitud.id_solicitud or '',
-                '{{FECHA_SOLICITUD}}': solicitud.fecha_solicitud.strftime('%d/%m/%Y') if solicitud.fecha_solicitud else '',
-                '{{FECHA_RESOLUCION}}': solicitud.fecha_resolucion.strftime('%d/%m/%Y') if solicitud.fecha_resolucion else '',
-                '{{ESTADO}}': self._format_estado(solicitud.estado) or '',
-                
-                # Solicitante information
-                '{{NOMBRE_SOLICITANTE}}': solicitud.nombre_solicitante or '',
-                '{{APELLIDO_SOLICITANTE}}': solicitud.apellido_solicitante or '',
-                '{{NOMBRE_COMPLETO_SOLICITANTE}}': f"{solicitud.nombre_solicitante} {solicitud.apellido_solicitante}".strip(),
-                '{{DNI_SOLICITANTE}}': solicitud.dni_solicitante or '',
-                '{{LEGAJO_CRUB}}': solicitud.legajo_crub or '',
-                '{{CORREO_SOLICITANTE}}': solicitud.correo_solicitante or '',
-                
-                # Academic information
-                '{{INSTITUCION_ORIGEN}}': solicitud.institucion_origen or '',
-                '{{CARRERA_ORIGEN}}': solicitud.carrera_origen or '',
-                '{{CARRERA_CRUB_DESTINO}}': solicitud.carrera_crub_destino or '',
-                '{{OBSERVACIONES_SOLICITANTE}}': solicitud.observaciones_solicitante or '',
-                
-                # Evaluator information
-                '{{EVALUADOR_NOMBRE}}': solicitud.evaluador.nombre if solicitud.evaluador else '',
-                '{{EVALUADOR_APELLIDO}}': solicitud.evaluador.apellido if solicitud.evaluador else '',
-                '{{EVALUADOR_NOMBRE_COMPLETO}}': f"{solicitud.evaluador.nombre} {solicitud.evaluador.apellido}".strip() if solicitud.evaluador else '',
-                '{{EVALUADOR_LEGAJO}}': solicitud.evaluador.legajo_evaluador if solicitud.evaluador else '',
-                '{{EVALUADOR_DEPARTAMENTO}}': solicitud.evaluador.departamento_academico if solicitud.evaluador else '',
-                
-                # Current date
-                '{{FECHA_ACTUAL}}': datetime.now().strftime('%d/%m/%Y'),
-                '{{FECHA_ACTUAL_COMPLETA}}': datetime.now().strftime('%d de %B de %Y'),
-                
-                # Dictamenes list
-                '{{DICTAMENES_TABLA}}': self._format_dictamenes_tabla(solicitud.dictamenes),
-                '{{DICTAMENES_LISTA}}': self._format_dictamenes_lista(solicitud.dictamenes),
-                
-                # Counts
-                '{{TOTAL_DICTAMENES}}': str(len(solicitud.dictamenes)),
-                '{{TOTAL_EQUIVALENCIAS_APROBADAS}}': str(len([d for d in solicitud.dictamenes if d.tipo_equivalencia and 'total' in d.tipo_equivalencia.lower()])),
-                '{{TOTAL_EQUIVALENCIAS_PARCIALES}}': str(len([d for d in solicitud.dictamenes if d.tipo_equivalencia and 'parcial' in d.tipo_equivalencia.lower()])),
-            }
-            
-            return placeholders
-            
-        except Exception as e:
-            current_app.logger.error(f"Error processing placeholders: {str(e)}")
-            return {}
-    
-    def _format_estado(self, estado):
-        """Format estado for display"""
-        estado_map = {
-            'pendiente': 'Pendiente',
-            'en_evaluacion': 'En Evaluación',
-            'aprobada': 'Aprobada',
-            'rechazada': 'Rechazada'
-        }
-        return estado_map.get(estado, estado)
-    
-    def _format_dictamenes_tabla(self, dictamenes):
-        """Format dictamenes as HTML table"""
-        if not dictamenes:
-            return "<p>No hay dictámenes registrados.</p>"
-        
-        html = """
+class Placeholder:
+    """A template placeholder: its key, category, the model fields it depends on and how to compute it"""
+
+    __slots__ = ('clave', 'categoria', 'campos', 'calcular')
+
+    def __init__(self, clave, categoria, campos, calcular):
+        self.clave = clave
+        self.categoria = categoria
+        self.campos = frozenset(campos)
+        self.calcular = calcular
+
+
+class _Contexto:
+    """Intermediate values shared by several placeholders of one solicitud (computed once, on demand)"""
+
+    def __init__(self, solicitud):
+        self.solicitud = solicitud
+
+    @cached_property
+    def ahora(self):
+        return datetime.now()
+
+    @cached_property
+    def evaluador(self):
+        return self.solicitud.evaluador
+
+    @cached_property
+    def dictamenes(self):
+        return list(self.solicitud.dictamenes)
+
+    @cached_property
+    def conteos(self):
+        """(totales, parciales) in a single pass over the dictamenes"""
+        totales = parciales = 0
+        for dictamen in self.dictamenes:
+            tipo = (dictamen.tipo_equivalencia or '').lower()
+            if 'total' in tipo:
+                totales += 1
+            if 'parcial' in tipo:
+                parciales += 1
+        return totales, parciales
+
+
+# Campo de los placeholders que cambian con la fecha del día (no cuentan como cambios del dictamen)
+CAMPO_FECHA_ACTUAL = 'fecha_actual'
+
+
+def _fecha(valor, formato='%d/%m/%Y'):
+    return valor.strftime(formato) if valor else ''
+
+
+def _campo_solicitud(campo):
+    return lambda ctx: getattr(ctx.solicitud, campo) or ''
+
+
+def _campo_evaluador(campo):
+    return lambda ctx: (getattr(ctx.evaluador, campo) or '') if ctx.evaluador else ''
+
+
+def _nombre_completo(nombre, apellido):
+    return f"{nombre or ''} {apellido or ''}".strip()
+
+
+ESTADOS = {
+    'pendiente': 'Pendiente',
+    'en_evaluacion': 'En Evaluación',
+    'aprobada': 'Aprobada',
+    'rechazada': 'Rechazada'
+}
+
+_SOLICITUD = 'Información de Solicitud'
+_SOLICITANTE = 'Información del Solicitante'
+_ACADEMICA = 'Información Académica'
+_EVALUADOR = 'Información del Evaluador'
+_FECHAS = 'Fechas'
+_DICTAMENES = 'Dictámenes'
+
+# Campos de dictámenes de los que dependen la tabla y la lista
+_CAMPOS_DICTAMEN = ('dictamenes.asignatura_origen', 'dictamenes.asignatura_destino',
+                    'dictamenes.tipo_equivalencia', 'dictamenes.observaciones')
+
+# Registry of placeholders, in documentation order. `campos` names the
+# solicitud attributes each value is computed from ('evaluador.x' and
+# 'dictamenes.x' for related rows, 'fecha_actual' for the current date).
+PLACEHOLDERS = {placeholder.clave: placeholder for placeholder in [
+    Placeholder('{{ID_SOLICITUD}}', _SOLICITUD, ['id_solicitud'], _campo_solicitud('id_solicitud')),
+    Placeholder('{{FECHA_SOLICITUD}}', _SOLICITUD, ['fecha_solicitud'],
+                lambda ctx: _fecha(ctx.solicitud.fecha_solicitud)),
+    Placeholder('{{FECHA_RESOLUCION}}', _SOLICITUD, ['fecha_resolucion'],
+                lambda ctx: _fecha(ctx.solicitud.fecha_resolucion)),
+    Placeholder('{{ESTADO}}', _SOLICITUD, ['estado'],
+                lambda ctx: ESTADOS.get(ctx.solicitud.estado, ctx.solicitud.estado) or ''),
+
+    Placeholder('{{NOMBRE_SOLICITANTE}}', _SOLICITANTE, ['nombre_solicitante'], _campo_solicitud('nombre_solicitante')),
+    Placeholder('{{APELLIDO_SOLICITANTE}}', _SOLICITANTE, ['apellido_solicitante'],
+                _campo_solicitud('apellido_solicitante')),
+    Placeholder('{{NOMBRE_COMPLETO_SOLICITANTE}}', _SOLICITANTE, ['nombre_solicitante', 'apellido_solicitante'],
+                lambda ctx: _nombre_completo(ctx.solicitud.nombre_solicitante, ctx.solicitud.apellido_solicitante)),
+    Placeholder('{{DNI_SOLICITANTE}}', _SOLICITANTE, ['dni_solicitante'], _campo_solicitud('dni_solicitante')),
+    Placeholder('{{LEGAJO_CRUB}}', _SOLICITANTE, ['legajo_crub'], _campo_solicitud('legajo_crub')),
+    Placeholder('{{CORREO_SOLICITANTE}}', _SOLICITANTE, ['correo_solicitante'], _campo_solicitud('correo_solicitante')),
+
+    Placeholder('{{INSTITUCION_ORIGEN}}', _ACADEMICA, ['institucion_origen'], _campo_solicitud('institucion_origen')),
+    Placeholder('{{CARRERA_ORIGEN}}', _ACADEMICA, ['carrera_origen'], _campo_solicitud('carrera_origen')),
+    Placeholder('{{CARRERA_CRUB_DESTINO}}', _ACADEMICA, ['carrera_crub_destino'],
+                _campo_solicitud('carrera_crub_destino')),
+    Placeholder('{{OBSERVACIONES_SOLICITANTE}}', _ACADEMICA, ['observaciones_solicitante'],
+                _campo_solicitud('observaciones_solicitante')),
+
+    Placeholder('{{EVALUADOR_NOMBRE}}', _EVALUADOR, ['evaluador.nombre'], _campo_evaluador('nombre')),
+    Placeholder('{{EVALUADOR_APELLIDO}}', _EVALUADOR, ['evaluador.apellido'], _campo_evaluador('apellido')),
+    Placeholder('{{EVALUADOR_NOMBRE_COMPLETO}}', _EVALUADOR, ['evaluador.nombre', 'evaluador.apellido'],
+                lambda ctx: _nombre_completo(ctx.evaluador.nombre, ctx.evaluador.apellido) if ctx.evaluador else ''),
+    Placeholder('{{EVALUADOR_LEGAJO}}', _EVALUADOR, ['evaluador.legajo_evaluador'],
+                _campo_evaluador('legajo_evaluador')),
+    Placeholder('{{EVALUADOR_DEPARTAMENTO}}', _EVALUADOR, ['evaluador.departamento_academico'],
+                _campo_evaluador('departamento_academico')),
+    Placeholder('{{FIRMA_EVALUADOR}}', _EVALUADOR, ['firma_evaluador'], _campo_solicitud('firma_evaluador')),
+
+    Placeholder('{{FECHA_ACTUAL}}', _FECHAS, [CAMPO_FECHA_ACTUAL], lambda ctx: _fecha(ctx.ahora)),
+    Placeholder('{{FECHA_ACTUAL_COMPLETA}}', _FECHAS, [CAMPO_FECHA_ACTUAL],
+                lambda ctx: _fecha(ctx.ahora, '%d de %B de %Y')),
+
+    Placeholder('{{DICTAMENES_TABLA}}', _DICTAMENES, _CAMPOS_DICTAMEN + ('dictamenes.fecha_dictamen',),
+                lambda ctx: PlaceholderProcessor._format_dictamenes_tabla(ctx.dictamenes)),
+    Placeholder('{{DICTAMENES_LISTA}}', _DICTAMENES, _CAMPOS_DICTAMEN,
+                lambda ctx: PlaceholderProcessor._format_dictamenes_lista(ctx.dictamenes)),
+    Placeholder('{{TOTAL_DICTAMENES}}', _DICTAMENES, ['dictamenes'], lambda ctx: str(len(ctx.dictamenes))),
+    Placeholder('{{TOTAL_EQUIVALENCIAS_APROBADAS}}', _DICTAMENES, ['dictamenes.tipo_equivalencia'],
+                lambda ctx: str(ctx.conteos[0])),
+    Placeholder('{{TOTAL_EQUIVALENCIAS_PARCIALES}}', _DICTAMENES, ['dictamenes.tipo_equivalencia'],
+                lambda ctx: str(ctx.conteos[1])),
+]}
+
+_TABLA_INICIO = """
         <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse; width: 100%;">
             <thead>
                 <tr style="background-color: #f0f0f0;">
@@ -97,88 +153,146 @@ class PlaceholderProcessor:
             </thead>
             <tbody>
         """
-        
-        for dictamen in dictamenes:
-            fecha_str = dictamen.fecha_dictamen.strftime('%d/%m/%Y') if dictamen.fecha_dictamen else 'N/A'
-            html += f"""
+_TABLA_FILA = """
                 <tr>
-                    <td>{dictamen.asignatura_origen or ''}</td>
-                    <td>{dictamen.asignatura_destino or 'N/A'}</td>
-                    <td>{dictamen.tipo_equivalencia or 'N/A'}</td>
-                    <td>{dictamen.observaciones or 'N/A'}</td>
-                    <td>{fecha_str}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
+                    <td>{}</td>
                 </tr>
             """
-        
-        html += """
+_TABLA_FIN = """
             </tbody>
         </table>
         """
-        
-        return html
-    
-    def _format_dictamenes_lista(self, dictamenes):
+
+
+class PlaceholderProcessor:
+    """Service for processing placeholders in document templates
+
+    Placeholders are declared in PLACEHOLDERS with the fields they depend on
+    and are computed lazily: only the keys the template actually contains
+    (see DictamenService.placeholders_template) are evaluated.
+    """
+
+    def __init__(self, registro=None):
+        """Initialize the placeholder processor"""
+        self.registro = registro or PLACEHOLDERS
+
+    def process_solicitud_placeholders(self, solicitud, claves=None):
+        """
+        Process placeholders for a solicitud de equivalencia
+
+        Args:
+            solicitud (SolicitudEquivalencia): The solicitud object
+            claves (iterable): Placeholders to compute (e.g. the ones present
+                in the template); None computes every registered placeholder
+
+        Returns:
+            dict: Dictionary with placeholders and their values
+        """
+        try:
+            contexto = _Contexto(solicitud)
+            return {placeholder.clave: placeholder.calcular(contexto) for placeholder in self._seleccion(claves)}
+
+        except Exception as e:
+            current_app.logger.error(f"Error processing placeholders: {str(e)}")
+            return {}
+
+    def huella(self, solicitud, claves=None):
+        """
+        Hash of the fields the given placeholders depend on, to detect whether a document is up to date
+
+        Only the fields declared by the placeholders (see dependencias) are
+        read, so checking a document does not render any placeholder and a
+        change in a field the template does not use keeps the hash. The
+        current date is left out, so the same data on another day has the
+        same hash. The set of keys is part of the hash: a template with
+        different placeholders changes it.
+
+        Args:
+            solicitud (SolicitudEquivalencia): The solicitud object
+            claves (iterable): Placeholders of the template; None means all
+        """
+        contexto = _Contexto(solicitud)
+        contenido = {
+            'claves': sorted(placeholder.clave for placeholder in self._seleccion(claves)),
+            'campos': {campo: self._valor_campo(contexto, campo)
+                       for campo in sorted(self.dependencias(claves) - {CAMPO_FECHA_ACTUAL})}
+        }
+        return hashlib.sha256(
+            json.dumps(contenido, ensure_ascii=False, default=str).encode('utf-8')
+        ).hexdigest()
+
+    def dependencias(self, claves=None):
+        """Fields the given placeholders (all of them by default) are computed from"""
+        return frozenset().union(*(placeholder.campos for placeholder in self._seleccion(claves)))
+
+    def _seleccion(self, claves):
+        """Registered placeholders among claves (all of them if None); unknown keys are ignored"""
+        if claves is None:
+            return list(self.registro.values())
+        return [self.registro[clave] for clave in claves if clave in self.registro]
+
+    @staticmethod
+    def _valor_campo(contexto, campo):
+        """Current value of a field as named in Placeholder.campos"""
+        if campo == 'dictamenes':
+            return len(contexto.dictamenes)
+        relacion, _, atributo = campo.partition('.')
+        if not atributo:
+            return getattr(contexto.solicitud, campo)
+        if relacion == 'evaluador':
+            return getattr(contexto.evaluador, atributo) if contexto.evaluador else None
+        return [getattr(dictamen, atributo) for dictamen in contexto.dictamenes]
+
+    def _format_estado(self, estado):
+        """Format estado for display"""
+        return ESTADOS.get(estado, estado)
+
+    @staticmethod
+    def _format_dictamenes_tabla(dictamenes):
+        """Format dictamenes as HTML table (rows are joined in a single pass)"""
+        if not dictamenes:
+            return "<p>No hay dictámenes registrados.</p>"
+
+        filas = ''.join(
+            _TABLA_FILA.format(
+                dictamen.asignatura_origen or '',
+                dictamen.asignatura_destino or 'N/A',
+                dictamen.tipo_equivalencia or 'N/A',
+                dictamen.observaciones or 'N/A',
+                dictamen.fecha_dictamen.strftime('%d/%m/%Y') if dictamen.fecha_dictamen else 'N/A'
+            )
+            for dictamen in dictamenes
+        )
+        return _TABLA_INICIO + filas + _TABLA_FIN
+
+    @staticmethod
+    def _format_dictamenes_lista(dictamenes):
         """Format dictamenes as numbered list"""
         if not dictamenes:
             return "No hay dictámenes registrados."
-        
-        lista = []
-        for i, dictamen in enumerate(dictamenes, 1):
-            item = f"{i}. {dictamen.asignatura_origen}"
-            if dictamen.asignatura_destino:
-                item += f" → {dictamen.asignatura_destino}"
-            if dictamen.tipo_equivalencia:
-                item += f" ({dictamen.tipo_equivalencia})"
-            if dictamen.observaciones:
-                item += f" - {dictamen.observaciones}"
-            lista.append(item)
-        
-        return '\n'.join(lista)
-    
+
+        return '\n'.join(
+            ''.join((
+                f"{i}. {dictamen.asignatura_origen}",
+                f" → {dictamen.asignatura_destino}" if dictamen.asignatura_destino else '',
+                f" ({dictamen.tipo_equivalencia})" if dictamen.tipo_equivalencia else '',
+                f" - {dictamen.observaciones}" if dictamen.observaciones else ''
+            ))
+            for i, dictamen in enumerate(dictamenes, 1)
+        )
+
     def get_available_placeholders(self):
         """
         Get list of available placeholders for documentation
-        
+
         Returns:
             dict: Dictionary with placeholder categories and their placeholders
         """
-        return {
-            'Información de Solicitud': [
-                '{{ID_SOLICITUD}}',
-                '{{FECHA_SOLICITUD}}',
-                '{{FECHA_RESOLUCION}}',
-                '{{ESTADO}}'
-            ],
-            'Información del Solicitante': [
-                '{{NOMBRE_SOLICITANTE}}',
-                '{{APELLIDO_SOLICITANTE}}',
-                '{{NOMBRE_COMPLETO_SOLICITANTE}}',
-                '{{DNI_SOLICITANTE}}',
-                '{{LEGAJO_CRUB}}',
-                '{{CORREO_SOLICITANTE}}'
-            ],
-            'Información Académica': [
-                '{{INSTITUCION_ORIGEN}}',
-                '{{CARRERA_ORIGEN}}',
-                '{{CARRERA_CRUB_DESTINO}}',
-                '{{OBSERVACIONES_SOLICITANTE}}'
-            ],
-            'Información del Evaluador': [
-                '{{EVALUADOR_NOMBRE}}',
-                '{{EVALUADOR_APELLIDO}}',
-                '{{EVALUADOR_NOMBRE_COMPLETO}}',
-                '{{EVALUADOR_LEGAJO}}',
-                '{{EVALUADOR_DEPARTAMENTO}}'
-            ],
-            'Fechas': [
-                '{{FECHA_ACTUAL}}',
-                '{{FECHA_ACTUAL_COMPLETA}}'
-            ],
-            'Dictámenes': [
-                '{{DICTAMENES_TABLA}}',
-                '{{DICTAMENES_LISTA}}',
-                '{{TOTAL_DICTAMENES}}',
-                '{{TOTAL_EQUIVALENCIAS_APROBADAS}}',
-                '{{TOTAL_EQUIVALENCIAS_PARCIALES}}'
-            ]
-        }
+        categorias = {}
+        for placeholder in self.registro.values():
+            categorias.setdefault(placeholder.categoria, []).append(placeholder.clave)
+        return categorias
@@ -0,0 +1,75 @@
+import threading
+
+
+class ServiceRegistry:
+    """Instancias únicas de los servicios de la aplicación
+
+    Los servicios leen su configuración del entorno una sola vez y comparten
+    los pools HTTP y las cachés de proceso, por eso las rutas los obtienen de
+    aquí (current_app.extensions['services']) en lugar de instanciarlos en
+    cada request. Se crean al primer uso: los comandos CLI y las migraciones
+    no necesitan Keycloak ni Google Drive configurados.
+
+    Los servicios no guardan estado de request, así que una misma instancia
+    se comparte entre hilos.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._instancias = {}
+        # Reentrante: una fábrica puede pedir otros servicios (dictamenes -> google_drive)
+        self._lock = threading.RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['services'] = self
+
+    def _obtener(self, nombre, fabrica):
+        instancia = self._instancias.get(nombre)
+        if instancia is not None:
+            return instancia
+        with self._lock:
+            if nombre not in self._instancias:
+                self._instancias[nombre] = fabrica()
+            return self._instancias[nombre]
+
+    @property
+    def google_drive(self):
+        from app.services.google_drive_service import GoogleDriveService
+        return self._obtener('google_drive', GoogleDriveService)
+
+    @property
+    def placeholders(self):
+        from app.services.placeholder_processor import PlaceholderProcessor
+        return self._obtener('placeholders', PlaceholderProcessor)
+
+    @property
+    def dictamenes(self):
+        from app.services.dictamen_service import DictamenService
+        return self._obtener('dictamenes', lambda: DictamenService(
+            google_drive=self.google_drive,
+            placeholder_processor=self.placeholders
+        ))
+
+    @property
+    def keycloak(self):
+        """KeycloakService; lanza ValueError si falta la configuración (no se cachea el error)"""
+        from app.services.keycloak_service import KeycloakService
+        return self._obtener('keycloak', KeycloakService)
+
+    @property
+    def evaluadores(self):
+        from app.services.evaluador_service import EvaluadorService, keycloak_configurado
+
+        def crear():
+            keycloak_service = None
+            if keycloak_configurado():
+                try:
+                    keycloak_service = self.keycloak
+                except Exception as e:
+                    print(f"Error initializing Keycloak service: {str(e)}")
+            return EvaluadorService(keycloak_service=keycloak_service)
+
+        return self._obtener('evaluadores', crear)
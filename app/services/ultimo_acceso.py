@@ -0,0 +1,120 @@
+import atexit
+import os
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, or_, update
+from app import db
+
+
+class UltimoAccesoBuffer:
+    """Acumula los last_login de los inicios de sesión y los guarda por lotes
+
+    Un inicio de sesión sin cambios en el perfil no escribe en la base: el
+    acceso se anota en memoria y un hilo lo vuelca cada LAST_LOGIN_GRANULARITY
+    segundos con un único UPDATE por lote. Además, un usuario cuyo last_login
+    guardado tiene menos de esa antigüedad ni siquiera se anota, así que
+    last_login tiene esa granularidad. Con granularidad 0 el valor se escribe
+    en el mismo commit del inicio de sesión.
+
+    Los accesos pendientes se vuelcan también al terminar el proceso.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.granularidad = timedelta(0)
+        self._pendientes = {}
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.granularidad = timedelta(seconds=int(os.getenv('LAST_LOGIN_GRANULARITY', '300')))
+        app.extensions['ultimo_acceso'] = self
+        atexit.register(self.volcar)
+
+    @property
+    def habilitado(self):
+        return self.granularidad > timedelta(0)
+
+    def registrar(self, usuario, ahora=None):
+        """
+        Anota el acceso de un usuario ya guardado
+
+        Returns:
+            bool: True si quedó pendiente de volcar, False si el last_login
+                guardado está dentro de la granularidad
+        """
+        ahora = ahora or datetime.now()
+        if usuario.last_login and ahora - usuario.last_login < self.granularidad:
+            return False
+        with self._lock:
+            self._pendientes[usuario.id] = ahora
+        if self._thread is None:
+            self.start()
+        return True
+
+    def start(self):
+        """Inicia el hilo que vuelca los accesos pendientes (idempotente)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='ultimo-acceso', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.granularidad.total_seconds())
+            self._wakeup.clear()
+            try:
+                self.volcar()
+            except Exception as e:
+                print(f"ERROR: No se pudieron guardar los últimos accesos: {str(e)}")
+
+    def volcar(self):
+        """
+        Guarda los accesos pendientes con un único UPDATE (executemany)
+
+        El UPDATE es de Core: last_login no afecta la caché de listados ni los
+        contadores, así que no pasa por los eventos del ORM. Nunca retrocede
+        un last_login más reciente guardado por otro proceso. Si falla, los
+        accesos vuelven a quedar pendientes.
+
+        Returns:
+            int: Accesos guardados
+        """
+        from app.models import Usuario
+
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        if not pendientes:
+            return 0
+
+        tabla = Usuario.__table__
+        sentencia = update(tabla).where(
+            tabla.c.id == bindparam('b_id'),
+            or_(tabla.c.last_login.is_(None), tabla.c.last_login < bindparam('b_last_login'))
+        ).values(last_login=bindparam('b_last_login'))
+
+        with self.app.app_context():
+            try:
+                db.session.connection().execute(sentencia, [
+                    {'b_id': usuario_id, 'b_last_login': fecha} for usuario_id, fecha in pendientes.items()
+                ])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with self._lock:
+                    for usuario_id, fecha in pendientes.items():
+                        self._pendientes[usuario_id] = max(fecha, self._pendientes.get(usuario_id, fecha))
+                raise
+            finally:
+                db.session.remove()
+        return len(pendientes)
@@ -0,0 +1,30 @@
+"""Utilidades compartidas por los tests (también cuando se ejecutan como script)"""
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append('.')
+
+
+def crear_app_de_prueba(database_url='sqlite://'):
+    """
+    Crea la app sobre database_url (SQLite en memoria por defecto)
+
+    La caché de listados queda en memoria: una caché persistente serviría
+    HTML de otra ejecución. Las variables de entorno se restauran al volver.
+    """
+    from app import create_app
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv('DATABASE_URL', database_url)
+        monkeypatch.setenv('FRAGMENT_CACHE_BACKEND', 'memoria')
+        app = create_app()
+
+    app.config['TESTING'] = True
+
+    @app.context_processor
+    def inject_now():
+        return {'now': datetime.now()}
+
+    return app
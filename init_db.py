@@ -102,4 +102,8 @@ with app.app_context():
     # Guardar todos los cambios en la base de datos
     db.session.commit()
     
+    # Inicializar los contadores de solicitudes por estado
+    from app.services.estadisticas import reconstruir_contadores
+    reconstruir_contadores()
+    
     print("Base de datos inicializada con éxito.")
@@ -0,0 +1,31 @@
+"""Add sincronizacion_evaluadores watermark table
+
+Revision ID: a3f1c9d2e7b4
+Revises: 6b1a23229230
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e7b4'
+down_revision = '6b1a23229230'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sincronizacion_evaluadores',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('last_synced_at', sa.DateTime(), nullable=True),
+    sa.Column('last_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('evaluadores_sincronizados', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('ultimo_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('sincronizacion_evaluadores')
@@ -0,0 +1,28 @@
+"""Add dictamen_final_hash to solicitudes
+
+Revision ID: b8e3f5a17c29
+Revises: f4c1d7e83a52
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e3f5a17c29'
+down_revision = 'f4c1d7e83a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Huella de los placeholders del dictamen final generado; los dictámenes
+    # existentes quedan sin huella y se regeneran en su próxima actualización
+    with op.batch_alter_table('solicitudes_equivalencia') as batch_op:
+        batch_op.add_column(sa.Column('dictamen_final_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('solicitudes_equivalencia') as batch_op:
+        batch_op.drop_column('dictamen_final_hash')
@@ -0,0 +1,51 @@
+"""Add trabajos_drive job queue and drive status on solicitudes
+
+Revision ID: c7d4e2a91f36
+Revises: a3f1c9d2e7b4
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d4e2a91f36'
+down_revision = 'a3f1c9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trabajos_drive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=30), nullable=False),
+    sa.Column('idempotency_key', sa.String(length=255), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('intentos', sa.Integer(), nullable=False),
+    sa.Column('max_intentos', sa.Integer(), nullable=False),
+    sa.Column('ultimo_error', sa.Text(), nullable=True),
+    sa.Column('proximo_intento_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('solicitud_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['solicitud_id'], ['solicitudes_equivalencia.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index('ix_trabajos_drive_estado_proximo', 'trabajos_drive', ['estado', 'proximo_intento_at'], unique=False)
+
+    with op.batch_alter_table('solicitudes_equivalencia') as batch_op:
+        batch_op.add_column(sa.Column('drive_estado', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('drive_error', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('solicitudes_equivalencia') as batch_op:
+        batch_op.drop_column('drive_error')
+        batch_op.drop_column('drive_estado')
+
+    op.drop_index('ix_trabajos_drive_estado_proximo', table_name='trabajos_drive')
+    op.drop_table('trabajos_drive')
@@ -0,0 +1,29 @@
+"""Add composite indexes for paginated solicitud listings
+
+Revision ID: d5a8b3f0c214
+Revises: c7d4e2a91f36
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a8b3f0c214'
+down_revision = 'c7d4e2a91f36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_solicitudes_fecha_id', 'solicitudes_equivalencia', ['fecha_solicitud', 'id'], unique=False)
+    op.create_index('ix_solicitudes_estado_fecha_id', 'solicitudes_equivalencia', ['estado', 'fecha_solicitud', 'id'], unique=False)
+    op.create_index('ix_solicitudes_carrera_fecha_id', 'solicitudes_equivalencia', ['carrera_crub_destino', 'fecha_solicitud', 'id'], unique=False)
+    op.create_index('ix_solicitudes_evaluador_fecha_id', 'solicitudes_equivalencia', ['evaluador_id', 'fecha_solicitud', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_solicitudes_evaluador_fecha_id', table_name='solicitudes_equivalencia')
+    op.drop_index('ix_solicitudes_carrera_fecha_id', table_name='solicitudes_equivalencia')
+    op.drop_index('ix_solicitudes_estado_fecha_id', table_name='solicitudes_equivalencia')
+    op.drop_index('ix_solicitudes_fecha_id', table_name='solicitudes_equivalencia')
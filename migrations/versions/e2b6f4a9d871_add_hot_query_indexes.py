@@ -0,0 +1,28 @@
+"""Add indexes for workload counts and dictamen lookups
+
+Revision ID: e2b6f4a9d871
+Revises: d5a8b3f0c214
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6f4a9d871'
+down_revision = 'd5a8b3f0c214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # (estado, fecha_solicitud) is already covered by ix_solicitudes_estado_fecha_id
+    op.create_index('ix_solicitudes_evaluador_estado', 'solicitudes_equivalencia', ['evaluador_id', 'estado'], unique=False)
+    op.create_index('ix_dictamenes_solicitud_id', 'dictamenes', ['solicitud_id'], unique=False)
+    op.create_index('ix_dictamenes_evaluador_id', 'dictamenes', ['evaluador_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_dictamenes_evaluador_id', table_name='dictamenes')
+    op.drop_index('ix_dictamenes_solicitud_id', table_name='dictamenes')
+    op.drop_index('ix_solicitudes_evaluador_estado', table_name='solicitudes_equivalencia')
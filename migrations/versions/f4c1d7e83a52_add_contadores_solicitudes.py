@@ -0,0 +1,36 @@
+"""Add per-estado solicitud counters
+
+Revision ID: f4c1d7e83a52
+Revises: e2b6f4a9d871
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c1d7e83a52'
+down_revision = 'e2b6f4a9d871'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    contadores = op.create_table('contadores_solicitudes',
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('estado')
+    )
+
+    # Inicializar con los datos existentes
+    conexion = op.get_bind()
+    conteos = dict.fromkeys(('pendiente', 'en_evaluacion', 'aprobada', 'rechazada'), 0)
+    conteos.update(dict(conexion.execute(sa.text(
+        'SELECT estado, COUNT(*) FROM solicitudes_equivalencia GROUP BY estado'
+    )).fetchall()))
+    op.bulk_insert(contadores, [{'estado': estado, 'cantidad': cantidad} for estado, cantidad in conteos.items()])
+
+
+def downgrade():
+    op.drop_table('contadores_solicitudes')
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Subida por partes de un archivo mayor a GOOGLE_DRIVE_CHUNK_THRESHOLD.
+
+GoogleDriveService envía el archivo con initUpload / appendUploadChunk /
+finalizeUpload y la unión de las partes la hace el finalizeUpload real de
+app.gs, ejecutado con Node sobre un DriveApp simulado. El archivo creado debe
+ser idéntico al original. Sin Node el test se omite.
+
+Uso: python test_drive_upload.py [MB...]
+"""
+import base64
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+sys.path.append('.')
+
+import pytest
+
+from conftest import crear_app_de_prueba
+
+APP_GS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.gs')
+
+# DriveApp / Utilities mínimos para finalizeUpload: las partes se leen de stdin
+# y los bytes se exponen como en Apps Script (arrays de enteros con signo)
+SIMULADOR_JS = r"""
+const fs = require('fs');
+const entrada = JSON.parse(fs.readFileSync(0, 'utf8'));
+let creado = null;
+const staging = {
+  getName: () => '_upload_1',
+  getDescription: () => JSON.stringify({folderId: 'destino', fileName: 'archivo', mimeType: 'application/pdf'}),
+  setDescription() {},
+  setTrashed() {},
+  getFilesByName(nombre) {
+    const datos = entrada.chunks[parseInt(nombre, 10)];
+    let leido = datos === undefined;
+    return {
+      hasNext: () => !leido,
+      next() {
+        leido = true;
+        return {getBlob: () => ({getBytes: () => Array.from(new Int8Array(Buffer.from(datos, 'base64')))})};
+      }
+    };
+  }
+};
+const destino = {createFile(blob) { creado = blob; return {getId: () => 'archivo-final'}; }};
+global.DriveApp = {getFolderById: id => id === 'destino' ? destino : staging};
+global.Utilities = {newBlob: (bytes, mimeType, nombre) => ({bytes, mimeType, nombre})};
+eval(fs.readFileSync(entrada.appGs, 'utf8'));
+const inicio = Date.now();
+const resultado = finalizeUpload('staging', entrada.chunks.length);
+const ms = Date.now() - inicio;
+process.stdout.write(JSON.stringify({
+  resultado, ms,
+  data: creado ? Buffer.from(Uint8Array.from(creado.bytes, b => b & 255)).toString('base64') : null
+}));
+"""
+
+
+class AppsScriptSimulado:
+    """Reemplaza _make_request: guarda las partes y ejecuta finalizeUpload de app.gs con Node"""
+
+    def __init__(self):
+        self.chunks = []
+        self.acciones = []
+        self.contenido = None
+        self.finalize_ms = None
+
+    def __call__(self, action, data, timeout=None, idempotente=None):
+        self.acciones.append(action)
+        if action == 'initUpload':
+            return {'success': True, 'uploadId': 'staging'}
+        if action == 'appendUploadChunk':
+            assert data['index'] == len(self.chunks)
+            self.chunks.append(data['chunkData'])
+            return {'success': True, 'index': data['index']}
+        if action == 'finalizeUpload':
+            assert data['totalChunks'] == len(self.chunks)
+            salida = subprocess.run(
+                ['node', '-e', SIMULADOR_JS], check=True, capture_output=True,
+                input=json.dumps({'appGs': APP_GS, 'chunks': self.chunks}).encode('utf-8')
+            )
+            respuesta = json.loads(salida.stdout)
+            self.contenido = base64.b64decode(respuesta['data']) if respuesta['data'] else None
+            self.finalize_ms = respuesta['ms']
+            return respuesta['resultado']
+        return {'success': True}
+
+
+def subir(tamano):
+    """Sube un archivo aleatorio de `tamano` bytes; devuelve (original, simulador, resultado)"""
+    from app.services.google_drive_service import GoogleDriveService
+
+    app = crear_app_de_prueba()
+    original = os.urandom(tamano)
+    with app.app_context(), tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'archivo.pdf')
+        with open(ruta, 'wb') as f:
+            f.write(original)
+        service = GoogleDriveService()
+        simulador = AppsScriptSimulado()
+        service._make_request = simulador
+        resultado = service.subir_archivo('carpeta', ruta, 'archivo.pdf')
+    return original, simulador, resultado
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node not installed')
+def test_subida_por_partes_intacta():
+    from app.services.google_drive_service import GoogleDriveService
+
+    original, simulador, resultado = subir(GoogleDriveService().chunk_threshold + 1024 * 1024 + 17)
+
+    assert resultado['success'], resultado
+    assert resultado['file_id'] == 'archivo-final'
+    assert simulador.acciones[0] == 'initUpload' and simulador.acciones[-1] == 'finalizeUpload'
+    assert len(simulador.chunks) > 1
+    assert simulador.contenido == original
+
+
+if __name__ == "__main__":
+    tamanos = [int(mb) for mb in sys.argv[1:]] or [8, 16, 32]
+    print(f"{'MB':>6} {'partes':>7} {'finalize ms':>12} {'intacto':>8}")
+    for mb in tamanos:
+        original, simulador, resultado = subir(mb * 1024 * 1024)
+        print(f"{mb:>6} {len(simulador.chunks):>7} {simulador.finalize_ms:>12} "
+              f"{str(simulador.contenido == original):>8}")
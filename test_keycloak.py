@@ -92,8 +92,8 @@ def test_keycloak_connection():
             print(f"✓ Found {len(evaluadores_with_workload)} evaluadores with workload info")
             
             for item in evaluadores_with_workload:
-                ev = item['evaluador']
-                print(f"  - {ev.username} ({ev.email}) - Role: {ev.rol} - Workload: {item['workload']} active, {item['total_assigned']} total - Keycloak User: {ev.is_keycloak_user}")
+                ev = item.evaluador
+                print(f"  - {ev.username} ({ev.email}) - Workload: {item.workload} active, {item.total_assigned} total - Keycloak User: {ev.is_keycloak_user}")
                 
         except Exception as e:
             print(f"✗ Error with EvaluadorService: {str(e)}")
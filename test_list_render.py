@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark del listado de solicitudes del Departamento de Estudiantes.
+
+Mide el tamaño del HTML y el tiempo de respuesta de /depto_estudiantes/equivalencias
+con distinta cantidad de evaluadores. El selector de evaluadores se envía una
+sola vez (JSON + modal compartido), así que cada evaluador adicional debe
+agregar un tamaño constante a la página y no uno proporcional a las filas.
+
+Uso: python test_list_render.py [solicitudes_por_pagina]
+"""
+import sys
+import time
+sys.path.append('.')
+
+from conftest import crear_app_de_prueba
+
+# Bytes máximos que puede agregar cada evaluador a la página
+MAX_BYTES_POR_EVALUADOR = 1000
+
+
+def medir_listado(solicitudes, evaluadores, repeticiones=3):
+    """Devuelve (bytes, segundos) del listado con los datos indicados (mejor de N)"""
+    from app import db
+    from app.models import Usuario, SolicitudEquivalencia
+
+    app = crear_app_de_prueba()
+    with app.app_context():
+        db.create_all()
+        depto = Usuario(username='depto', email='depto@test', nombre='Depto', apellido='Prueba',
+                        rol='depto_estudiantes')
+        depto.set_password('depto')
+        db.session.add(depto)
+        db.session.add_all([
+            Usuario(username=f'evaluador{i}', email=f'evaluador{i}@test', nombre='Evaluador',
+                    apellido=f'Apellido {i}', departamento_academico='Departamento de Prueba', rol='evaluador')
+            for i in range(evaluadores)
+        ])
+        db.session.add_all([
+            SolicitudEquivalencia(
+                id_solicitud=f'B{n:05d}', nombre_solicitante='Nombre', apellido_solicitante=str(n),
+                dni_solicitante='1', legajo_crub='1', correo_solicitante='solicitante@test',
+                institucion_origen='Institución', carrera_origen='Origen', carrera_crub_destino='Destino'
+            )
+            for n in range(solicitudes)
+        ])
+        db.session.commit()
+
+    try:
+        client = app.test_client()
+        client.post('/auth/login', data={'username': 'depto', 'password': 'depto'})
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            response = client.get(f'/depto_estudiantes/equivalencias?por_pagina={solicitudes}')
+            duracion = time.perf_counter() - inicio
+            assert response.status_code == 200
+            mejor = duracion if mejor is None else min(mejor, duracion)
+        return len(response.data), mejor
+    finally:
+        with app.app_context():
+            db.drop_all()
+
+
+def test_selector_no_crece_con_las_filas():
+    solicitudes = 50
+    chico, _ = medir_listado(solicitudes, 10, repeticiones=1)
+    grande, _ = medir_listado(solicitudes, 100, repeticiones=1)
+    assert (grande - chico) / 90 < MAX_BYTES_POR_EVALUADOR
+
+
+if __name__ == "__main__":
+    solicitudes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'evaluadores':>12} {'bytes':>12} {'ms':>9}")
+    for evaluadores in (10, 50, 100):
+        tamano, segundos = medir_listado(solicitudes, evaluadores)
+        print(f"{evaluadores:>12} {tamano:>12,} {segundos * 1000:>9.1f}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de los placeholders del dictamen final.
+
+Calcula los placeholders de una solicitud con 60 dictámenes de dos formas:
+todos los registrados (como antes) y sólo los que contiene el template. Los
+valores se calculan a demanda, así que un template sin la tabla de
+dictámenes no recorre los dictámenes.
+
+Uso: python test_placeholder_render.py [dictamenes] [repeticiones]
+"""
+import sys
+import time
+from datetime import datetime
+sys.path.append('.')
+
+# Placeholders de un template típico de dictamen (sin la lista ni los totales)
+CLAVES_TEMPLATE = frozenset([
+    '{{ID_SOLICITUD}}', '{{FECHA_RESOLUCION}}', '{{ESTADO}}', '{{NOMBRE_COMPLETO_SOLICITANTE}}',
+    '{{DNI_SOLICITANTE}}', '{{CARRERA_CRUB_DESTINO}}', '{{INSTITUCION_ORIGEN}}',
+    '{{EVALUADOR_NOMBRE_COMPLETO}}', '{{FECHA_ACTUAL_COMPLETA}}', '{{DICTAMENES_TABLA}}',
+])
+
+
+def crear_solicitud(dictamenes):
+    from app.models import SolicitudEquivalencia, Dictamen, Usuario
+
+    evaluador = Usuario(nombre='Ana', apellido='Pérez', legajo_evaluador='E1', departamento_academico='Física')
+    return SolicitudEquivalencia(
+        id_solicitud='B00001', estado='aprobada', fecha_solicitud=datetime(2024, 3, 1),
+        fecha_resolucion=datetime(2024, 4, 2), nombre_solicitante='Juan', apellido_solicitante='Gómez',
+        dni_solicitante='30111222', legajo_crub='1234', correo_solicitante='juan@test',
+        institucion_origen='UNCo', carrera_origen='Física', carrera_crub_destino='Profesorado en Física',
+        evaluador=evaluador,
+        dictamenes=[
+            Dictamen(asignatura_origen=f'Asignatura {i}', asignatura_destino=f'Destino {i}',
+                     tipo_equivalencia='total' if i % 3 else 'parcial', observaciones='Sin observaciones',
+                     fecha_dictamen=datetime(2024, 4, 1))
+            for i in range(dictamenes)
+        ]
+    )
+
+
+class _SolicitudContada:
+    """Envuelve una solicitud y cuenta cuántas veces se leen sus dictámenes"""
+
+    def __init__(self, solicitud):
+        self._solicitud = solicitud
+        self.lecturas_dictamenes = 0
+
+    @property
+    def dictamenes(self):
+        self.lecturas_dictamenes += 1
+        return self._solicitud.dictamenes
+
+    def __getattr__(self, nombre):
+        return getattr(self._solicitud, nombre)
+
+
+def medir(processor, solicitud, claves, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        processor.process_solicitud_placeholders(solicitud, claves)
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor
+
+
+def test_placeholders_del_template():
+    from app.services.placeholder_processor import PlaceholderProcessor, PLACEHOLDERS
+
+    processor = PlaceholderProcessor()
+    solicitud = crear_solicitud(60)
+
+    todos = processor.process_solicitud_placeholders(solicitud)
+    assert set(todos) == set(PLACEHOLDERS)
+    assert todos['{{TOTAL_DICTAMENES}}'] == '60'
+    assert todos['{{TOTAL_EQUIVALENCIAS_APROBADAS}}'] == '40'
+    assert todos['{{TOTAL_EQUIVALENCIAS_PARCIALES}}'] == '20'
+    assert todos['{{DICTAMENES_TABLA}}'].count('<tr>') == 60
+    assert todos['{{DICTAMENES_LISTA}}'].splitlines()[0] == '1. Asignatura 0 → Destino 0 (parcial) - Sin observaciones'
+
+    # Claves desconocidas del template se ignoran
+    parcial = processor.process_solicitud_placeholders(solicitud, CLAVES_TEMPLATE | {'{{OTRA}}'})
+    assert set(parcial) == CLAVES_TEMPLATE
+    assert all(parcial[clave] == todos[clave] for clave in CLAVES_TEMPLATE if 'FECHA_ACTUAL' not in clave)
+
+    # Sin placeholders de dictámenes no se leen los dictámenes; con varios, una sola vez
+    contada = _SolicitudContada(solicitud)
+    processor.process_solicitud_placeholders(contada, CLAVES_TEMPLATE - {'{{DICTAMENES_TABLA}}'})
+    assert contada.lecturas_dictamenes == 0
+    processor.process_solicitud_placeholders(contada, None)
+    assert contada.lecturas_dictamenes == 1
+
+    assert 'dictamenes.tipo_equivalencia' in processor.dependencias(['{{TOTAL_EQUIVALENCIAS_PARCIALES}}'])
+    assert processor.dependencias(['{{ID_SOLICITUD}}']) == {'id_solicitud'}
+
+
+def test_huella_de_placeholders():
+    from app.services.placeholder_processor import PlaceholderProcessor
+
+    processor = PlaceholderProcessor()
+    solicitud = crear_solicitud(60)
+    huella = processor.huella(solicitud, CLAVES_TEMPLATE)
+
+    # La huella sólo lee los campos declarados por los placeholders del template
+    assert 'correo_solicitante' not in processor.dependencias(CLAVES_TEMPLATE)
+    solicitud.correo_solicitante = 'otro@test'
+    assert processor.huella(solicitud, CLAVES_TEMPLATE) == huella
+
+    solicitud.dictamenes[59].observaciones = 'Con observaciones'
+    assert processor.huella(solicitud, CLAVES_TEMPLATE) != huella
+
+    # Un template con otros placeholders también cambia la huella
+    huella = processor.huella(solicitud, CLAVES_TEMPLATE)
+    assert processor.huella(solicitud, CLAVES_TEMPLATE - {'{{ESTADO}}'}) != huella
+
+    # Sin placeholders de dictámenes la huella no lee los dictámenes
+    contada = _SolicitudContada(solicitud)
+    processor.huella(contada, CLAVES_TEMPLATE - {'{{DICTAMENES_TABLA}}'})
+    assert contada.lecturas_dictamenes == 0
+
+
+if __name__ == "__main__":
+    from app.services.placeholder_processor import PlaceholderProcessor
+
+    dictamenes = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    processor = PlaceholderProcessor()
+    solicitud = crear_solicitud(dictamenes)
+    print(f"{dictamenes} dictámenes, mejor de {repeticiones}")
+    print(f"{'placeholders':>24} {'µs':>9}")
+    for nombre, claves in (('todos', None), ('template', CLAVES_TEMPLATE),
+                           ('template sin tabla', CLAVES_TEMPLATE - {'{{DICTAMENES_TABLA}}'})):
+        segundos = medir(processor, solicitud, claves, repeticiones)
+        print(f"{nombre:>24} {segundos * 1e6:>9.1f}")
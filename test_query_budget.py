@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Cuenta las sentencias SQL que ejecuta cada vista y falla si alguna supera su
+presupuesto (VIEW_BUDGETS).
+
+Los datos de prueba tienen varias solicitudes por evaluador y varios
+dictámenes por solicitud, de modo que una carga perezosa por fila (N+1) en un
+listado o en una vista de detalle excede el presupuesto.
+"""
+import sys
+from contextlib import contextmanager
+sys.path.append('.')
+
+from sqlalchemy import event
+
+from conftest import crear_app_de_prueba
+
+# Máximo de sentencias por request, incluida la carga del usuario de la sesión
+VIEW_BUDGETS = {
+    ('depto', '/depto_estudiantes/equivalencias'): 4,
+    ('depto', '/depto_estudiantes/equivalencias/ver/1'): 4,
+    ('depto', '/depto_estudiantes/equivalencias/editar/1'): 4,
+    ('depto', '/depto_estudiantes/evaluadores'): 4,
+    ('evaluador', '/evaluadores/equivalencias'): 3,
+    ('evaluador', '/evaluadores/equivalencia/1'): 3,
+    ('evaluador', '/evaluadores/dictamen/1'): 3,
+    ('lector', '/lector/equivalencias'): 4,
+    ('lector', '/lector/equivalencias/ver/1'): 3,
+}
+
+SOLICITUDES = 30
+EVALUADORES = 6
+DICTAMENES_POR_SOLICITUD = 4
+
+
+@contextmanager
+def contar_sentencias(engine):
+    """Registra en una lista cada sentencia SQL ejecutada dentro del bloque"""
+    sentencias = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(engine, 'before_cursor_execute', registrar)
+
+
+def cargar_datos():
+    from app import db
+    from app.models import Usuario, SolicitudEquivalencia, Dictamen
+
+    for username, rol in (('depto', 'depto_estudiantes'), ('evaluador', 'evaluador'), ('lector', 'lector')):
+        usuario = Usuario(username=username, email=f'{username}@test', nombre=username,
+                          apellido='Prueba', rol=rol)
+        usuario.set_password(username)
+        db.session.add(usuario)
+    evaluadores = [Usuario.query.filter_by(username='evaluador').first()]
+    for i in range(1, EVALUADORES):
+        evaluador = Usuario(username=f'evaluador{i}', email=f'evaluador{i}@test', nombre='Evaluador',
+                            apellido=str(i), rol='evaluador')
+        db.session.add(evaluador)
+        evaluadores.append(evaluador)
+    db.session.flush()
+
+    estados = ['pendiente', 'en_evaluacion', 'aprobada', 'rechazada']
+    for n in range(SOLICITUDES):
+        solicitud = SolicitudEquivalencia(
+            id_solicitud=f'T{n:04d}', estado=estados[n % len(estados)],
+            nombre_solicitante='Nombre', apellido_solicitante=str(n), dni_solicitante='1',
+            legajo_crub='1', correo_solicitante='solicitante@test', institucion_origen='Institución',
+            carrera_origen='Origen', carrera_crub_destino=f'Carrera {n % 3}',
+            evaluador=evaluadores[n % EVALUADORES] if n % 5 else None
+        )
+        # La solicitud 1 queda asignada al usuario 'evaluador' para sus vistas de detalle
+        if n == 0:
+            solicitud.evaluador = evaluadores[0]
+            solicitud.estado = 'en_evaluacion'
+        for k in range(DICTAMENES_POR_SOLICITUD):
+            solicitud.dictamenes.append(Dictamen(asignatura_origen=f'Origen {k}', asignatura_destino=f'Destino {k}',
+                                                 evaluador=solicitud.evaluador))
+        db.session.add(solicitud)
+    db.session.commit()
+
+
+def check_budgets():
+    """Devuelve las vistas que superan su presupuesto de sentencias"""
+    from app import db
+
+    app = crear_app_de_prueba()
+    with app.app_context():
+        db.create_all()
+        cargar_datos()
+        engine = db.engine
+
+    # Cada request usa su propio contexto de aplicación (current_user se
+    # guarda en g), por eso se ejecutan fuera del bloque anterior
+    failures = []
+    try:
+        for (username, path), budget in VIEW_BUDGETS.items():
+            client = app.test_client()
+            client.post('/auth/login', data={'username': username, 'password': username})
+            with contar_sentencias(engine) as sentencias:
+                response = client.get(path)
+            ok = response.status_code == 200 and len(sentencias) <= budget
+            print(f"{'✓' if ok else '✗'} {path} ({username}): {len(sentencias)}/{budget} sentencias, "
+                  f"HTTP {response.status_code}")
+            if not ok:
+                for sentencia in sentencias:
+                    print(f"  {' '.join(sentencia.split())[:160]}")
+                failures.append(path)
+    finally:
+        with app.app_context():
+            db.drop_all()
+    return failures
+
+
+def test_query_budgets():
+    assert check_budgets() == []
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check_budgets() else 0)